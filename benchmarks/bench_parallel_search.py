@@ -0,0 +1,74 @@
+"""
+Benchmarks ContentSearcher scaling from 1 to N worker processes on a synthetic capture.
+
+    poetry run python benchmarks/bench_parallel_search.py --entries 20000 --body-size 20000 --max-workers 8
+"""
+import argparse
+import os
+import random
+import string
+import time
+
+from integuru.models.request import Request
+from integuru.util.search import ContentSearcher
+
+
+def build_req_to_res_map(entries: int, body_size: int, seed: int = 0):
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + ' {}":,'
+    req_to_res_map = {}
+    for i in range(entries):
+        request = Request("GET", f"https://example.com/api/resource/{i}", {"X-Request-Id": str(i)})
+        text = "".join(rng.choices(alphabet, k=body_size))
+        req_to_res_map[request] = {"text": text, "type": "application/json"}
+    return req_to_res_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--body-size", type=int, default=20000, help="characters per response body")
+    parser.add_argument("--patterns", type=int, default=20)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    req_to_res_map = build_req_to_res_map(args.entries, args.body_size)
+    # Half the patterns are planted in a few bodies, half never match
+    patterns = [f"token-{i:04d}-{'x' * 16}" for i in range(args.patterns)]
+    for i, pattern in enumerate(patterns[: args.patterns // 2]):
+        response = list(req_to_res_map.values())[(i * 7919) % args.entries]
+        response["text"] += pattern
+
+    corpus_mb = args.entries * args.body_size / 1e6
+    print(f"{args.entries} entries, {corpus_mb:.0f} MB of response text, {len(patterns)} patterns")
+    print(f"{'workers':>8} {'best (s)':>10} {'speedup':>8}")
+
+    baseline = None
+    expected = None
+    workers = 1
+    while workers <= args.max_workers:
+        searcher = ContentSearcher(req_to_res_map, workers=workers)
+        try:
+            # Warm-up starts the worker processes and maps the corpus
+            result = searcher.find(patterns)
+            if expected is None:
+                expected = result
+            assert result == expected, "parallel results differ from the single-process search"
+
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                searcher.find(patterns)
+                timings.append(time.perf_counter() - start)
+        finally:
+            searcher.close()
+
+        best = min(timings)
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>10.3f} {baseline / best:>7.2f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,59 @@
 from dotenv import load_dotenv
-import time  # Add this import
+import time
 
 load_dotenv()
 
 from integuru.main import call_agent
+from integuru.util.har_cache import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_MAX_CACHE_BYTES,
+    HAR_SUFFIXES,
+    build_har_cache,
+    evict_cache,
+    iter_har_files,
+)
+from integuru.util.checkpoint import DEFAULT_CHECKPOINT_PATH, DEFAULT_MAX_RUNS, CheckpointStore, RunNotFoundError
+from integuru.util.har_compact import compact_har
+from integuru.util.llm_backends import BACKENDS, DEFAULT_CASSETTE_PATH, CassetteMissError, make_backend
+from integuru.util.llm_cache import DEFAULT_LLM_CACHE_PATH, DEFAULT_TTL_SECONDS, LLMCache
+from integuru.util.llm_pool import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT_SECONDS, ModelLimits
+from integuru.util.routing import StageRoute, load_routing, merge_routes, parse_stage_models
+from integuru.util.usage import STAGES
 import asyncio
 import click
+import os
+
+
+class DefaultCommandGroup(click.Group):
+    """
+    Click group that falls back to a default command when no subcommand is given,
+    so `integuru --prompt ...` keeps working alongside `integuru index ...`.
+    """
+
+    def __init__(self, *args, default_command: str = "run", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] not in ctx.help_option_names):
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup)
+def cli():
+    """Integuru: generate integration code from a HAR capture. Runs `run` when no command is given."""
 
-@click.command()
+
+@cli.command()
 @click.option(
     "--model", default="gpt-4o", help="The LLM model to use (default is gpt-4o)"
 )
-@click.option("--prompt", required=True, help="The prompt for the model")
+@click.option("--prompt", default=None, help="The prompt for the model (required unless resuming a run)")
 @click.option(
     "--har-path",
     default="./network_requests.har",
-    help="The HAR file path (default is ./network_requests.har)",
+    help="The HAR file path, optionally gzip/xz/zstd compressed (default is ./network_requests.har)",
 )
 @click.option(
     "--cookie-path",
@@ -37,21 +75,345 @@ import click
     default=False,
     help="Whether to generate the full integration code",
 )
-def cli(
-    model, prompt, har_path, cookie_path, max_steps, input_variables, generate_code
+@click.option(
+    "--streaming-parser",
+    is_flag=True,
+    default=False,
+    help="Parse the HAR file incrementally instead of loading it whole (lower memory on large files)",
+)
+@click.option(
+    "--cache-dir",
+    default=DEFAULT_CACHE_DIR,
+    show_default=True,
+    help="Directory of the parsed-HAR cache. Entries are pickles, loaded only when signed with your key "
+    "(~/.config/integuru/har_cache.key, or INTEGURU_CACHE_KEY); keep that key private",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="Parse the HAR file from scratch without reading or writing the cache",
+)
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Worker processes used to search response bodies (default is 1, in-process)",
+)
+@click.option(
+    "--concurrency",
+    default=8,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Maximum number of pending requests analyzed at the same time",
+)
+@click.option(
+    "--batch-tokens",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Identify dynamic parts of pending requests in batched calls of up to this many cURL tokens (default is 0, one call per request)",
+)
+@click.option(
+    "--url-candidates",
+    default=40,
+    type=click.IntRange(min=0),
+    show_default=True,
+    help="Number of HAR URLs most relevant to the prompt offered to the LLM to find the action URL (0 offers all)",
+)
+@click.option(
+    "--url-token-budget",
+    default=8000,
+    type=click.IntRange(min=0),
+    show_default=True,
+    help="Token budget of the action URL prompt; larger candidate lists are judged in chunks (0 disables chunking)",
+)
+@click.option(
+    "--no-local-detection",
+    is_flag=True,
+    default=False,
+    help="Always ask the LLM for dynamic parts instead of skipping requests whose tokens are locally detected with high confidence",
+)
+@click.option(
+    "--llm-cache",
+    "llm_cache_path",
+    default=DEFAULT_LLM_CACHE_PATH,
+    show_default=True,
+    help="SQLite file caching LLM responses across runs",
+)
+@click.option(
+    "--llm-cache-ttl",
+    default=DEFAULT_TTL_SECONDS // 3600,
+    type=int,
+    show_default=True,
+    help="Hours after which cached LLM responses expire",
+)
+@click.option(
+    "--no-llm-cache",
+    is_flag=True,
+    default=False,
+    help="Always call the LLM API instead of reusing cached responses",
+)
+@click.option(
+    "--stage-model",
+    multiple=True,
+    type=(click.Choice(STAGES), str),
+    help="Models used for one agent stage instead of --model, in the format stage model[,fallback,...]",
+)
+@click.option(
+    "--stage-max-tokens",
+    multiple=True,
+    type=(click.Choice(STAGES), click.IntRange(min=1)),
+    help="Cap on the completion tokens of one agent stage's calls, in the format stage tokens",
+)
+@click.option(
+    "--routing-config",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="TOML file whose [routing.<stage>] tables set each stage's model, fallback models and max_tokens",
+)
+@click.option(
+    "--llm-timeout",
+    default=DEFAULT_TIMEOUT_SECONDS,
+    type=click.FloatRange(min=0, min_open=True),
+    show_default=True,
+    help="Seconds before an LLM request is abandoned and retried",
+)
+@click.option(
+    "--llm-retries",
+    default=DEFAULT_MAX_RETRIES,
+    type=click.IntRange(min=0),
+    show_default=True,
+    help="Retries of an LLM request failing with a rate limit, timeout or server error",
+)
+@click.option(
+    "--rpm",
+    default=0,
+    type=click.FloatRange(min=0),
+    help="Requests per minute allowed per model (default is 0, unlimited)",
+)
+@click.option(
+    "--tpm",
+    default=0,
+    type=click.FloatRange(min=0),
+    help="Prompt tokens per minute allowed per model (default is 0, unlimited)",
+)
+@click.option(
+    "--hedge-after",
+    default=0,
+    type=click.FloatRange(min=0),
+    help="Send a duplicate of an LLM request still unanswered after this many seconds (default is 0, never)",
+)
+@click.option(
+    "--llm-backend",
+    default="openai",
+    type=click.Choice(BACKENDS),
+    show_default=True,
+    help="Where LLM responses come from: the OpenAI API, the API while recording them to --cassette, "
+    "the --cassette alone (offline), or the --llm-script",
+)
+@click.option(
+    "--cassette",
+    default=DEFAULT_CASSETTE_PATH,
+    show_default=True,
+    help="Cassette file the record backend writes and the replay backend reads",
+)
+@click.option(
+    "--llm-script",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file mapping agent stages to the responses of the scripted backend",
+)
+@click.option(
+    "--usage-report",
+    default="usage_report.json",
+    show_default=True,
+    help="Where to write per-stage LLM token, latency and cost usage (a .prom Prometheus dump is written next to it)",
+)
+@click.option(
+    "--checkpoints",
+    "checkpoint_path",
+    default=DEFAULT_CHECKPOINT_PATH,
+    show_default=True,
+    help="SQLite file the run is checkpointed to after every step. Checkpoints are pickled: "
+    "never use a file from an untrusted source",
+)
+@click.option(
+    "--no-checkpoint",
+    is_flag=True,
+    default=False,
+    help="Do not checkpoint the run",
+)
+@click.option(
+    "--resume",
+    "resume_run_id",
+    default=None,
+    metavar="RUN_ID",
+    help="Continue a stopped run from its last checkpoint, with the analysis options it was started with",
+)
+def run(
+    model, prompt, har_path, cookie_path, max_steps, input_variables, generate_code, streaming_parser,
+    cache_dir, no_cache, workers, concurrency, batch_tokens, url_candidates, url_token_budget, no_local_detection, llm_cache_path, llm_cache_ttl, no_llm_cache,
+    stage_model, stage_max_tokens, routing_config, llm_timeout, llm_retries, rpm, tpm, hedge_after,
+    llm_backend, cassette, llm_script, usage_report, checkpoint_path, no_checkpoint, resume_run_id
 ):
+    """Analyze a HAR file and build the request dependency graph."""
     input_vars = dict(input_variables)
-    asyncio.run(
-        call_agent(
-            model,
-            prompt,
-            har_path,
-            cookie_path,
-            input_variables=input_vars,
-            max_steps=max_steps,
-            to_generate_code=generate_code,
+    if prompt is None and resume_run_id is None:
+        raise click.UsageError("Missing option '--prompt'")
+    if resume_run_id is not None and no_checkpoint:
+        raise click.UsageError("--resume needs the checkpoint file, drop --no-checkpoint")
+    if llm_backend == "scripted" and llm_script is None:
+        raise click.UsageError("--llm-backend scripted needs --llm-script")
+    # Other backends must see every call: cache hits would be missing from a recording
+    use_llm_cache = llm_backend == "openai" and not no_llm_cache
+    llm_cache = LLMCache(llm_cache_path, ttl_seconds=llm_cache_ttl * 3600) if use_llm_cache else None
+    # Command line options override the routing config
+    routes = merge_routes(
+        load_routing(routing_config) if routing_config else {},
+        parse_stage_models(stage_model),
+        {stage: StageRoute(max_tokens=max_tokens) for stage, max_tokens in stage_max_tokens},
+    )
+    llm_limits = ModelLimits(
+        requests_per_minute=rpm or None,
+        tokens_per_minute=tpm or None,
+        timeout_seconds=llm_timeout,
+        max_retries=llm_retries,
+        hedge_after_seconds=hedge_after or None,
+    )
+    try:
+        asyncio.run(
+            call_agent(
+                model,
+                prompt,
+                har_path,
+                cookie_path,
+                input_variables=input_vars,
+                max_steps=max_steps,
+                to_generate_code=generate_code,
+                streaming_parser=streaming_parser,
+                har_cache_dir=None if no_cache else cache_dir,
+                search_workers=workers,
+                concurrency=concurrency,
+                batch_token_budget=batch_tokens or None,
+                end_url_top_k=url_candidates or None,
+                end_url_token_budget=url_token_budget or None,
+                local_dynamic_detection=not no_local_detection,
+                llm_cache=llm_cache,
+                llm_limits=llm_limits,
+                routes=routes,
+                llm_backend=make_backend(llm_backend, cassette, llm_script),
+                usage_report=usage_report,
+                checkpoint_path=None if no_checkpoint else checkpoint_path,
+                resume=resume_run_id,
+            )
         )
+    except RunNotFoundError as e:
+        raise click.UsageError(str(e))
+    except CassetteMissError as e:
+        raise click.ClickException(str(e))
+
+
+@cli.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "--cache-dir",
+    default=DEFAULT_CACHE_DIR,
+    show_default=True,
+    help="Directory of the parsed-HAR cache. Entries are pickles, loaded only when signed with your key "
+    "(~/.config/integuru/har_cache.key, or INTEGURU_CACHE_KEY); keep that key private",
+)
+@click.option(
+    "--max-cache-size",
+    default=DEFAULT_MAX_CACHE_BYTES // (1024 * 1024),
+    type=int,
+    show_default=True,
+    help="Maximum cache size in MiB; least recently used entries are evicted",
+)
+@click.option(
+    "--streaming-parser",
+    is_flag=True,
+    default=False,
+    help="Parse the HAR files incrementally instead of loading them whole",
+)
+def index(directory, cache_dir, max_cache_size, streaming_parser):
+    """Prebuild the parsed-HAR cache for every HAR file under DIRECTORY."""
+    for har_path in iter_har_files(directory):
+        start = time.perf_counter()
+        try:
+            built = build_har_cache(har_path, streaming=streaming_parser, cache_dir=cache_dir)
+        except ImportError as e:
+            # e.g. a .har.zst file without zstd support: index the others
+            click.echo(f"{'skipped':8} {har_path} ({e})", err=True)
+            continue
+        status = "indexed" if built else "cached"
+        click.echo(f"{status:8} {har_path} ({time.perf_counter() - start:.2f}s)")
+
+    for path in evict_cache(cache_dir, max_cache_size * 1024 * 1024):
+        click.echo(f"evicted  {path}")
+
+
+@cli.command()
+@click.argument("har_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--output",
+    "-o",
+    default=None,
+    help="Output HAR path (default is <name>.compact.har next to the input)",
+)
+@click.option(
+    "--max-body-size",
+    default=None,
+    type=int,
+    help="Truncate text response bodies to this many characters (default keeps them whole)",
+)
+def compact(har_path, output, max_body_size):
+    """Write a minimized, analysis-ready copy of HAR_PATH."""
+    if output is None:
+        stem = har_path
+        for suffix in HAR_SUFFIXES:
+            if har_path.lower().endswith(suffix):
+                stem = har_path[: -len(suffix)]
+                break
+        output = f"{stem}.compact.har"
+
+    stats = compact_har(har_path, output, max_body_size=max_body_size)
+
+    click.echo(
+        f"Kept {stats.entries_written} of {stats.entries_read} entries "
+        f"({stats.excluded} excluded, {stats.duplicates} duplicates); "
+        f"{stats.bodies_stripped} binary bodies stripped, {stats.bodies_truncated} truncated"
     )
+    click.echo(f"{os.path.getsize(har_path):,} -> {os.path.getsize(output):,} bytes: {output}")
+
+
+@cli.group()
+def checkpoints():
+    """Manage the file runs are checkpointed to."""
+
+
+@checkpoints.command()
+@click.option(
+    "--checkpoints",
+    "checkpoint_path",
+    default=DEFAULT_CHECKPOINT_PATH,
+    show_default=True,
+    help="SQLite file of the checkpointed runs",
+)
+@click.option(
+    "--keep",
+    default=0,
+    type=int,
+    show_default=True,
+    help=f"Number of most recently updated runs to keep (starting a run keeps {DEFAULT_MAX_RUNS})",
+)
+def prune(checkpoint_path, keep):
+    """Delete checkpointed runs and shrink the checkpoint file."""
+    if not os.path.exists(checkpoint_path):
+        click.echo(f"No checkpoint file at {checkpoint_path}")
+        return
+    for run_id in CheckpointStore(checkpoint_path).prune(keep, vacuum=True):
+        click.echo(f"deleted  {run_id}")
+
 
 if __name__ == "__main__":
     cli()
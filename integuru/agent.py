@@ -1,15 +1,37 @@
+import asyncio
 import json
+import threading
 import urllib
 import os
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional, Set, Tuple
 
 from integuru.util.LLM import llm
 from integuru.models.DAGManager import DAGManager
 from integuru.util.har_processing import *
+from integuru.util.har_cache import load_har_index
+from integuru.util.search import ContentSearcher
+from integuru.util.ranking import rank_har_urls
+from integuru.util.request_scoring import cookie_values_of, simplest_candidates
+from integuru.util.dynamic_tokens import TokenCandidate, split_certain
+from integuru.util.prompts import (
+    DYNAMIC_PARTS,
+    DYNAMIC_PARTS_BATCH,
+    DYNAMIC_PARTS_BATCH_HINTS,
+    DYNAMIC_PARTS_HINTS,
+    END_URL,
+    INPUT_VARIABLES,
+    SIMPLEST_REQUEST,
+)
+from integuru.util.tokens import pack_by_token_budget, truncate
+from integuru.util.usage import usage_scope
 from integuru.models.request import Request
 from integuru.models.agent_state import AgentState
 
+# The simplest request tie-break sends at most this many candidates, each capped in size
+MAX_TIE_BREAK_CANDIDATES = 5
+MAX_TIE_BREAK_CURL_CHARS = 2000
+
 class IntegrationAgent:
     ACTION_URL_KEY: str = "action_url"
     IN_PROCESS_NODE_KEY: str = "in_process_node"
@@ -23,112 +45,201 @@ class IntegrationAgent:
         prompt: str,
         har_file_path: str,
         cookie_path: str,
+        streaming_parser: bool = False,
+        har_cache_dir: Optional[str] = None,
+        search_workers: int = 1,
+        concurrency: int = 8,
+        batch_token_budget: Optional[int] = None,
+        end_url_top_k: Optional[int] = 40,
+        end_url_token_budget: Optional[int] = 8000,
+        local_dynamic_detection: bool = True,
     ):  
         self.prompt: str = prompt
         self.duplicate_part_set: Set[str] = set()
         self.global_master_node: Optional[str] = None
-        self.req_to_res_map: Dict[Request, str] = parse_har_file(har_file_path)
-        self.url_to_res_req_dict: Dict[str, Dict[str, Any]] = build_url_to_req_res_map(self.req_to_res_map)
-        self.har_urls: List[Tuple[str, str, str, str]] = get_har_urls(har_file_path)
+        self.har_index: HarIndex = load_har_index(
+            har_file_path, streaming=streaming_parser, cache_dir=har_cache_dir
+        )
+        self.req_to_res_map: Dict[Request, Dict[str, str]] = self.har_index.req_to_res_map
+        self.url_to_res_req_dict: Dict[str, Dict[str, Any]] = self.har_index.url_to_req_res_map
+        self.har_urls: List[Tuple[str, str, str, str]] = self.har_index.har_urls
         self.cookie_dict: Dict[str, Dict[str, Any]] = parse_cookie_file_to_dict(cookie_path)
-        self.curl_to_id_dict: Dict[str, str] = {}
-        self.cookie_to_id_dict: Dict[str, str] = {}
-        self.dag_manager: DAGManager = DAGManager()
-
-    def end_url_identify_agent(self, state: AgentState) -> AgentState:
+        self.cookie_values: Set[str] = cookie_values_of(self.cookie_dict)
+        self.curl_to_id_dict: Dict[Request, int] = {}
+        self.cookie_to_id_dict: Dict[str, int] = {}
+        self.dag_manager: DAGManager = DAGManager(self.req_to_res_map)
+        self.global_master_node_id: Optional[int] = None
+        self.search_workers: int = search_workers
+        self.concurrency: int = concurrency
+        # Pack the dynamic part identification of a frontier into calls of about this many cURL tokens
+        self.batch_token_budget: Optional[int] = batch_token_budget
+        # Only the most relevant HAR URLs, within a token budget, are sent to the end URL identification
+        self.end_url_top_k: Optional[int] = end_url_top_k
+        self.end_url_token_budget: Optional[int] = end_url_token_budget
+        # Use the dynamic tokens detected at ingestion to skip or annotate the dynamic part identification
+        self.local_dynamic_detection: bool = local_dynamic_detection
+        self._content_searcher: Optional[ContentSearcher] = None
+        self._content_searcher_lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        The DAG and id maps built so far, checkpointed with the graph state after every step
         """
-        Identify the URL responsible for a specific action
-        """
-        function_def = {
-            "name": "identify_end_url",
-            "description": "Identify the URL responsible for a specific action",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "url": {
-                        "type": "string",
-                        "description": f"The URL responsible for {self.prompt}"
-                    }
-                },
-                "required": ["url"]
-            }
+        return {
+            "dag_manager": self.dag_manager,
+            "curl_to_id_dict": self.curl_to_id_dict,
+            "cookie_to_id_dict": self.cookie_to_id_dict,
+            "global_master_node_id": self.global_master_node_id,
         }
 
-        prompt = f"""
-        {self.har_urls}
-        Task:
-        Given the above list of URLs, request types, and response formats, find the URL responsible for the action below:
-        {self.prompt}
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Continues from a checkpointed snapshot; request nodes resolve their responses in this agent's HAR index
         """
+        self.dag_manager = snapshot["dag_manager"]
+        self.dag_manager.responses = self.req_to_res_map
+        self.curl_to_id_dict = snapshot["curl_to_id_dict"]
+        self.cookie_to_id_dict = snapshot["cookie_to_id_dict"]
+        self.global_master_node_id = snapshot["global_master_node_id"]
+
+    @property
+    def content_searcher(self) -> ContentSearcher:
+        """
+        Lowercased search corpora over the HAR responses and cURLs, built on first use.
+        Searches may run in worker threads, so the corpora are built under a lock.
+        """
+        if self._content_searcher is None:
+            with self._content_searcher_lock:
+                if self._content_searcher is None:
+                    self._content_searcher = ContentSearcher(self.har_index.entries, workers=self.search_workers)
+        return self._content_searcher
 
-        response = llm.get_instance().invoke(
-            prompt,
-            functions=[function_def],
-            function_call={"name": "identify_end_url"}
-        )
-        
-        function_call = response.additional_kwargs['function_call']
-        end_url = json.loads(function_call['arguments'])['url']
+    def find_requests_with_search_strings(self, search_strings: List[str]) -> Dict[str, List[Request]]:
+        """
+        Returns, for each search string, the requests whose response provides it and whose own cURL does not
+        contain it. Requests with the exact value in their JSON response (from the provenance index) come
+        first, then the other responses containing it as a substring, in index order.
+        """
+        found = self.content_searcher.find(search_strings)
+        results = {}
+        for search_string in search_strings:
+            producers = [
+                request for request in self.har_index.provenance.producers(search_string)
+                if search_string.lower() not in str(request).lower()
+            ]
+            results[search_string] = list(dict.fromkeys(producers + found[search_string]))
+        return results
 
-        state[self.ACTION_URL_KEY] = end_url
-        return state
+    @staticmethod
+    def _invoke(stage: str, prompt: str, invoke_kwargs: Dict[str, Any], node_id: Optional[int] = None):
+        """
+        Calls the LLM, attributing the call to an agent stage and DAG node in the usage report
+        """
+        with usage_scope(stage, node_id):
+            return llm.get_instance().invoke(prompt, **invoke_kwargs)
 
-    def input_variables_identifying_agent(self, state: AgentState) -> AgentState:
+    @staticmethod
+    async def _ainvoke(stage: str, prompt: str, invoke_kwargs: Dict[str, Any], node_id: Optional[int] = None):
+        with usage_scope(stage, node_id):
+            return await llm.get_instance().ainvoke(prompt, **invoke_kwargs)
+
+    def end_url_candidates(self) -> List[Tuple[str, str, str, str]]:
         """
-        Identify input variables present in the cURL command
+        Returns the HAR URLs offered to the end URL identification: the `end_url_top_k` most relevant
+        to the prompt by a local BM25 ranking, in capture order, or all of them without a limit.
         """
-        in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
-        curl = self.dag_manager.graph.nodes[in_process_node_id]["content"]["key"].to_curl_command()
-        input_variables = state[self.INPUT_VARIABLES_KEY]
-        if not input_variables:
-            return state
-        
-        function_def = {
-            "name": "identify_input_variables",
-            "description": "Identify input variables present in the cURL command.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "identified_variables": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "variable_name": {"type": "string", "description": "The original key of the variable"},
-                                "variable_value": {"type": "string", "description": "The exact version of the variable that is present in the cURL command. This should closely match the value in the provided Input Variables."}
-                            },
-                            "required": ["variable_name", "variable_value"]
-                        },
-                        "description": "A list of identified variables and their values."
-                    }
-                },
-                "required": ["identified_variables"]
-            }
-        }
+        if not self.end_url_top_k:
+            return list(self.har_urls)
+        return [self.har_urls[i] for i in rank_har_urls(self.har_urls, self.prompt, self.end_url_top_k)]
 
+    def _end_url_chunks(self, candidates: List[Tuple[str, str, str, str]]) -> List[List[Tuple[str, str, str, str]]]:
+        """
+        Splits the candidates into chunks that fit the end URL token budget.
+        A single chunk means they can all be sent in one prompt.
+        """
+        if not self.end_url_token_budget:
+            return [candidates]
+        batches = pack_by_token_budget([str(candidate) for candidate in candidates], self.end_url_token_budget)
+        if len(batches) == len(candidates) and len(candidates) > 1:
+            # Every candidate alone exceeds the budget, a tournament would never converge
+            return [candidates]
+        return [[candidates[i] for i in batch] for batch in batches]
 
-        prompt = f"""
-        cURL: {curl}
-        Input Variables: {input_variables}
+    @staticmethod
+    def _chunk_winner(chunk: List[Tuple[str, str, str, str]], end_url: str) -> Tuple[str, str, str, str]:
+        # The model may answer with a URL outside the chunk; keep the chunk's first entry then
+        return next((candidate for candidate in chunk if candidate[1] == end_url), chunk[0])
 
-        Task:
-        Identify which input variables (the value in the key-value pair) from the Input Variables provided above are present in the cURL command.
+    def _end_url_call(self, candidates: List[Tuple[str, str, str, str]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Returns the prompt and invoke kwargs identifying the URL responsible for the action among the candidates
+        """
+        return END_URL.render(action=self.prompt, candidates=candidates), END_URL.invoke_kwargs()
 
-        Important:
-        - If an input variable is found in the cURL, include it in the output.
-        - Do not include variables that are not provided above.
-        - The key of the input variable is a description of the variable.
-        - The value is the value that should closely match the value in the cURL command. No substitutions.
+    @staticmethod
+    def _parse_end_url(response) -> str:
+        function_call = response.additional_kwargs['function_call']
+        return json.loads(function_call['arguments'])['url']
 
+    def end_url_identify_agent(self, state: AgentState) -> AgentState:
         """
+        Identify the URL responsible for a specific action.
+        Candidates that do not fit the token budget compete in chunks; the chunk winners go to the next round.
+        """
+        candidates = self.end_url_candidates()
+        chunks = self._end_url_chunks(candidates)
+        while len(chunks) > 1:
+            candidates = [
+                self._chunk_winner(chunk, self._parse_end_url(self._invoke("end_url", *self._end_url_call(chunk))))
+                for chunk in chunks
+            ]
+            chunks = self._end_url_chunks(candidates)
+
+        prompt, invoke_kwargs = self._end_url_call(candidates)
+        response = self._invoke("end_url", prompt, invoke_kwargs)
+        state[self.ACTION_URL_KEY] = self._parse_end_url(response)
+        return state
 
+    async def _aend_url_chunk_winner(
+        self, chunk: List[Tuple[str, str, str, str]], semaphore: asyncio.Semaphore
+    ) -> Tuple[str, str, str, str]:
+        prompt, invoke_kwargs = self._end_url_call(chunk)
+        async with semaphore:
+            response = await self._ainvoke("end_url", prompt, invoke_kwargs)
+        return self._chunk_winner(chunk, self._parse_end_url(response))
 
-        response = llm.get_instance().invoke(
-            prompt,
-            functions=[function_def],
-            function_call={"name": "identify_input_variables"}
-        )
+    async def aend_url_identify_agent(self, state: AgentState) -> AgentState:
+        """
+        Async variant of end_url_identify_agent; the chunks of a tournament round are judged concurrently
+        """
+        candidates = self.end_url_candidates()
+        chunks = self._end_url_chunks(candidates)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while len(chunks) > 1:
+            candidates = list(
+                await asyncio.gather(*(self._aend_url_chunk_winner(chunk, semaphore) for chunk in chunks))
+            )
+            chunks = self._end_url_chunks(candidates)
+
+        prompt, invoke_kwargs = self._end_url_call(candidates)
+        response = await self._ainvoke("end_url", prompt, invoke_kwargs)
+        state[self.ACTION_URL_KEY] = self._parse_end_url(response)
+        return state
+
+    def _input_variables_call(self, state: AgentState) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Returns the prompt and invoke kwargs identifying the input variables of the in-process node,
+        or None when there are no input variables to look for
+        """
+        in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
+        curl = self.dag_manager.nodes[in_process_node_id].key.to_curl_command()
+        input_variables = state[self.INPUT_VARIABLES_KEY]
+        if not input_variables:
+            return None
+        return INPUT_VARIABLES.render(input_variables=input_variables, curl=curl), INPUT_VARIABLES.invoke_kwargs()
 
+    def _apply_input_variables(self, state: AgentState, response) -> AgentState:
+        in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
         function_call = response.additional_kwargs.get('function_call', {})
         arguments = json.loads(function_call.get('arguments', '{}'))
         identified_variables = arguments.get('identified_variables', [])
@@ -137,77 +248,128 @@ class IntegrationAgent:
             # Convert the identified_variables format
             converted_variables = {item['variable_name']: item['variable_value'] for item in identified_variables}
             
-            current_dynamic_parts = self.dag_manager.graph.nodes[in_process_node_id].get("dynamic_parts", [])
+            current_dynamic_parts = self.dag_manager.nodes[in_process_node_id].dynamic_parts or []
             updated_dynamic_parts = [part for part in current_dynamic_parts if part not in converted_variables.values()]
             self.dag_manager.update_node(in_process_node_id, dynamic_parts=updated_dynamic_parts, input_variables=converted_variables)
 
         return state
 
-    def dynamic_part_identifying_agent(self, state: AgentState) -> AgentState:
+    def input_variables_identifying_agent(self, state: AgentState) -> AgentState:
         """
-        Identify dynamic parts present in the cURL command
+        Identify input variables present in the cURL command
         """
-        in_process_node_id = state[self.TO_BE_PROCESSED_NODES_KEY].pop()
-        request = self.dag_manager.graph.nodes[in_process_node_id]["content"]["key"]
-        curl = request.to_minified_curl_command()
-        if curl.endswith(".js'"):
-            self.dag_manager.update_node(in_process_node_id, dynamic_parts=[])
-            state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY] = [] 
-            state[self.IN_PROCESS_NODE_KEY] = in_process_node_id
+        call = self._input_variables_call(state)
+        if call is None:
             return state
-        
+        prompt, invoke_kwargs = call
+        response = self._invoke("input_variables", prompt, invoke_kwargs, state[self.IN_PROCESS_NODE_KEY])
+        return self._apply_input_variables(state, response)
 
-        input_variables = state[self.INPUT_VARIABLES_KEY]            
+    async def ainput_variables_identifying_agent(self, state: AgentState) -> AgentState:
+        """
+        Async variant of input_variables_identifying_agent
+        """
+        call = self._input_variables_call(state)
+        if call is None:
+            return state
+        prompt, invoke_kwargs = call
+        response = await self._ainvoke("input_variables", prompt, invoke_kwargs, state[self.IN_PROCESS_NODE_KEY])
+        return self._apply_input_variables(state, response)
 
-        function_def = {
-            "name": "identify_dynamic_parts",
-            "description": (
-                "Given the above cURL command, identify which parts are dynamic and validated by the server "
-                "for correctness (e.g., IDs, tokens, session variables). Exclude any parameters that represent "
-                "arbitrary user input or general data that can be hardcoded (e.g., amounts, notes, messages)."
-            ),
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "dynamic_parts": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": (
-                            "List of dynamic parts identified in the cURL command. Do not include duplicates. "
-                            "Only strictly include the dynamic values (not the keys or any not extra part in front and after the value) of parts that are unique to a user or session "
-                            "and, if incorrect, will cause the request to fail."
-                            "Do not include the keys, only the values."
-                        ),
-                    }
-                },
-                "required": ["dynamic_parts"],
-            },
-        }
+    def _dynamic_token_candidates(self, in_process_node_id: int) -> List[TokenCandidate]:
+        """
+        Returns the likely dynamic values the local detector found in a node's request, most confident first
+        """
+        if not self.local_dynamic_detection:
+            return []
+        request = self.dag_manager.nodes[in_process_node_id].key
+        return self.har_index.dynamic_tokens.get(request, [])
 
-        prompt = f"""
-        URL: {curl}
+    @staticmethod
+    def _local_dynamic_parts(candidates: List[TokenCandidate]) -> Optional[List[str]]:
+        """
+        Returns the dynamic parts of a request when the local detector is certain of every candidate,
+        None when the LLM has to decide
+        """
+        certain, uncertain = split_certain(candidates)
+        if certain and not uncertain:
+            return certain
+        return None
 
-        Task:
+    def _dynamic_parts_prompt_curl(self, in_process_node_id: int, curl: str) -> str:
+        """
+        Returns the cURL command sent for dynamic part identification: without the common browser
+        headers when local detection is on, since the prompt tells the model to ignore them anyway
+        """
+        if not self.local_dynamic_detection:
+            return curl
+        return self.dag_manager.nodes[in_process_node_id].key.to_compact_curl_command()
 
-        Use your best judgment to identify which parts of the cURL command are dynamic, specific to a user or session, and are checked by the server for validity. These include tokens, IDs, session variables, or any other values that are unique to a user or session and, if incorrect, will cause the request to fail.
+    @staticmethod
+    def _format_token_hints(candidates: List[TokenCandidate]) -> str:
+        return "; ".join(f"{candidate.value} ({', '.join(candidate.reasons)})" for candidate in candidates)
 
-        Important:
-            - IGNORE THE COOKIE HEADER
-            - Ignore common headers like user-agent, sec-ch-ua, accept-encoding, referer, etc.
-            - Exclude parameters that represent arbitrary user input or general data that can be hardcoded, such as amounts, notes, messages, actions, etc.
-            - Only output the variable values and not the keys.
-            - Only include dynamic parts that are unique identifiers, tokens, or session variables.
+    def _dynamic_parts_call(self, curl: str, candidates: List[TokenCandidate] = ()) -> Tuple[str, Dict[str, Any]]:
+        """
+        Returns the prompt and invoke kwargs identifying the dynamic parts of a minified cURL command,
+        annotated with the values the local detector flagged
+        """
+        hints = DYNAMIC_PARTS_HINTS.format(hints=self._format_token_hints(candidates)) if candidates else ""
+        return DYNAMIC_PARTS.render(curl=curl, hints=hints), DYNAMIC_PARTS.invoke_kwargs()
 
+    def _next_node_curl(self, state: AgentState) -> Tuple[int, Optional[str]]:
+        """
+        Pops the next node to process. Returns its id and its minified cURL,
+        or None as the cURL when the node needs no dynamic part identification
         """
+        in_process_node_id = state[self.TO_BE_PROCESSED_NODES_KEY].pop()
+        request = self.dag_manager.nodes[in_process_node_id].key
+        curl = request.to_minified_curl_command()
+        if curl.endswith(".js'"):
+            self.dag_manager.update_node(in_process_node_id, dynamic_parts=[])
+            state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY] = [] 
+            state[self.IN_PROCESS_NODE_KEY] = in_process_node_id
+            return in_process_node_id, None
+        return in_process_node_id, curl
+
+    @staticmethod
+    def _parse_dynamic_parts(response) -> List[str]:
+        function_call = response.additional_kwargs['function_call']
+        return json.loads(function_call['arguments'])['dynamic_parts']
 
-        response = llm.get_instance().invoke(
-            prompt,
-            functions=[function_def],
-            function_call={"name": "identify_dynamic_parts"}
+    def _dynamic_parts_batch_call(
+        self, curls: List[str], candidates: Optional[List[List[TokenCandidate]]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Returns the prompt and invoke kwargs identifying the dynamic parts of several minified cURL commands at once,
+        annotated with the values the local detector flagged in each
+        """
+        numbered_curls = "\n".join(f"[{i}] {curl}" for i, curl in enumerate(curls))
+        hints = "\n".join(
+            f"[{i}] {self._format_token_hints(request_candidates)}"
+            for i, request_candidates in enumerate(candidates or [])
+            if request_candidates
         )
+        if hints:
+            hints = DYNAMIC_PARTS_BATCH_HINTS.format(hints=hints)
+        return DYNAMIC_PARTS_BATCH.render(curls=numbered_curls, hints=hints), DYNAMIC_PARTS_BATCH.invoke_kwargs()
 
-        function_call = response.additional_kwargs['function_call']
-        dynamic_parts = json.loads(function_call['arguments'])['dynamic_parts']
+    @staticmethod
+    def _parse_dynamic_parts_batch(response, batch_size: int) -> List[Optional[List[str]]]:
+        """
+        Returns the dynamic parts of each cURL command of a batch, None for the ones the model skipped
+        """
+        function_call = response.additional_kwargs.get('function_call', {})
+        arguments = json.loads(function_call.get('arguments', '{}'))
+        results: List[Optional[List[str]]] = [None] * batch_size
+        for item in arguments.get('requests', []):
+            index = item.get('index')
+            if isinstance(index, int) and 0 <= index < batch_size and results[index] is None:
+                results[index] = list(item.get('dynamic_parts', []))
+        return results
+
+    def _apply_dynamic_parts(self, state: AgentState, in_process_node_id: int, curl: str, dynamic_parts: List[str]) -> AgentState:
+        input_variables = state[self.INPUT_VARIABLES_KEY]            
 
         self.dag_manager.update_node(in_process_node_id, dynamic_parts=dynamic_parts)
 
@@ -224,82 +386,126 @@ class IntegrationAgent:
         state[self.IN_PROCESS_NODE_KEY] = in_process_node_id
         return state
 
+    def dynamic_part_identifying_agent(self, state: AgentState) -> AgentState:
+        """
+        Identify dynamic parts present in the cURL command
+        """
+        in_process_node_id, curl = self._next_node_curl(state)
+        if curl is None:
+            return state
+        candidates = self._dynamic_token_candidates(in_process_node_id)
+        local_dynamic_parts = self._local_dynamic_parts(candidates)
+        if local_dynamic_parts is not None:
+            return self._apply_dynamic_parts(state, in_process_node_id, curl, local_dynamic_parts)
+        prompt, invoke_kwargs = self._dynamic_parts_call(self._dynamic_parts_prompt_curl(in_process_node_id, curl), candidates)
+        response = self._invoke("dynamic_parts", prompt, invoke_kwargs, in_process_node_id)
+        return self._apply_dynamic_parts(state, in_process_node_id, curl, self._parse_dynamic_parts(response))
+
+    async def adynamic_part_identifying_agent(self, state: AgentState) -> AgentState:
+        """
+        Async variant of dynamic_part_identifying_agent
+        """
+        in_process_node_id, curl = self._next_node_curl(state)
+        if curl is None:
+            return state
+        candidates = self._dynamic_token_candidates(in_process_node_id)
+        local_dynamic_parts = self._local_dynamic_parts(candidates)
+        if local_dynamic_parts is not None:
+            return self._apply_dynamic_parts(state, in_process_node_id, curl, local_dynamic_parts)
+        prompt, invoke_kwargs = self._dynamic_parts_call(self._dynamic_parts_prompt_curl(in_process_node_id, curl), candidates)
+        response = await self._ainvoke("dynamic_parts", prompt, invoke_kwargs, in_process_node_id)
+        return self._apply_dynamic_parts(state, in_process_node_id, curl, self._parse_dynamic_parts(response))
+
     def url_to_curl(self, state: AgentState) -> AgentState:
         """
         Identify the master cURL command responsible for the action
         """
         request = self.url_to_res_req_dict[state["action_url"]]["request"]
-        curl = request.to_curl_command()
-        if curl in self.curl_to_id_dict:
-            master_node_id = self.curl_to_id_dict[curl]
+        if request in self.curl_to_id_dict:
+            master_node_id = self.curl_to_id_dict[request]
         else:
             master_node_id = self.dag_manager.add_node(
                 node_type="master_curl",  # Specify node type
-                content={
-                    "key": request,
-                    "value": self.req_to_res_map[request]
-                },
+                key=request,
                 dynamic_parts=["None"],
                 extracted_parts=["None"]
             )
-            self.curl_to_id_dict[curl] = master_node_id
+            self.curl_to_id_dict[request] = master_node_id
         state[self.MASTER_NODE_KEY] = master_node_id
         state[self.TO_BE_PROCESSED_NODES_KEY].append(master_node_id)
         self.global_master_node_id = master_node_id
         return state
 
-    def get_simplest_request(self, request_list: List[Request]) -> Request:
+    async def aurl_to_curl(self, state: AgentState) -> AgentState:
         """
-        Find the index of the simplest cURL command from a list
-        """
-        function_def = {
-            "name": "get_simplest_curl_index",
-            "description": "Find the index of the simplest cURL command from a list",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "index": {
-                        "type": "integer",
-                        "description": "The index of the simplest cURL command in the list"
-                    }
-                },
-                "required": ["index"]
-            }
-        }
-        # convert request objects to strings
-        serializable_list = [str(req) for req in request_list]
-
-        prompt = f"""
-        {json.dumps(serializable_list)}
-        Task:
-        Given the above list of cURL commands, find the index of the curl that has the least number of dependencies and variables.
-        The index should be 0-based (i.e., the first item has index 0).
+        Async variant of url_to_curl (a dictionary lookup, run inline)
         """
+        return self.url_to_curl(state)
 
-        response = llm.get_instance().invoke(
-            prompt,
-            functions=[function_def],
-            function_call={"name": "get_simplest_curl_index"}
+    def _simplest_request_candidates(self, request_list: List[Request]) -> List[Request]:
+        """
+        Ranks the requests with the local dependency scorer and returns those tied for simplest, best first
+        """
+        return simplest_candidates(
+            request_list,
+            self.req_to_res_map,
+            self.cookie_values,
+            max_candidates=MAX_TIE_BREAK_CANDIDATES,
         )
 
+    def _simplest_request_call(self, request_list: List[Request]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Returns the prompt and invoke kwargs choosing the simplest cURL command from a list.
+        The minified cURLs are capped in size, large bodies would only add noise to the choice.
+        """
+        # convert request objects to size-capped strings
+        serializable_list = [truncate(req.to_minified_curl_command(), MAX_TIE_BREAK_CURL_CHARS) for req in request_list]
+        return SIMPLEST_REQUEST.render(curls=json.dumps(serializable_list)), SIMPLEST_REQUEST.invoke_kwargs()
+
+    @staticmethod
+    def _apply_simplest_request(request_list: List[Request], response) -> Request:
         function_call = response.additional_kwargs['function_call']
         simplest_curl_index = json.loads(function_call['arguments'])['index']
         
-        # Retrieve the actual cURL command using the index
+        # Retrieve the actual cURL command using the index; the candidates are ranked, so fall back to the first
+        if not isinstance(simplest_curl_index, int) or not 0 <= simplest_curl_index < len(request_list):
+            return request_list[0]
         simplest_curl = request_list[simplest_curl_index]
         return simplest_curl
 
-    def find_curl_from_content(self, state: AgentState) -> AgentState:
+    def get_simplest_request(self, request_list: List[Request]) -> Request:
         """
-        Find the cURL command that contains the dynamic parts
+        Find the simplest request from a list. A local scorer ranks them by dependencies;
+        the LLM only breaks ties between the best-scored ones.
+        """
+        candidates = self._simplest_request_candidates(request_list)
+        if len(candidates) == 1:
+            return candidates[0]
+        prompt, invoke_kwargs = self._simplest_request_call(candidates)
+        response = self._invoke("simplest_request", prompt, invoke_kwargs)
+        return self._apply_simplest_request(candidates, response)
+
+    async def aget_simplest_request(self, request_list: List[Request]) -> Request:
+        """
+        Async variant of get_simplest_request
+        """
+        candidates = self._simplest_request_candidates(request_list)
+        if len(candidates) == 1:
+            return candidates[0]
+        prompt, invoke_kwargs = self._simplest_request_call(candidates)
+        response = await self._ainvoke("simplest_request", prompt, invoke_kwargs)
+        return self._apply_simplest_request(candidates, response)
+
+    def _link_cookies(self, state: AgentState) -> List[str]:
+        """
+        Links the in-process node to the cookies holding its dynamic parts.
+        Returns the dynamic parts left to find in responses.
         """
         search_string_list = state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY]
         search_string_list_leftovers = search_string_list.copy()
 
         in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
-        new_to_be_processed_nodes = []
 
-        # Handle cookies
         for search_string in search_string_list_leftovers[:]:
             cookie_key = self.find_key_by_string_in_value(
                 self.cookie_dict, search_string
@@ -311,96 +517,255 @@ class IntegrationAgent:
                 else:
                     cookie_node_id = self.dag_manager.add_node(
                         node_type="cookie",  # Specify node type
-                        content={
-                            "key": cookie_key,
-                            "value": search_string
-                        }, 
+                        key=cookie_key,
+                        value=search_string,
                         extracted_parts=[search_string]
                     )
                     self.cookie_to_id_dict[cookie_key] = cookie_node_id
                     #dont need to add node to to_be_processed_nodes because cookies dont need further processing
                 self.dag_manager.add_edge(in_process_node_id, cookie_node_id)
+        return search_string_list_leftovers
+
+    def _link_producer(
+        self,
+        in_process_node_id: int,
+        search_string: str,
+        simplest_request: Optional[Request],
+        new_to_be_processed_nodes: List[int],
+    ) -> None:
+        """
+        Links the in-process node to the request producing one of its dynamic parts,
+        creating the request's node on first sight.
+        """
+        if simplest_request is None:
+            print(f"Could not find curl with search string: {search_string} in response")
+            not_found_node_id = self.dag_manager.add_node(
+                node_type="not found",
+                key=search_string,
+            )
+            self.dag_manager.add_edge(in_process_node_id, not_found_node_id)
+            return
+
+        if simplest_request.url.endswith(".js") or "text/html" in self.req_to_res_map[simplest_request]["type"]:
+            current_dynamic_parts = self.dag_manager.nodes[in_process_node_id].dynamic_parts or []
+            updated_dynamic_parts = [part for part in current_dynamic_parts if part != search_string]
+            self.dag_manager.update_node(in_process_node_id, dynamic_parts=updated_dynamic_parts)
+            return
+
+        if simplest_request not in self.curl_to_id_dict:
+            curl_node_id = self.dag_manager.add_node(
+                node_type="curl",  # Specify node type
+                key=simplest_request,
+                extracted_parts=[search_string]
+            )
+            self.curl_to_id_dict[simplest_request] = curl_node_id
+            new_to_be_processed_nodes.append(curl_node_id)
+        else:
+            # append new extracted part to existing curl node
+            curl_node_id = self.curl_to_id_dict[simplest_request]
+            node = self.dag_manager.get_node(curl_node_id)
+            new_extracted_parts = node.extracted_parts or []
+            new_extracted_parts.append(search_string)
+            # Remove duplicates from new_extracted_parts
+            new_extracted_parts = list(dict.fromkeys(new_extracted_parts))
+
+            self.dag_manager.update_node(curl_node_id, extracted_parts=new_extracted_parts)
+
+        # Keep the JSON key paths of the extracted part for code generation
+        key_paths = self.har_index.provenance.key_paths(search_string, simplest_request)
+        if key_paths:
+            extracted_key_paths = self.dag_manager.nodes[curl_node_id].extracted_key_paths or {}
+            extracted_key_paths[search_string] = key_paths
+            self.dag_manager.update_node(curl_node_id, extracted_key_paths=extracted_key_paths)
+
+        self.dag_manager.add_edge(in_process_node_id, curl_node_id)
+
+    def _finish_find_curl(self, state: AgentState, new_to_be_processed_nodes: List[int]) -> AgentState:
+        state[self.TO_BE_PROCESSED_NODES_KEY].extend(new_to_be_processed_nodes)
+        state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY] = []
+        return state
+
+    def find_curl_from_content(self, state: AgentState) -> AgentState:
+        """
+        Find the cURL command that contains the dynamic parts
+        """
+        in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
+        new_to_be_processed_nodes = []
+        search_string_list_leftovers = self._link_cookies(state)
 
         # Handle curls
         if search_string_list_leftovers:
-            for search_string in search_string_list_leftovers[:]:
-                requests_with_search_string = []
-
-                for request, response in self.req_to_res_map.items():
-                    curl = str(request)
-                    if (
-                        (
-                            isinstance(curl, str)
-                            and search_string.lower() in response["text"].lower()
-                        )
-                        and (search_string.lower() not in curl.lower())
-                    ) or (
-                        urllib.parse.unquote(search_string) in curl
-                        and (urllib.parse.unquote(search_string) not in curl)
-                    ):
-                        requests_with_search_string.append(request)
-                simplest_request = ""
-
+            # Requests whose response contains the search string but whose own cURL does not
+            search_results = self.find_requests_with_search_strings(search_string_list_leftovers)
+            for search_string in search_string_list_leftovers:
+                requests_with_search_string = search_results[search_string]
                 # Get simplest curl to reduce number of dependencies
                 if len(requests_with_search_string) > 1:
                     simplest_request = self.get_simplest_request(requests_with_search_string)
-                elif len(requests_with_search_string) == 1:
-                    simplest_request = requests_with_search_string[0]
                 else:
-                    print(f"Could not find curl with search string: {search_string} in response")
-                    not_found_node_id = self.dag_manager.add_node(
-                        node_type="not found",
-                        content={
-                            "key": search_string
-                        },
-                    )
-                    self.dag_manager.add_edge(in_process_node_id, not_found_node_id)
-                    search_string_list_leftovers.remove(search_string)
+                    simplest_request = next(iter(requests_with_search_string), None)
+                self._link_producer(in_process_node_id, search_string, simplest_request, new_to_be_processed_nodes)
 
-                    continue
-        
-                        
-                if simplest_request.url.endswith(".js") or "text/html" in self.req_to_res_map[simplest_request]["type"]:
-                    current_dynamic_parts = self.dag_manager.graph.nodes[in_process_node_id].get("dynamic_parts", [])
-                    updated_dynamic_parts = [part for part in current_dynamic_parts if part != search_string]
-                    self.dag_manager.update_node(in_process_node_id, dynamic_parts=updated_dynamic_parts)
-                    search_string_list_leftovers.remove(search_string)
-                    continue    
-                
-      
-
-
-                if simplest_request not in self.curl_to_id_dict:
-                    if simplest_request.url.endswith(".js"):
-                        self.dag_manager.update_node(in_process_node_id, dynamic_parts=[])
-                        continue    
-
-                    curl_node_id = self.dag_manager.add_node(
-                        node_type="curl",  # Specify node type
-                    content={
-                        "key": simplest_request,
-                        "value": self.req_to_res_map[simplest_request]
-                    },
-                    extracted_parts=[search_string]
-                    )
-                    self.curl_to_id_dict[simplest_request] = curl_node_id
-                    new_to_be_processed_nodes.append(curl_node_id)
-                else:
-                    # append new extracted part to existing curl node
-                    curl_node_id = self.curl_to_id_dict[simplest_request]
-                    node = self.dag_manager.get_node(curl_node_id)
-                    new_extracted_parts = node.get("extracted_parts", [])
-                    new_extracted_parts.append(search_string)
-                    # Remove duplicates from new_extracted_parts
-                    new_extracted_parts = list(dict.fromkeys(new_extracted_parts))
-
-                    self.dag_manager.update_node(curl_node_id, extracted_parts=new_extracted_parts)
-
-                self.dag_manager.add_edge(in_process_node_id, curl_node_id)
-                
-        state[self.TO_BE_PROCESSED_NODES_KEY].extend(new_to_be_processed_nodes)
-        state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY] = []
-        return state
+        return self._finish_find_curl(state, new_to_be_processed_nodes)
+
+    async def _achoose_request(self, request_list: List[Request], semaphore: asyncio.Semaphore) -> Optional[Request]:
+        # Get simplest curl to reduce number of dependencies
+        if len(request_list) > 1:
+            async with semaphore:
+                return await self.aget_simplest_request(request_list)
+        return next(iter(request_list), None)
+
+    async def _aresolve_producers(
+        self, search_strings: List[str], semaphore: asyncio.Semaphore
+    ) -> Dict[str, Optional[Request]]:
+        """
+        Returns the request chosen to produce each search string, or None when no response contains it.
+        All strings are searched together in a worker thread, so the event loop stays free while the
+        corpora are built and scanned; ambiguous strings are then resolved concurrently.
+        """
+        search_strings = list(dict.fromkeys(search_strings))
+        if not search_strings:
+            return {}
+        search_results = await asyncio.to_thread(self.find_requests_with_search_strings, search_strings)
+        choices = await asyncio.gather(
+            *(self._achoose_request(search_results[search_string], semaphore) for search_string in search_strings)
+        )
+        return dict(zip(search_strings, choices))
+
+    def _cookie_free_parts(self, dynamic_parts: List[str]) -> List[str]:
+        return [part for part in dynamic_parts if self.find_key_by_string_in_value(self.cookie_dict, part) is None]
+
+    async def afind_curl_from_content(self, state: AgentState) -> AgentState:
+        """
+        Async variant of find_curl_from_content
+        """
+        in_process_node_id = state[self.IN_PROCESS_NODE_KEY]
+        new_to_be_processed_nodes = []
+        producers = await self._aresolve_producers(
+            self._cookie_free_parts(state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY]), asyncio.Semaphore(self.concurrency)
+        )
+
+        for search_string in self._link_cookies(state):
+            self._link_producer(in_process_node_id, search_string, producers[search_string], new_to_be_processed_nodes)
+
+        return self._finish_find_curl(state, new_to_be_processed_nodes)
+
+    async def _aidentify_dynamic_parts(
+        self, node_id: int, curl: str, candidates: List[TokenCandidate], semaphore: asyncio.Semaphore
+    ) -> List[str]:
+        prompt, invoke_kwargs = self._dynamic_parts_call(curl, candidates)
+        async with semaphore:
+            response = await self._ainvoke("dynamic_parts", prompt, invoke_kwargs, node_id)
+        return self._parse_dynamic_parts(response)
+
+    async def _aidentify_dynamic_parts_batch(
+        self,
+        node_ids: List[int],
+        curls: List[str],
+        candidates: List[List[TokenCandidate]],
+        semaphore: asyncio.Semaphore,
+    ) -> List[List[str]]:
+        """
+        Identifies the dynamic parts of several cURL commands with one call. A single command keeps
+        the per-request prompt, and commands the model left out of its answer are asked for on their own.
+        """
+        if len(curls) == 1:
+            return [await self._aidentify_dynamic_parts(node_ids[0], curls[0], candidates[0], semaphore)]
+
+        prompt, invoke_kwargs = self._dynamic_parts_batch_call(curls, candidates)
+        async with semaphore:
+            # One call for several nodes, attributed to the stage only
+            response = await self._ainvoke("dynamic_parts_batch", prompt, invoke_kwargs)
+        results = self._parse_dynamic_parts_batch(response, len(curls))
+
+        missing = [i for i, dynamic_parts in enumerate(results) if dynamic_parts is None]
+        retried = await asyncio.gather(
+            *(self._aidentify_dynamic_parts(node_ids[i], curls[i], candidates[i], semaphore) for i in missing)
+        )
+        for i, dynamic_parts in zip(missing, retried):
+            results[i] = dynamic_parts
+        return results
+
+    async def _aidentify_frontier_dynamic_parts(self, node_states: List[AgentState], semaphore: asyncio.Semaphore) -> None:
+        """
+        Identifies the dynamic parts of every frontier node, one call per node or, with a batch
+        token budget, one call per batch of minified cURLs packed up to that budget. Nodes whose
+        dynamic parts the local detector is certain of need no call.
+        """
+        pending = []
+        for node_state in node_states:
+            in_process_node_id, curl = self._next_node_curl(node_state)
+            if curl is None:
+                continue
+            candidates = self._dynamic_token_candidates(in_process_node_id)
+            local_dynamic_parts = self._local_dynamic_parts(candidates)
+            if local_dynamic_parts is not None:
+                self._apply_dynamic_parts(node_state, in_process_node_id, curl, local_dynamic_parts)
+            else:
+                pending.append((node_state, in_process_node_id, curl, candidates))
+
+        node_ids = [in_process_node_id for _, in_process_node_id, _, _ in pending]
+        curls = [self._dynamic_parts_prompt_curl(in_process_node_id, curl) for _, in_process_node_id, curl, _ in pending]
+        candidates = [node_candidates for _, _, _, node_candidates in pending]
+        if self.batch_token_budget:
+            batches = pack_by_token_budget(curls, self.batch_token_budget)
+        else:
+            batches = [[i] for i in range(len(curls))]
+
+        batch_results = await asyncio.gather(
+            *(
+                self._aidentify_dynamic_parts_batch(
+                    [node_ids[i] for i in batch], [curls[i] for i in batch], [candidates[i] for i in batch], semaphore
+                )
+                for batch in batches
+            )
+        )
+        for batch, results in zip(batches, batch_results):
+            for i, dynamic_parts in zip(batch, results):
+                node_state, in_process_node_id, curl, _ = pending[i]
+                self._apply_dynamic_parts(node_state, in_process_node_id, curl, dynamic_parts)
+
+    async def _aidentify_input_variables(self, node_state: AgentState, semaphore: asyncio.Semaphore) -> AgentState:
+        async with semaphore:
+            return await self.ainput_variables_identifying_agent(node_state)
+
+    async def aprocess_frontier(self, state: AgentState) -> AgentState:
+        """
+        Processes every pending node in one step. Dynamic part and input variable identification
+        and the producer search run concurrently, at most `concurrency` LLM calls at a time; the
+        results are then merged into the DAG sequentially, in frontier order, so the graph does not
+        depend on which call finished first.
+        """
+        frontier = state[self.TO_BE_PROCESSED_NODES_KEY]
+        state[self.TO_BE_PROCESSED_NODES_KEY] = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Each node works on a private copy of the state
+        node_states = [
+            AgentState(state, in_process_node=None, to_be_processed_nodes=[node_id], in_process_node_dynamic_parts=[])
+            for node_id in frontier
+        ]
+        await self._aidentify_frontier_dynamic_parts(node_states, semaphore)
+        node_states = await asyncio.gather(
+            *(self._aidentify_input_variables(node_state, semaphore) for node_state in node_states)
+        )
+        producers = await self._aresolve_producers(
+            [
+                part
+                for node_state in node_states
+                for part in self._cookie_free_parts(node_state[self.IN_PROCESS_NODE_DYNAMIC_PARTS_KEY])
+            ],
+            semaphore,
+        )
+
+        new_to_be_processed_nodes = []
+        for node_state in node_states:
+            in_process_node_id = node_state[self.IN_PROCESS_NODE_KEY]
+            for search_string in self._link_cookies(node_state):
+                self._link_producer(in_process_node_id, search_string, producers[search_string], new_to_be_processed_nodes)
+            state[self.IN_PROCESS_NODE_KEY] = in_process_node_id
+
+        return self._finish_find_curl(state, new_to_be_processed_nodes)
 
     @staticmethod
     def find_key_by_string_in_value(dictionary: Dict[str, Dict[str, Any]], search_string: str) -> Optional[str]:
@@ -1,52 +1,71 @@
+import asyncio
 from langgraph.graph import END, StateGraph
 from integuru.models.agent_state import AgentState
 from integuru.agent import IntegrationAgent
 from functools import partial  # To pass extra arguments to functions
-from integuru.util.print import print_dag, visualize_dag, print_dag_in_reverse
+from integuru.util.print import print_dag, visualize_dag, aprint_dag_in_reverse
 
-def check_end_condition(state, agent, to_generate_code):
+async def check_end_condition(state, agent, to_generate_code):
     agent.dag_manager.detect_cycles()
 
+    # The compact DAG is exported to networkx only for printing and code generation
+    graph = agent.dag_manager.to_networkx()
     if len(state.get("to_be_processed_nodes", [])) == 0:
         print("------------------------Successfully analyzed!!!-------------------------------", flush=True)
-        print_dag(agent.dag_manager.graph, agent.global_master_node_id)
-        visualize_dag(agent.dag_manager.graph)
-        print_dag_in_reverse(agent.dag_manager.graph, to_generate_code=to_generate_code)
+        print_dag(graph, agent.global_master_node_id)
+        # Layout and rendering are CPU-bound
+        await asyncio.to_thread(visualize_dag, graph)
+        await aprint_dag_in_reverse(graph, to_generate_code=to_generate_code, concurrency=agent.concurrency)
         return "end"
     else:
         print("Continuing execution", flush=True)
-        print(f"Generated graph at current step: {print_dag(agent.dag_manager.graph, agent.global_master_node_id)}", flush=True)
+        print(f"Generated graph at current step: {print_dag(graph, agent.global_master_node_id)}", flush=True)
         return "continue"
 
 
-def build_graph(prompt, har_file_path="network_requests.har", cookie_path="cookies.json", to_generate_code=False):
-    agent = IntegrationAgent(prompt, har_file_path, cookie_path)
+# Graph step run after each step, to resume a run from its last completed step
+NEXT_STEP = {
+    "IntegrationAgent": "urlTocurl",
+    "urlTocurl": "processFrontier",
+    "processFrontier": "processFrontier",
+}
 
-    graph_builder = StateGraph(AgentState)
 
-    # Add nodes using the agent's methods
-    graph_builder.add_node("IntegrationAgent", agent.end_url_identify_agent)
-    graph_builder.set_entry_point("IntegrationAgent")
+def build_graph(prompt, har_file_path="network_requests.har", cookie_path="cookies.json", to_generate_code=False, streaming_parser=False, har_cache_dir=None, search_workers=1, concurrency=8, batch_token_budget=None, end_url_top_k=40, end_url_token_budget=8000, local_dynamic_detection=True, entry_point="IntegrationAgent"):
+    agent = IntegrationAgent(
+        prompt,
+        har_file_path,
+        cookie_path,
+        streaming_parser=streaming_parser,
+        har_cache_dir=har_cache_dir,
+        search_workers=search_workers,
+        concurrency=concurrency,
+        batch_token_budget=batch_token_budget,
+        end_url_top_k=end_url_top_k,
+        end_url_token_budget=end_url_token_budget,
+        local_dynamic_detection=local_dynamic_detection,
+    )
 
-    graph_builder.add_node("urlTocurl", agent.url_to_curl)
-    graph_builder.add_edge("IntegrationAgent", "urlTocurl")
+    graph_builder = StateGraph(AgentState)
 
-    graph_builder.add_node(
-        "dynamicurlDataIdentifyingAgent", agent.dynamic_part_identifying_agent
-    )
-    graph_builder.add_edge("urlTocurl", "dynamicurlDataIdentifyingAgent")
+    # Add nodes using the agent's async methods, so LLM calls and searches do not block the event loop
+    graph_builder.add_node("IntegrationAgent", agent.aend_url_identify_agent)
+    # A resumed run enters at the step after its last checkpoint
+    graph_builder.set_entry_point(entry_point)
 
-    graph_builder.add_node("inputVariablesIdentifyingAgent", agent.input_variables_identifying_agent)
-    graph_builder.add_edge("dynamicurlDataIdentifyingAgent", "inputVariablesIdentifyingAgent")
+    graph_builder.add_node("urlTocurl", agent.aurl_to_curl)
+    graph_builder.add_edge("IntegrationAgent", "urlTocurl")
 
-    graph_builder.add_node("findcurlFromContent", agent.find_curl_from_content)
-    graph_builder.add_edge("inputVariablesIdentifyingAgent", "findcurlFromContent")
+    # Each step processes the whole frontier of pending nodes concurrently,
+    # so the number of steps grows with the depth of the DAG, not its size
+    graph_builder.add_node("processFrontier", agent.aprocess_frontier)
+    graph_builder.add_edge("urlTocurl", "processFrontier")
 
     # Add conditional edges 
     graph_builder.add_conditional_edges(                
-        "findcurlFromContent",
+        "processFrontier",
         partial(check_end_condition, agent=agent, to_generate_code=to_generate_code),
-        {"end": END, "continue": "dynamicurlDataIdentifyingAgent"},
+        {"end": END, "continue": "processFrontier"},
     )
 
     graph = graph_builder.compile()
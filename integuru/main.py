@@ -1,6 +1,13 @@
-from typing import List
-from integuru.graph_builder import build_graph
+import asyncio
+from typing import Dict, List, Optional
+from integuru.graph_builder import NEXT_STEP, build_graph
+from integuru.util.checkpoint import FAILED, FINISHED, CheckpointStore
 from integuru.util.LLM import llm
+from integuru.util.llm_cache import LLMCache
+from integuru.util.llm_backends import Backend
+from integuru.util.llm_pool import ModelLimits
+from integuru.util.routing import StageRoute
+from integuru.util.usage import UsageRecorder, write_usage_report
 
 agent = None
 
@@ -12,25 +19,121 @@ async def call_agent(
     input_variables: dict = None,
     max_steps: int = 15,
     to_generate_code: bool = False,
+    streaming_parser: bool = False,
+    har_cache_dir: Optional[str] = None,
+    search_workers: int = 1,
+    concurrency: int = 8,
+    batch_token_budget: Optional[int] = None,
+    end_url_top_k: Optional[int] = 40,
+    end_url_token_budget: Optional[int] = 8000,
+    local_dynamic_detection: bool = True,
+    llm_cache: Optional[LLMCache] = None,
+    llm_limits: Optional[ModelLimits] = None,
+    routes: Optional[Dict[str, StageRoute]] = None,
+    llm_backend: Optional[Backend] = None,
+    usage_report: Optional[str] = "usage_report.json",
+    checkpoint_path: Optional[str] = None,
+    resume: Optional[str] = None,
 ):  
-    
+    """
+    Runs an analysis. With a checkpoint file, the run is checkpointed after every graph step, and
+    `resume` continues the run of that id from its last checkpoint with the arguments it was started with.
+    """
+    # Arguments a resumed run is rebuilt from
+    arguments = {
+        "model": model,
+        "input_variables": input_variables or {},
+        "prompt": prompt,
+        "har_file_path": har_file_path,
+        "cookie_path": cookie_path,
+        "to_generate_code": to_generate_code,
+        "streaming_parser": streaming_parser,
+        "har_cache_dir": har_cache_dir,
+        "search_workers": search_workers,
+        "concurrency": concurrency,
+        "batch_token_budget": batch_token_budget,
+        "end_url_top_k": end_url_top_k,
+        "end_url_token_budget": end_url_token_budget,
+        "local_dynamic_detection": local_dynamic_detection,
+    }
+    store = CheckpointStore(checkpoint_path) if checkpoint_path else None
+    checkpoint = None
+    if resume is not None:
+        if store is None:
+            raise ValueError("Resuming a run needs its checkpoint file")
+        checkpoint = store.load(resume)
+        if checkpoint.status == FINISHED:
+            print(f"Run {resume} already finished", flush=True)
+            return
+        arguments = checkpoint.arguments
+        run_id = resume
+    elif store is not None:
+        run_id = store.create_run(arguments)
+    if store is not None:
+        print(f"Checkpointing run {run_id} to '{store.path}'", flush=True)
+
+    graph_arguments = dict(arguments)
+    model = graph_arguments.pop("model")
+    input_variables = graph_arguments.pop("input_variables")
+
     llm.set_default_model(model)
+    llm.set_cache(llm_cache)
+    llm.set_routes(routes)
+    if llm_backend is not None:
+        llm.set_backend(llm_backend)
+    if llm_limits is not None:
+        # Analyses with the same backend and limits share their clients and rate limit budget
+        llm.set_limits(llm_limits)
+    usage = UsageRecorder()
+    llm.set_usage_recorder(usage)
 
     global agent
-    graph, agent = build_graph(prompt, har_file_path, cookie_path, to_generate_code)
+    entry_point = "IntegrationAgent"
+    step = 0
+    state = {
+        "master_node": None,
+        "in_process_node": None,
+        "to_be_processed_nodes": [],
+        "in_process_node_dynamic_parts": [],
+        "action_url": "",
+        "input_variables": input_variables,
+    }
+    if checkpoint is not None and checkpoint.node is not None:
+        entry_point = NEXT_STEP[checkpoint.node]
+        step = checkpoint.step
+        state = checkpoint.state
+        print(f"Resuming run {run_id} after step {step} ({checkpoint.node})", flush=True)
+
+    # Parsing the HAR (or loading its cached index) is CPU and disk bound, keep it off the event loop
+    graph, agent = await asyncio.to_thread(build_graph, **graph_arguments, entry_point=entry_point)
+    if checkpoint is not None and checkpoint.snapshot is not None:
+        agent.restore(checkpoint.snapshot)
     event_stream = graph.astream(
-        {
-            "master_node": None,
-            "in_process_node": None,
-            "to_be_processed_nodes": [],
-            "in_process_node_dynamic_parts": [],
-            "action_url": "",
-            "input_variables": input_variables or {},  
-        },
+        state,
         {
             "recursion_limit": max_steps,
         },
     )
-    async for event in event_stream:
-        # print("+++", event)
-        pass
+    try:
+        async for event in event_stream:
+            # One event per completed step: the step's graph node and the state it returned
+            for node, node_state in event.items():
+                step += 1
+                if store is not None and node_state is not None:
+                    store.save(run_id, step, node, node_state, agent.snapshot())
+    except BaseException:
+        if store is not None:
+            store.set_status(run_id, FAILED)
+            print(f"Run {run_id} stopped after step {step}; continue it with `integuru run --resume {run_id}`", flush=True)
+        raise
+    else:
+        if store is not None:
+            store.finish(run_id)
+    finally:
+        # Also on failure: a run that died is the one whose spend needs explaining
+        if usage_report:
+            try:
+                write_usage_report(usage, usage_report)
+            except Exception as e:
+                # Never hide the run's own error, or fail a finished run, for the report
+                print(f"Could not write the usage report to '{usage_report}': {e}", flush=True)
@@ -1,66 +1,255 @@
-from typing import List, Optional, Literal, Dict # Import Literal for type enforcement
+from array import array
+from typing import Any, Dict, Iterator, List, Literal, Mapping, Optional, Set, Tuple # Import Literal for type enforcement
 import networkx as nx
-import uuid
+
+
+class DAGNode:
+    """
+    A node of the DAG. `key` is the node's request, cookie name or unresolved value. The response of a
+    request node is not stored: it is looked up in the ingestion index when the node's content is read.
+    """
+
+    __slots__ = ("node_type", "key", "value", "dynamic_parts", "extracted_parts", "input_variables", "extracted_key_paths")
+
+    def __init__(
+        self,
+        node_type: str,
+        key: Any = None,
+        value: Any = None,
+        dynamic_parts: Optional[List[str]] = None,
+        extracted_parts: Optional[List[str]] = None,
+        input_variables: Optional[Dict[str, str]] = None,
+    ):
+        self.node_type = node_type
+        self.key = key
+        self.value = value
+        self.dynamic_parts = dynamic_parts
+        self.extracted_parts = extracted_parts
+        self.input_variables = input_variables
+        self.extracted_key_paths: Optional[Dict[str, Any]] = None
 
 
 class DAGManager:
-    NODE_TYPES = {"cookie", "master", "cURL"}  
-    
-    def __init__(self):
-        self.graph = nx.DiGraph()
-        self.root_id = None 
+    """
+    Dependency graph of an analysis. Nodes are numbered in the order they are added and stored in a list
+    of slotted records; edges live in flat arrays, each node's outgoing and incoming edges chained through
+    them. The graph is exported to networkx only for printing, visualization and code generation.
+    """
+
+    NODE_TYPES = {"cookie", "master", "cURL"}
+
+    def __init__(self, responses: Optional[Mapping] = None):
+        # Request to response map of the ingestion index, resolving the content of request nodes
+        self.responses: Mapping = responses if responses is not None else {}
+        self.nodes: List[DAGNode] = []
+        self.root_id = None
+        # Edge arrays: ends of each edge, and the next edge with the same source / target (-1 ends a chain)
+        self._edge_from = array("i")
+        self._edge_to = array("i")
+        self._next_out = array("i")
+        self._next_in = array("i")
+        # First and last outgoing / incoming edge of each node
+        self._out_head = array("i")
+        self._out_tail = array("i")
+        self._in_head = array("i")
+        self._in_tail = array("i")
+        # Topological position of every node: for each edge u -> v, _order[u] < _order[v]
+        self._order = array("i")
+        # Edges that closed a cycle; kept in the graph but not in the order
+        self._cycle_edges: Set[int] = set()
+        self.cycle: Optional[List[Tuple[int, int, str]]] = None
+
     def add_node(
         self,
-        node_type: Literal["cookie", "master", "cURL", "not found"],  
-        content: Optional[dict] = None,  
+        node_type: Literal["cookie", "master", "cURL", "not found"],
+        key: Any = None,
+        value: Any = None,
         dynamic_parts: Optional[List[str]] = None,
         extracted_parts: Optional[List[str]] = None,
         input_variables: Optional[Dict[str, str]] = None,
-    ):
-        node_id = str(uuid.uuid4())
-        self.graph.add_node(node_id, node_type=node_type, content=content, dynamic_parts=dynamic_parts, extracted_parts=extracted_parts, input_variables=input_variables)
+    ) -> int:
+        node_id = len(self.nodes)
+        self.nodes.append(DAGNode(node_type, key, value, dynamic_parts, extracted_parts, input_variables))
+        for heads in (self._out_head, self._out_tail, self._in_head, self._in_tail):
+            heads.append(-1)
+        self._order.append(node_id)
         return node_id
-    
+
     def update_node(
-        self, 
-        node_id: str, 
+        self,
+        node_id: int,
         **attributes: Optional[List[str]]):
-        
+
+        node = self.nodes[node_id]
         for attr, value in attributes.items():
             if value is not None:
-                self.graph.nodes[node_id][attr] = value
+                setattr(node, attr, value)
 
     def detect_cycles(self):
         """
-        Detects if there are cycles in the DAG managed by this class.
-        If a cycle is found, it returns the list of nodes involved in the cycle.
-        If no cycle is found, it returns None.
+        Returns the cycle found in the DAG managed by this class, as a list of (from, to, "forward") edges
+        like nx.find_cycle, or None if no cycles are found. Cycles are found by add_edge as edges are
+        added, so this does not traverse the graph.
 
         Returns:
-        - A list of nodes forming a cycle, or None if no cycles are found.
+        - A list of edges forming a cycle, or None if no cycles are found.
         """
-        try:
-            cycle = list(nx.find_cycle(self.graph, orientation='original'))
+        if self.cycle is not None:
             print("Cycle detected:")
-            return cycle
-        except nx.exception.NetworkXNoCycle:
-            return None
-        
-    def get_node(self, node_id: str) -> Optional[Dict]:
+        return self.cycle
+
+    def get_node(self, node_id: int) -> Optional[DAGNode]:
         """
-        Retrieves the attributes of the specified node.
-        
+        Retrieves the record of the specified node.
+
         :param node_id: ID of the node to retrieve.
-        :return: Dictionary of node attributes or None if the node does not exist.
+        :return: The node's record or None if the node does not exist.
+        """
+        if 0 <= node_id < len(self.nodes):
+            return self.nodes[node_id]
+        return None
+
+    def content(self, node_id: int) -> Dict[str, Any]:
+        """
+        Returns the node's content as {"key": ..., "value": ...}, the value of a request node being its response.
+        """
+        node = self.nodes[node_id]
+        content = {"key": node.key}
+        value = node.value if node.value is not None else self.responses.get(node.key)
+        if value is not None:
+            content["value"] = value
+        return content
+
+    def _out_edges(self, node_id: int) -> Iterator[int]:
+        edge = self._out_head[node_id]
+        while edge != -1:
+            yield edge
+            edge = self._next_out[edge]
+
+    def _in_edges(self, node_id: int) -> Iterator[int]:
+        edge = self._in_head[node_id]
+        while edge != -1:
+            yield edge
+            edge = self._next_in[edge]
+
+    def successors(self, node_id: int) -> List[int]:
+        """Targets of the node's edges, in the order the edges were added"""
+        return [self._edge_to[edge] for edge in self._out_edges(node_id)]
+
+    def predecessors(self, node_id: int) -> List[int]:
+        return [self._edge_from[edge] for edge in self._in_edges(node_id)]
+
+    def has_edge(self, from_node_id: int, to_node_id: int) -> bool:
+        return any(self._edge_to[edge] == to_node_id for edge in self._out_edges(from_node_id))
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        return zip(self._edge_from, self._edge_to)
+
+    def _reorder(self, from_node_id: int, to_node_id: int) -> Optional[List[Tuple[int, int, str]]]:
+        """
+        Updates the topological order for a new edge (Pearce-Kelly): only the nodes ordered between the
+        edge's ends are visited and reordered. Returns the cycle the edge would close, leaving the order as is.
+        """
+        order = self._order
+        lower, upper = order[to_node_id], order[from_node_id]
+        if lower > upper:
+            return None
+
+        # Nodes reachable from the edge's head that are ordered before its tail
+        parents = {to_node_id: None}
+        stack = [to_node_id]
+        while stack:
+            node_id = stack.pop()
+            if node_id == from_node_id:
+                path = [node_id]
+                while parents[path[-1]] is not None:
+                    path.append(parents[path[-1]])
+                path.reverse()
+                return [(from_node_id, to_node_id, "forward")] + [(u, v, "forward") for u, v in zip(path, path[1:])]
+            for edge in self._out_edges(node_id):
+                child = self._edge_to[edge]
+                if edge not in self._cycle_edges and child not in parents and order[child] <= upper:
+                    parents[child] = node_id
+                    stack.append(child)
+        forward = list(parents)
+
+        # Nodes reaching the edge's tail that are ordered after its head
+        backward = {from_node_id}
+        stack = [from_node_id]
+        while stack:
+            node_id = stack.pop()
+            for edge in self._in_edges(node_id):
+                parent = self._edge_from[edge]
+                if edge not in self._cycle_edges and parent not in backward and order[parent] > lower:
+                    backward.add(parent)
+                    stack.append(parent)
+
+        # Both sets keep their relative order; the backward set moves ahead of the forward set
+        moved = sorted(backward, key=order.__getitem__) + sorted(forward, key=order.__getitem__)
+        positions = sorted(order[node_id] for node_id in moved)
+        for node_id, position in zip(moved, positions):
+            order[node_id] = position
+        return None
+
+    def add_edge(self, from_node_id: int, to_node_id: int):
+        """
+        Adds an edge and checks it against the topological order kept incrementally, so a cycle is found
+        when its closing edge is added. That edge is still added, and the first cycle is kept for detect_cycles.
+        """
+        if self.has_edge(from_node_id, to_node_id):
+            return
+        cycle = self._reorder(from_node_id, to_node_id)
+
+        edge = len(self._edge_from)
+        self._edge_from.append(from_node_id)
+        self._edge_to.append(to_node_id)
+        self._next_out.append(-1)
+        self._next_in.append(-1)
+        if self._out_tail[from_node_id] == -1:
+            self._out_head[from_node_id] = edge
+        else:
+            self._next_out[self._out_tail[from_node_id]] = edge
+        self._out_tail[from_node_id] = edge
+        if self._in_tail[to_node_id] == -1:
+            self._in_head[to_node_id] = edge
+        else:
+            self._next_in[self._in_tail[to_node_id]] = edge
+        self._in_tail[to_node_id] = edge
+
+        if cycle is not None:
+            self._cycle_edges.add(edge)
+            if self.cycle is None:
+                self.cycle = cycle
+
+    def __getstate__(self):
+        # The responses belong to the ingestion index, which is rebuilt from the HAR file
+        return {name: value for name, value in self.__dict__.items() if name != "responses"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.responses = {}
+
+    def to_networkx(self) -> nx.DiGraph:
+        """
+        Exports the DAG with one attribute per node field and the node's content under "content".
         """
-        return self.graph.nodes.get(node_id, None)
-    
-    def add_edge(self, from_node_id: str, to_node_id: str):
-        self.graph.add_edge(from_node_id, to_node_id)
+        graph = nx.DiGraph()
+        for node_id, node in enumerate(self.nodes):
+            graph.add_node(
+                node_id,
+                node_type=node.node_type,
+                content=self.content(node_id),
+                dynamic_parts=node.dynamic_parts,
+                extracted_parts=node.extracted_parts,
+                input_variables=node.input_variables,
+                extracted_key_paths=node.extracted_key_paths,
+            )
+        graph.add_edges_from(self.edges())
+        return graph
 
     def __str__(self):
         nodes_info = []
-        for node_id in self.graph.nodes:
-            attrs = self.graph.nodes[node_id]
+        for node_id, node in enumerate(self.nodes):
+            attrs = {slot: getattr(node, slot) for slot in DAGNode.__slots__}
             nodes_info.append(f"{node_id}: {attrs}")
         return "\n".join(nodes_info)
@@ -1,24 +1,139 @@
-from typing import List, Dict, Optional, Any
+from typing import Collection, List, Dict, Optional, Any, Tuple
+from types import MappingProxyType
+from urllib.parse import urlsplit
 import json
 
+# Headers every browser request carries; they say nothing about what a request depends on
+COMMON_HEADERS = frozenset(
+    {
+        "accept",
+        "accept-encoding",
+        "accept-language",
+        "cache-control",
+        "connection",
+        "content-length",
+        "content-type",
+        "cookie",
+        "dnt",
+        "host",
+        "origin",
+        "pragma",
+        "priority",
+        "referer",
+        "te",
+        "upgrade-insecure-requests",
+        "user-agent",
+    }
+)
+COMMON_HEADER_PREFIXES = ("sec-", ":")
+
+
+def is_common_header(name: str) -> bool:
+    name = name.lower()
+    return name in COMMON_HEADERS or name.startswith(COMMON_HEADER_PREFIXES)
+
+
 class Request:
-    def __init__(self, method: str, url: str, headers: Dict[str, str], 
+    """
+    Immutable HTTP request parsed from a HAR entry.
+
+    Requests compare and hash by a canonical key (method, URL, headers, query parameters, body),
+    and the full and minified cURL strings are rendered once and cached.
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "headers",
+        "query_params",
+        "body",
+        "_key",
+        "_hash",
+        "_curl",
+        "_minified_curl",
+        "_compact_curl",
+    )
+
+    def __init__(self, method: str, url: str, headers: Dict[str, str],
                  query_params: Optional[Dict[str, str]] = None, body: Optional[Any] = None):
-        self.method = method
-        self.url = url
-        self.headers = headers  
-        self.query_params = query_params
-        self.body = body
+        _set = object.__setattr__
+        _set(self, "method", method)
+        _set(self, "url", url)
+        _set(self, "headers", MappingProxyType(dict(headers)))
+        _set(self, "query_params", MappingProxyType(dict(query_params)) if query_params else None)
+        _set(self, "body", body)
+        _set(self, "_key", None)
+        _set(self, "_hash", None)
+        _set(self, "_curl", None)
+        _set(self, "_minified_curl", None)
+        _set(self, "_compact_curl", None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Request is immutable, cannot set '{name}'")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"Request is immutable, cannot delete '{name}'")
+
+    def __reduce__(self):
+        return (
+            Request,
+            (
+                self.method,
+                self.url,
+                dict(self.headers),
+                dict(self.query_params) if self.query_params else None,
+                self.body,
+            ),
+        )
+
+    @property
+    def key(self) -> Tuple:
+        """
+        Canonical identity of the request: header and query order and JSON key order are ignored.
+        """
+        if self._key is None:
+            if isinstance(self.body, (dict, list)):
+                body = json.dumps(self.body, sort_keys=True)
+            else:
+                body = self.body
+            key = (
+                self.method,
+                self.url,
+                tuple(sorted(self.headers.items())),
+                tuple(sorted(self.query_params.items())) if self.query_params else (),
+                body,
+            )
+            object.__setattr__(self, "_key", key)
+        return self._key
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Request):
+            return NotImplemented
+        return hash(self) == hash(other) and self.key == other.key
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(self.key))
+        return self._hash
+
+    @property
+    def full_url(self) -> str:
+        """
+        The URL with the query parameters appended, unless the URL already carries its query string.
+        """
+        if self.query_params and not urlsplit(self.url).query:
+            query_string = "&".join([f"{k}={v}" for k, v in self.query_params.items()])
+            return f"{self.url}?{query_string}"
+        return self.url
 
-    def to_curl_command(self) -> str:
+    def _render_curl(self, excluded_headers: Collection[str] = (), excluded_prefixes: Tuple[str, ...] = ()) -> str:
         curl_parts = [f"curl -X {self.method}"]
 
         for name, value in self.headers.items():
-            curl_parts.append(f"-H '{name}: {value}'")
-
-        if self.query_params:
-            query_string = "&".join([f"{k}={v}" for k, v in self.query_params.items()])
-            self.url += f"?{query_string}"
+            if name.lower() not in excluded_headers and not name.lower().startswith(excluded_prefixes):
+                curl_parts.append(f"-H '{name}: {value}'")
 
         if self.body:
             content_type = None
@@ -35,42 +150,37 @@ class Request:
             elif isinstance(self.body, str):
                 curl_parts.append(f"--data '{self.body}'")
 
-        curl_parts.append(f"'{self.url}'")
+        curl_parts.append(f"'{self.full_url}'")
 
         return " ".join(curl_parts)
 
+    def to_curl_command(self) -> str:
+        if self._curl is None:
+            object.__setattr__(self, "_curl", self._render_curl())
+        return self._curl
+
     def to_minified_curl_command(self) -> str:
         """
         Minifies the curl command by removing referer and cookie headers.
         This is done to reduce LLM hallucinations.
         """
-        curl_parts = [f"curl -X {self.method}"]
-
-        for name, value in self.headers.items():
-            if name.lower() not in ['referer', 'cookie']:
-                curl_parts.append(f"-H '{name}: {value}'")
-
-        if self.query_params:
-            query_string = "&".join([f"{k}={v}" for k, v in self.query_params.items()])
-            self.url += f"?{query_string}"
+        if self._minified_curl is None:
+            object.__setattr__(self, "_minified_curl", self._render_curl(excluded_headers=('referer', 'cookie')))
+        return self._minified_curl
 
-        if self.body:
-            content_type = None
-            for k in self.headers:
-                if k.lower() == 'content-type':
-                    content_type = self.headers[k]
-                    break
-
-            if isinstance(self.body, dict):
-                if not content_type:
-                    curl_parts.append(f"-H 'Content-Type: application/json'")
-                curl_parts.append(f"--data '{json.dumps(self.body)}'")
-            elif isinstance(self.body, str):
-                curl_parts.append(f"--data '{self.body}'")
-
-        curl_parts.append(f"'{self.url}'")
-
-        return " ".join(curl_parts)
+    def to_compact_curl_command(self) -> str:
+        """
+        Renders the curl command without any of the common browser headers (user-agent, accept-*, sec-*, ...),
+        keeping only the values the request itself sends. Used for prompts that classify those values.
+        """
+        if self._compact_curl is None:
+            object.__setattr__(
+                self, "_compact_curl", self._render_curl(excluded_headers=COMMON_HEADERS, excluded_prefixes=COMMON_HEADER_PREFIXES)
+            )
+        return self._compact_curl
 
     def __str__(self) -> str:
         return self.to_curl_command()
+
+    def __repr__(self) -> str:
+        return f"Request({self.method} {self.url})"
@@ -1,38 +1,108 @@
-from langchain_openai import ChatOpenAI
+import threading
+import weakref
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from integuru.util.llm_cache import CachedChatModel, LLMCache
+from integuru.util.llm_pool import LLMClientPool, ModelLimits
+from integuru.util.routing import DEFAULT_ROUTES, RoutedChatModel, StageRoute, merge_routes, model_chain
+from integuru.util.usage import UsageRecorder, current_recorder, current_stage
+
+# Models, response cache and client pool of the analysis running in the current context, so concurrent
+# analyses in one process keep their own
+_default_model: ContextVar[str] = ContextVar("integuru_default_model", default="gpt-4o")
+_routes: ContextVar[Mapping[str, StageRoute]] = ContextVar("integuru_routes", default=MappingProxyType(DEFAULT_ROUTES))
+_cache: ContextVar[Optional[LLMCache]] = ContextVar("integuru_llm_cache", default=None)
+_default_pool = LLMClientPool()
+_pool: ContextVar[LLMClientPool] = ContextVar("integuru_llm_pool", default=_default_pool)
+
+
+def _pool_key(factory: Callable[[str, ModelLimits], Any], default_limits: ModelLimits, model_limits: Dict[str, ModelLimits]) -> Tuple[Any, ...]:
+    return (factory, default_limits, tuple(sorted(model_limits.items())))
+
 
 class LLMSingleton:
-    _instance = None
-    _default_model = "gpt-4o"  
-    _alternate_model = "o1-preview"
+    # Pools by backend and limits: analyses configured alike share one, and so the same rate limit budget
+    _pools: "weakref.WeakValueDictionary[Tuple[Any, ...], LLMClientPool]" = weakref.WeakValueDictionary({
+        _pool_key(_default_pool.factory, _default_pool.default_limits, _default_pool.model_limits): _default_pool,
+    })
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def _wrap(cls, instance):
+        """Serve the instance's calls from the response cache, if set"""
+        cache = _cache.get()
+        if cache is None:
+            return instance
+        return CachedChatModel(instance, cache)
+
+    @classmethod
+    def route_for_stage(cls, stage: Optional[str]) -> StageRoute:
+        return _routes.get().get(stage, StageRoute())
+
+    @classmethod
+    def model_chain(cls, stage: Optional[str]) -> List[str]:
+        """The models tried for an agent stage, in order, ending with the default model"""
+        chain = model_chain(cls.route_for_stage(stage), _default_model.get())
+        return _pool.get().available(chain[:-1]) + chain[-1:]
+
+    @classmethod
+    def model_for_stage(cls, stage: Optional[str]) -> str:
+        """The model an agent stage's calls go to first"""
+        return cls.model_chain(stage)[0]
 
     @classmethod
     def get_instance(cls, model: str = None):
-        if model is None:
-            model = cls._default_model
-            
-        if cls._instance is None:
-            cls._instance = ChatOpenAI(model=model, temperature=1)
-        return cls._instance
+        """
+        Returns the pooled client of a model. Without a model, returns a client of the stage set by
+        usage_scope, which follows the stage's fallback chain and token cap.
+        """
+        pool = _pool.get()
+        if model is not None:
+            return cls._wrap(pool.get(model))
+        stage = current_stage.get()
+        clients = [(name, cls._wrap(pool.get(name))) for name in cls.model_chain(stage)]
+        return RoutedChatModel(stage, clients, cls.route_for_stage(stage).max_tokens, pool.mark_unavailable)
 
     @classmethod
     def set_default_model(cls, model: str):
         """Set the default model to use when no specific model is requested"""
-        cls._default_model = model
-        cls._instance = None  # Reset instance to force recreation with new model
+        _default_model.set(model)
 
     @classmethod
-    def revert_to_default_model(cls):
-        """Set the default model to use when no specific model is requested"""
-        print("Reverting to default model: ", cls._default_model, "Performance will be degraded as Integuru is using non O1 model")
-        cls._alternate_model = cls._default_model
+    def set_routes(cls, routes: Optional[Dict[str, StageRoute]]):
+        """Set the models and token caps of agent stages (end_url, dynamic_parts, ...), on top of the default routes"""
+        _routes.set(MappingProxyType(merge_routes(DEFAULT_ROUTES, routes or {})))
 
     @classmethod
-    def switch_to_alternate_model(cls):
-        """Returns a ChatOpenAI instance configured for o1-miniss"""
-        # Create a new instance only if we don't have one yet
-        cls._instance = ChatOpenAI(model=cls._alternate_model, temperature=1)
+    def _use_pool(cls, factory: Callable[[str, ModelLimits], Any], default_limits: ModelLimits, model_limits: Dict[str, ModelLimits]):
+        """Switch the current analysis to the pool of a backend and limits, creating it on first use"""
+        key = _pool_key(factory, default_limits, model_limits)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls._pools[key] = LLMClientPool(default_limits, model_limits, factory)
+        _pool.set(pool)
 
-        return cls._instance
+    @classmethod
+    def set_limits(cls, default_limits: Optional[ModelLimits] = None, model_limits: Optional[Dict[str, ModelLimits]] = None):
+        """Set the rate limits, timeouts, retries and hedging of the current analysis's clients"""
+        cls._use_pool(_pool.get().factory, default_limits or ModelLimits(), dict(model_limits or {}))
 
-llm = LLMSingleton()
+    @classmethod
+    def set_backend(cls, backend: Callable[[str, ModelLimits], Any]):
+        """Set the function creating the chat model of a model name (the OpenAI API, a cassette replay, a script, ...)"""
+        pool = _pool.get()
+        cls._use_pool(backend, pool.default_limits, pool.model_limits)
 
+    @classmethod
+    def set_cache(cls, cache: Optional[LLMCache]):
+        """Set the persistent response cache of the current analysis (None disables caching)"""
+        _cache.set(cache)
+
+    @classmethod
+    def set_usage_recorder(cls, recorder: Optional[UsageRecorder]):
+        """Set the recorder of per-call token usage and latency of the current analysis (None disables accounting)"""
+        current_recorder.set(recorder)
+
+llm = LLMSingleton()
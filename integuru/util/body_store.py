@@ -0,0 +1,210 @@
+import mmap
+import os
+import shutil
+import tempfile
+import weakref
+from collections.abc import Mapping
+from typing import Iterator, Optional, Tuple
+
+# Response MIME types whose bodies carry no dataflow and are kept as metadata only
+binary_mime_prefixes = (
+    "image/",
+    "audio/",
+    "video/",
+    "font/",
+)
+
+binary_mime_types = (
+    "application/octet-stream",
+    "application/pdf",
+    "application/zip",
+    "application/gzip",
+    "application/x-protobuf",
+    "application/vnd.ms-fontobject",
+    "application/font-woff",
+    "application/x-font-ttf",
+    "application/wasm",
+)
+
+
+def is_binary_mime_type(mime_type: str) -> bool:
+    """
+    Returns True if a response of this MIME type should not have its body stored.
+    """
+    mime_type = (mime_type or "").split(";", 1)[0].strip().lower()
+    return mime_type.startswith(binary_mime_prefixes) or mime_type in binary_mime_types
+
+
+def _close_store(file, mapped: Optional[mmap.mmap], path: str, owned: bool) -> None:
+    if mapped is not None:
+        mapped.close()
+    file.close()
+    if owned:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class BodyStore:
+    """
+    Append-only file of UTF-8 encoded response bodies, memory-mapped for reading.
+    Bodies are addressed by (offset, length) and only decoded when read.
+
+    A store created without a path spools to a temporary file that is deleted
+    with the store. A store opened from an existing path is read-only.
+    Pickling a store only records its path.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._owned = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="integuru-bodies-")
+            self._file = os.fdopen(fd, "r+b")
+        else:
+            self._file = open(path, "rb")
+        self.path = path
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._mmap: Optional[mmap.mmap] = None
+        self._finalizer = weakref.finalize(self, _close_store, self._file, None, path, self._owned)
+
+    def __reduce__(self):
+        self._file.flush()
+        return (BodyStore, (self.path,))
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def append(self, text: str) -> Tuple[int, int]:
+        """
+        Appends a body and returns its (offset, length) in bytes.
+        """
+        data = text.encode("utf-8", "surrogatepass")
+        offset = self._size
+        self._file.seek(offset)
+        self._file.write(data)
+        self._size += len(data)
+        return offset, len(data)
+
+    def flush(self) -> None:
+        """
+        Flushes appended bodies to disk so other processes can map the file.
+        """
+        self._file.flush()
+
+    def _map(self, end: int) -> mmap.mmap:
+        if self._mmap is None or len(self._mmap) < end:
+            self._file.flush()
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._reset_finalizer()
+        return self._mmap
+
+    def _reset_finalizer(self) -> None:
+        self._finalizer.detach()
+        self._finalizer = weakref.finalize(
+            self, _close_store, self._file, self._mmap, self.path, self._owned
+        )
+
+    def read_bytes(self, offset: int, length: int) -> bytes:
+        if length == 0:
+            return b""
+        return self._map(offset + length)[offset:offset + length]
+
+    def find(self, sub: bytes, start: int, end: int) -> int:
+        """
+        Returns the lowest offset of `sub` within [start, end), or -1, without copying the bodies.
+        """
+        if end <= start:
+            return -1
+        return self._map(end).find(sub, start, end)
+
+    def read(self, offset: int, length: int) -> str:
+        """
+        Decodes the body stored at (offset, length).
+        """
+        return self.read_bytes(offset, length).decode("utf-8", "surrogatepass")
+
+    def persist(self, path: str) -> None:
+        """
+        Moves the store's file to `path` (e.g. into the HAR cache) and keeps serving reads from it.
+        The file is replaced atomically, so concurrent readers never see a partial store.
+        """
+        self._file.flush()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        os.close(fd)
+        try:
+            if self._owned:
+                shutil.move(self.path, tmp_path)
+            else:
+                shutil.copyfile(self.path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._finalizer.detach()
+        _close_store(self._file, self._mmap, self.path, False)
+        self._mmap = None
+        self._file = open(path, "rb")
+        self._owned = False
+        self.path = path
+        self._reset_finalizer()
+
+
+class LazyResponse(Mapping):
+    """
+    Read-only response record with the same "text"/"type" keys as format_response's dict.
+    The body lives in a BodyStore and is decoded each time "text" is read.
+    """
+
+    __slots__ = ("_store", "_offset", "_length", "type", "size")
+
+    KEYS = ("text", "type")
+
+    def __init__(self, store: BodyStore, offset: int, length: int, mime_type: str, size: int):
+        self._store = store
+        self._offset = offset
+        self._length = length
+        self.type = mime_type
+        self.size = size
+
+    @classmethod
+    def from_text(cls, store: BodyStore, text: str, mime_type: str) -> "LazyResponse":
+        """
+        Stores the body of a text response, or only its metadata for binary MIME types.
+        """
+        size = len(text)
+        if is_binary_mime_type(mime_type) or not text:
+            return cls(store, 0, 0, mime_type, size)
+        offset, length = store.append(text)
+        return cls(store, offset, length, mime_type, size)
+
+    @property
+    def text(self) -> str:
+        return self._store.read(self._offset, self._length)
+
+    def __getitem__(self, key: str):
+        if key == "text":
+            return self.text
+        if key == "type":
+            return self.type
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __getstate__(self):
+        return (self._store, self._offset, self._length, self.type, self.size)
+
+    def __setstate__(self, state):
+        self._store, self._offset, self._length, self.type, self.size = state
+
+    def __repr__(self) -> str:
+        return f"LazyResponse(type={self.type!r}, size={self.size})"
@@ -0,0 +1,147 @@
+import json
+import os
+import pickle
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CHECKPOINT_PATH = os.environ.get(
+    "INTEGURU_CHECKPOINTS", os.path.join(os.path.expanduser("~"), ".cache", "integuru", "checkpoints.sqlite")
+)
+CHECKPOINT_VERSION = 1
+# Runs kept in the checkpoint file; starting a run deletes the least recently updated ones beyond this
+DEFAULT_MAX_RUNS = 20
+
+RUNNING = "running"
+FAILED = "failed"
+FINISHED = "finished"
+
+
+class RunNotFoundError(LookupError):
+    """
+    Raised when resuming a run the checkpoint file has no record of.
+    """
+
+
+@dataclass
+class RunCheckpoint:
+    """
+    A run as last checkpointed: the arguments it was started with and, once a step completed,
+    the graph node of that step, the agent state after it and the agent's DAG and id maps.
+    """
+
+    run_id: str
+    arguments: Dict[str, Any]
+    status: str
+    step: int = 0
+    node: Optional[str] = None
+    state: Optional[Dict[str, Any]] = None
+    snapshot: Optional[Dict[str, Any]] = None
+
+
+class CheckpointStore:
+    """
+    SQLite file of agent runs, checkpointed after every graph step so a run that died can be resumed.
+
+    Only the latest checkpoint of a run is kept, and only until the run finishes. Starting a run prunes
+    the file down to the `max_runs` most recently updated runs. The state and DAG are pickled, and
+    unpickling runs arbitrary code: never load a checkpoint file from an untrusted source.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, max_runs: int = DEFAULT_MAX_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, arguments TEXT NOT NULL, status TEXT NOT NULL, "
+                "created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "run_id TEXT PRIMARY KEY REFERENCES runs (run_id), version INTEGER NOT NULL, "
+                "step INTEGER NOT NULL, node TEXT NOT NULL, data BLOB NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_run(self, arguments: Dict[str, Any]) -> str:
+        """
+        Records a new run started with the given (JSON serializable) arguments and prunes the oldest runs
+        beyond max_runs. Returns its id.
+        """
+        run_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO runs (run_id, arguments, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (run_id, json.dumps(arguments), RUNNING, now, now),
+            )
+        self.prune(self.max_runs)
+        return run_id
+
+    def save(self, run_id: str, step: int, node: str, state: Dict[str, Any], snapshot: Dict[str, Any]) -> None:
+        """
+        Replaces the run's checkpoint with the state and agent snapshot after a completed step.
+        """
+        data = pickle.dumps({"state": state, "snapshot": snapshot}, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, version, step, node, data, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, CHECKPOINT_VERSION, step, node, data, now),
+            )
+            conn.execute("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?", (RUNNING, now, run_id))
+
+    def set_status(self, run_id: str, status: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?", (status, time.time(), run_id))
+
+    def finish(self, run_id: str) -> None:
+        """
+        Marks the run finished and deletes its checkpoint, which nothing resumes from any more.
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            conn.execute("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?", (FINISHED, time.time(), run_id))
+
+    def prune(self, keep: int, vacuum: bool = False) -> List[str]:
+        """
+        Deletes every run but the `keep` most recently updated ones, with their checkpoints. With `vacuum`,
+        the freed space is returned to the file system. Returns the ids of the deleted runs.
+        """
+        with closing(self._connect()) as conn:
+            with conn:
+                run_ids = [
+                    run_id for (run_id,) in conn.execute(
+                        "SELECT run_id FROM runs ORDER BY updated DESC, run_id LIMIT -1 OFFSET ?", (max(keep, 0),)
+                    )
+                ]
+                conn.executemany("DELETE FROM checkpoints WHERE run_id = ?", [(run_id,) for run_id in run_ids])
+                conn.executemany("DELETE FROM runs WHERE run_id = ?", [(run_id,) for run_id in run_ids])
+            if vacuum:
+                conn.execute("VACUUM")
+        return run_ids
+
+    def load(self, run_id: str) -> RunCheckpoint:
+        with closing(self._connect()) as conn:
+            run = conn.execute("SELECT arguments, status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if run is None:
+                raise RunNotFoundError(f"No run '{run_id}' in {self.path}")
+            checkpoint = conn.execute(
+                "SELECT version, step, node, data FROM checkpoints WHERE run_id = ?", (run_id,)
+            ).fetchone()
+
+        arguments, status = json.loads(run[0]), run[1]
+        if checkpoint is None or checkpoint[0] != CHECKPOINT_VERSION:
+            # Nothing usable was checkpointed: the run starts over
+            return RunCheckpoint(run_id, arguments, status)
+        _, step, node, data = checkpoint
+        data = pickle.loads(data)
+        return RunCheckpoint(run_id, arguments, status, step, node, data["state"], data["snapshot"])
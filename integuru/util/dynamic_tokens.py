@@ -0,0 +1,109 @@
+import re
+from typing import Dict, List, NamedTuple, Tuple
+
+from integuru.models.request import Request
+from integuru.util.provenance import RESPONSE_JSON, ProvenanceIndex
+from integuru.util.request_scoring import VALUE_RE, is_high_entropy, iter_request_values
+
+# Whole-value formats of generated tokens and identifiers, with the confidence they give on their own
+JWT_RE = re.compile(r"^eyJ[A-Za-z0-9_-]+\.eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]*$")
+UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+HEX_RE = re.compile(r"^(?=[0-9a-fA-F]*[a-fA-F])(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{16,}$")
+BASE64_RE = re.compile(r"^(?=.*\d)(?=.*[a-z])(?=.*[A-Z])[A-Za-z0-9+/_-]{20,}={0,2}$")
+FORMATS: Tuple[Tuple[str, "re.Pattern[str]", float], ...] = (
+    ("jwt", JWT_RE, 0.95),
+    ("uuid", UUID_RE, 0.9),
+    ("hex", HEX_RE, 0.7),
+    ("base64", BASE64_RE, 0.6),
+)
+ENTROPY_CONFIDENCE = 0.5
+# A value an earlier response returned is almost always one the request depends on
+PRODUCED_BOOST = 0.5
+# A value other requests also sent is more likely to be a session or user identifier
+SHARED_BOOST = 0.1
+
+# Scores at or above HIGH_CONFIDENCE are dynamic without asking the LLM;
+# values below CANDIDATE_THRESHOLD are not reported at all
+HIGH_CONFIDENCE = 0.9
+CANDIDATE_THRESHOLD = 0.4
+
+
+class TokenCandidate(NamedTuple):
+    value: str
+    score: float
+    reasons: Tuple[str, ...]
+
+    @property
+    def is_certain(self) -> bool:
+        return self.score >= HIGH_CONFIDENCE
+
+
+def iter_value_tokens(request: Request) -> List[str]:
+    """
+    Returns the distinct values a request sends, whole and split into identifier-like runs
+    (so "Bearer <token>" yields the token), in order of appearance.
+    """
+    tokens = []
+    for value in iter_request_values(request):
+        if not any(c.isspace() for c in value):
+            tokens.append(value)
+        tokens.extend(match.strip(".") for match in VALUE_RE.findall(value))
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+def format_score(value: str) -> Tuple[float, Tuple[str, ...]]:
+    """
+    Returns the confidence a value's format alone gives that it is dynamic, with the matching reasons.
+    """
+    for name, pattern, confidence in FORMATS:
+        if pattern.match(value):
+            return confidence, (name,)
+    if is_high_entropy(value):
+        return ENTROPY_CONFIDENCE, ("high entropy",)
+    return 0.0, ()
+
+
+def score_token(value: str, request: Request, provenance: ProvenanceIndex) -> TokenCandidate:
+    """
+    Scores one value of a request by its format, its entropy and whether earlier responses
+    and other requests carry it. The provenance index must only hold entries before the request.
+    """
+    score, reasons = format_score(value)
+    sources = provenance.sources(value)
+    if any(source.location == RESPONSE_JSON for source in sources):
+        score += PRODUCED_BOOST
+        reasons += ("returned by an earlier response",)
+    if any(source.location != RESPONSE_JSON and source.request != request for source in sources):
+        score += SHARED_BOOST
+        reasons += ("sent by other requests",)
+    return TokenCandidate(value, min(score, 1.0), reasons)
+
+
+def detect_dynamic_tokens(request: Request, provenance: ProvenanceIndex) -> List[TokenCandidate]:
+    """
+    Returns the values of a request that are likely dynamic, most confident first.
+    """
+    candidates = []
+    for value in iter_value_tokens(request):
+        candidate = score_token(value, request, provenance)
+        if candidate.score >= CANDIDATE_THRESHOLD:
+            candidates.append(candidate)
+    # Drop values overlapping a more confident one: a part of a token, or a token wrapped in more text
+    candidates.sort(key=lambda candidate: (-candidate.score, -len(candidate.value)))
+    kept: List[TokenCandidate] = []
+    for candidate in candidates:
+        if not any(candidate.value in other.value or other.value in candidate.value for other in kept):
+            kept.append(candidate)
+    return kept
+
+
+def split_certain(candidates: List[TokenCandidate]) -> Tuple[List[str], List[TokenCandidate]]:
+    """
+    Splits candidates into the values certain to be dynamic and the ones the LLM should confirm.
+    """
+    certain = [candidate.value for candidate in candidates if candidate.is_certain]
+    uncertain = [candidate for candidate in candidates if not candidate.is_certain]
+    return certain, uncertain
+
+
+DynamicTokenIndex = Dict[Request, List[TokenCandidate]]
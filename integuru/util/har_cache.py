@@ -0,0 +1,210 @@
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import tempfile
+from typing import Iterator, List, Optional
+
+from integuru.util.har_processing import HarIndex, PARSER_VERSION
+
+# Entries are pickled, and unpickling runs code. Each entry is signed with a per-user secret key kept
+# outside the cache directory, and an entry whose signature does not verify is rebuilt, never unpickled:
+# pointing the cache at a shared or untrusted directory cannot run another user's code. The key file
+# itself must stay private to the user.
+DEFAULT_CACHE_DIR = os.environ.get(
+    "INTEGURU_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "integuru", "har")
+)
+DEFAULT_KEY_PATH = os.environ.get(
+    "INTEGURU_CACHE_KEY", os.path.join(os.path.expanduser("~"), ".config", "integuru", "har_cache.key")
+)
+KEY_BYTES = 32
+DIGEST_BYTES = hashlib.sha256().digest_size
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 ** 3
+CACHE_SUFFIX = ".harindex"
+BODIES_SUFFIX = ".bodies"
+HAR_SUFFIXES = (".har", ".har.gz", ".har.xz", ".har.zst")
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    with open(file_path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def get_cache_path(har_file_path: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """
+    Returns the cache file path for a HAR file, keyed by content hash and parser version.
+    """
+    return os.path.join(cache_dir, f"{hash_file(har_file_path)}-v{PARSER_VERSION}{CACHE_SUFFIX}")
+
+
+def get_bodies_path(cache_path: str) -> str:
+    """
+    Returns the path of the response-body file stored alongside a cache entry.
+    """
+    return cache_path[: -len(CACHE_SUFFIX)] + BODIES_SUFFIX
+
+
+def get_cache_key(key_path: Optional[str] = None) -> bytes:
+    """
+    Returns the secret key signing the cache entries, creating it (readable by the user only) on first use.
+    """
+    key_path = key_path or DEFAULT_KEY_PATH
+    try:
+        with open(key_path, "rb") as file:
+            key = file.read()
+        if len(key) == KEY_BYTES:
+            return key
+    except FileNotFoundError:
+        pass
+    key_dir = os.path.dirname(key_path)
+    os.makedirs(key_dir, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=key_dir, suffix=".tmp")  # created with mode 0600
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(secrets.token_bytes(KEY_BYTES))
+        # Replaces a truncated key; a concurrent process writing its own key leaves one of the two,
+        # and an entry signed with the other is rebuilt
+        os.replace(tmp_path, key_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    with open(key_path, "rb") as file:
+        return file.read()
+
+
+def _sign(data: bytes) -> bytes:
+    return hmac.new(get_cache_key(), data, hashlib.sha256).digest()
+
+
+def _read_index(cache_path: str) -> Optional[HarIndex]:
+    try:
+        with open(cache_path, "rb") as file:
+            digest = file.read(DIGEST_BYTES)
+            data = file.read()
+        # Only unpickle what this user wrote
+        if not hmac.compare_digest(digest, _sign(data)):
+            print(f"Ignoring unsigned HAR cache {cache_path}")
+            return None
+        index = pickle.loads(data)
+        # Mark the entry as recently used for eviction. Either file may have been evicted meanwhile
+        # by another process, or the bodies left behind by a partial eviction: the entry is rebuilt.
+        os.utime(cache_path)
+        os.utime(get_bodies_path(cache_path))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # A corrupt or stale entry is rebuilt rather than failing the run
+        print(f"Ignoring unreadable HAR cache {cache_path}: {e}")
+        return None
+    return index
+
+
+def _write_index(index: HarIndex, cache_path: str) -> None:
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Bodies go first: the pickled index refers to them by path
+    index.bodies.persist(get_bodies_path(cache_path))
+    data = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+    # Write to a temp file first so concurrent readers never see a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(_sign(data))
+            file.write(data)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def evict_cache(cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> List[str]:
+    """
+    Deletes the least recently used cache entries until the cache fits in `max_bytes`.
+    Returns the paths of the deleted entries.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_SUFFIX):
+            path = os.path.join(cache_dir, name)
+            bodies_path = get_bodies_path(path)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            size = stat.st_size
+            if os.path.exists(bodies_path):
+                size += os.path.getsize(bodies_path)
+            entries.append((stat.st_mtime, size, path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        for entry_path in (path, get_bodies_path(path)):
+            try:
+                os.unlink(entry_path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        evicted.append(path)
+    return evicted
+
+
+def load_har_index(
+    har_file_path: str,
+    streaming: bool = False,
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+) -> HarIndex:
+    """
+    Returns the HarIndex of a HAR file, loading it from the cache when the file is unchanged
+    and parsing (then caching) it otherwise. Pass cache_dir=None to bypass the cache.
+    """
+    if cache_dir is None:
+        return HarIndex.from_har_file(har_file_path, streaming=streaming)
+
+    cache_path = get_cache_path(har_file_path, cache_dir)
+    index = _read_index(cache_path)
+    if index is None:
+        index = HarIndex.from_har_file(har_file_path, streaming=streaming)
+        _write_index(index, cache_path)
+        evict_cache(cache_dir, max_cache_bytes)
+    return index
+
+
+def build_har_cache(
+    har_file_path: str,
+    streaming: bool = False,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+) -> bool:
+    """
+    Parses and caches a HAR file unless an up-to-date entry already exists.
+    Returns True if a new entry was written. Does not evict.
+    """
+    cache_path = get_cache_path(har_file_path, cache_dir)
+    bodies_path = get_bodies_path(cache_path)
+    if os.path.exists(cache_path) and os.path.exists(bodies_path):
+        os.utime(cache_path)
+        os.utime(bodies_path)
+        return False
+    _write_index(HarIndex.from_har_file(har_file_path, streaming=streaming), cache_path)
+    return True
+
+
+def iter_har_files(directory: str) -> Iterator[str]:
+    """
+    Yields the HAR files found under a directory, recursively and in sorted order.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(HAR_SUFFIXES):
+                yield os.path.join(root, name)
@@ -0,0 +1,113 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from integuru.util.body_store import is_binary_mime_type
+from integuru.util.har_processing import (
+    excluded_header_keywords,
+    excluded_keywords,
+    format_request,
+    has_excluded_extension,
+    iter_har_entries,
+    open_har,
+)
+
+
+@dataclass
+class CompactionStats:
+    entries_read: int = 0
+    entries_written: int = 0
+    excluded: int = 0
+    duplicates: int = 0
+    bodies_stripped: int = 0
+    bodies_truncated: int = 0
+
+
+def is_excluded_entry(url: str) -> bool:
+    """
+    Returns True for static assets and third-party analytics/monitoring calls, which never carry dataflow.
+    Only the URL is checked: first-party API calls often carry tracing headers (e.g. sentry-trace)
+    that must not get them dropped.
+    """
+    url_lower = url.lower()
+    return has_excluded_extension(url) or any(keyword in url_lower for keyword in excluded_keywords)
+
+
+def compact_entry(entry: Dict[str, Any], max_body_size: Optional[int], stats: CompactionStats) -> Dict[str, Any]:
+    """
+    Returns a HAR entry reduced to the fields read by format_request and format_response.
+    """
+    request = entry.get("request", {})
+    response = entry.get("response", {})
+
+    compact_request = {
+        "method": request.get("method", "GET"),
+        "url": request.get("url", ""),
+        # These headers are dropped by format_request anyway
+        "headers": [
+            header for header in request.get("headers", [])
+            if not any(keyword in header.get("name", "").lower() for keyword in excluded_header_keywords)
+        ],
+        "queryString": request.get("queryString", []),
+    }
+    if request.get("postData"):
+        compact_request["postData"] = {
+            "mimeType": request["postData"].get("mimeType", ""),
+            "text": request["postData"].get("text", ""),
+        }
+
+    content = response.get("content", {})
+    mime_type = content.get("mimeType", "")
+    text = content.get("text") or ""
+    if text and (is_binary_mime_type(mime_type) or content.get("encoding") == "base64"):
+        text = ""
+        stats.bodies_stripped += 1
+    elif max_body_size is not None and len(text) > max_body_size:
+        text = text[:max_body_size]
+        stats.bodies_truncated += 1
+
+    compact_content = {"size": content.get("size", len(content.get("text") or "")), "mimeType": mime_type}
+    if text:
+        compact_content["text"] = text
+
+    return {
+        "request": compact_request,
+        "response": {"status": response.get("status", 0), "content": compact_content},
+    }
+
+
+def compact_har(har_file_path: str, output_path: str, max_body_size: Optional[int] = None) -> CompactionStats:
+    """
+    Writes a minimized copy of a HAR file for analysis: static assets and analytics calls are dropped,
+    exact duplicate requests are collapsed (keeping the last response, as HarIndex does),
+    binary bodies are stripped and, with max_body_size, text bodies are truncated.
+    """
+    stats = CompactionStats()
+    entries: Dict[Any, Dict[str, Any]] = {}
+
+    with open_har(har_file_path) as file:
+        for entry in iter_har_entries(file):
+            stats.entries_read += 1
+            url = entry.get("request", {}).get("url", "")
+            if not url or is_excluded_entry(url):
+                stats.excluded += 1
+                continue
+
+            compacted = compact_entry(entry, max_body_size, stats)
+            key = format_request(compacted["request"]).key
+            if key in entries:
+                stats.duplicates += 1
+            entries[key] = compacted
+
+    stats.entries_written = len(entries)
+    har_data = {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "integuru compact", "version": "1"},
+            "entries": list(entries.values()),
+        }
+    }
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(har_data, file, ensure_ascii=False, separators=(",", ":"))
+
+    return stats
@@ -1,8 +1,26 @@
+import gzip
+import io
 import json
+import lzma
 import os
+from json.decoder import WHITESPACE
 from urllib.parse import urlparse
 from integuru.models.request import Request
-from typing import Tuple, Dict, Optional, Any, List
+from integuru.util.body_store import BodyStore, LazyResponse
+from integuru.util.dynamic_tokens import DynamicTokenIndex, detect_dynamic_tokens
+from integuru.util.provenance import ProvenanceIndex
+from typing import Tuple, Dict, Optional, Any, List, Iterator, TextIO
+
+# Number of characters read from the HAR file at a time by the streaming parser
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Bump whenever the contents of HarIndex change, so cached indexes are rebuilt
+PARSER_VERSION = 7
+
+# Leading bytes of the compressed formats accepted for HAR files
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
 
 excluded_keywords = (
     "google",
@@ -12,6 +30,41 @@ excluded_keywords = (
     # "relic"
 )
 
+# File extensions excluded from the URL list sent to the LLM
+excluded_extensions = (
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".svg",
+    ".ico",  # Image files
+    ".css",  # Stylesheets
+    # ".js",
+    # ".map",  # JavaScript files
+    ".woff",
+    ".woff2",
+    ".ttf",
+    ".otf",
+    ".eot",  # Font files
+    ".mp3",
+    ".mp4",
+    ".wav",
+    ".avi",
+    ".mov",
+    ".flv",
+    ".wmv",
+    ".webm",  # Media files
+    # ".pdf",
+    # ".zip",
+    ".rar",
+    ".7z",
+    ".tar",
+    ".gz",
+    ".exe",
+    ".dmg",  # Other non-text files
+)
+
 excluded_header_keywords = (
     "cookie",
     "sec-",
@@ -78,11 +131,14 @@ def format_request(har_request: Dict[str, Any]) -> Request:
     )
 
 
-def format_response(har_response: Dict[str, Any]) -> Dict[str, str]:
+def format_response(har_response: Dict[str, Any], body_store: Optional[BodyStore] = None) -> Dict[str, str]:
     """
     Extracts and returns the content text and content type from a HAR response.
+    With a body_store, the text is moved into the store and a LazyResponse is returned instead.
     """
     content = har_response.get("content", {})
+    if body_store is not None:
+        return LazyResponse.from_text(body_store, content.get("text") or "", content.get("mimeType", ""))
     return {
         "text": content.get("text", ""),
         "type": content.get("mimeType", "")
@@ -93,23 +149,155 @@ def parse_har_file(har_file_path: str) -> Dict[Request, Dict[str, str]]:
     """
     Parses the HAR file and returns a dictionary mapping Request objects to response dictionaries.
     """
-    req_res_dict = {}
-
-    with open(har_file_path, 'r', encoding='utf-8') as file:
-        har_data = json.load(file)
-
-    entries = har_data.get("log", {}).get("entries", [])
+    return HarIndex.from_har_file(har_file_path).req_to_res_map
+
+
+def _open_zstd(har_file_path: str) -> TextIO:
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(har_file_path, "rt", encoding="utf-8")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            f"{har_file_path} is zstd-compressed; install the zstd extra (poetry install -E zstd) to read it"
+        ) from None
+    raw = open(har_file_path, "rb")
+    return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True), encoding="utf-8")
+
+
+def open_har(har_file_path: str) -> TextIO:
+    """
+    Opens a HAR file for reading as text. gzip, xz and zstd compressed files (e.g. .har.gz,
+    .har.xz, .har.zst) are detected by their leading bytes and decompressed as a stream.
+    """
+    with open(har_file_path, "rb") as file:
+        magic = file.read(6)
 
-    for entry in entries:
-        request_data = entry.get("request", {})
-        response_data = entry.get("response", {})
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(har_file_path, "rt", encoding="utf-8")
+    if magic.startswith(XZ_MAGIC):
+        return lzma.open(har_file_path, "rt", encoding="utf-8")
+    if magic.startswith(ZSTD_MAGIC):
+        return _open_zstd(har_file_path)
+    return open(har_file_path, "r", encoding="utf-8")
 
-        formatted_request = format_request(request_data)
-        response_dict = format_response(response_data)
 
-        req_res_dict[formatted_request] = response_dict
+class _JsonStreamReader:
+    """
+    Reads JSON tokens and values from a text stream through a sliding buffer,
+    so only the value being decoded has to be held in memory.
+    """
 
-    return req_res_dict
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, file: TextIO, chunk_size: int = STREAM_CHUNK_SIZE):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size: int) -> bool:
+        """
+        Drops the consumed part of the buffer and appends up to `size` characters from the stream.
+        """
+        if self._eof:
+            return False
+        chunk = self._file.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without consuming it ("" at end of stream).
+        """
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(self._chunk_size):
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """
+        Consumes the next character, which must be one of `chars`, and returns it.
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self._buffer, self._pos)
+        self._pos += 1
+        return char
+
+    def decode_value(self) -> Any:
+        """
+        Decodes the next JSON value, reading more of the stream until the value is complete.
+        """
+        self.peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A value ending at the buffer boundary (e.g. a number) may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            if self._fill(size):
+                size *= 2
+
+    def iter_object_keys(self) -> Iterator[str]:
+        """
+        Yields the keys of the next JSON object. The caller must consume each value before resuming.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def iter_array_items(self) -> Iterator[Any]:
+        """
+        Yields the decoded items of the next JSON array one at a time.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.decode_value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_har_entries(file: TextIO, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally parses a HAR document and yields its log.entries one at a time,
+    without materializing the whole document.
+    """
+    reader = _JsonStreamReader(file, chunk_size)
+    for key in reader.iter_object_keys():
+        if key != "log":
+            reader.decode_value()
+            continue
+        for log_key in reader.iter_object_keys():
+            if log_key == "entries":
+                yield from reader.iter_array_items()
+            else:
+                reader.decode_value()
 
 
 def build_url_to_req_res_map(req_res_dict: Dict[Request, Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
@@ -129,88 +317,126 @@ def build_url_to_req_res_map(req_res_dict: Dict[Request, Dict[str, str]]) -> Dic
     return url_to_req_res_dict
 
 
+def format_har_url(
+    har_request: Dict[str, Any], har_response: Dict[str, Any]
+) -> Optional[Tuple[str, str, str, str]]:
+    """
+    Returns the (method, URL, response format, response preview) tuple of a HAR entry,
+    or None if the entry is excluded because of its file type or keywords.
+    """
+    url = har_request.get("url")
+    if not url:
+        return None
+
+    method = har_request.get("method", "GET")  # Default to 'GET' if method is missing
+    response_format = har_response.get("content", {}).get("mimeType", "")
+    response_text = har_response.get("content", {}).get("text", "")
+    response_preview = response_text[:30] if response_text else ""
+
+    request_text = url.lower()
+
+    headers = har_request.get("headers", [])
+    for header in headers:
+        request_text += header.get("name", "").lower()
+        request_text += header.get("value", "").lower()
+
+    postData = har_request.get("postData", {}).get("text", "").lower()
+    request_text += postData
+
+    # Exclude URLs with the specified extensions or if keywords are in the request
+    # this is done to reduce the number of requests we send to the LLM
+    if has_excluded_extension(url) or any(
+        keyword.lower() in request_text for keyword in excluded_keywords
+    ):
+        return None
+
+    return (method, url, response_format, response_preview)
+
+
+def has_excluded_extension(url: str) -> bool:
+    """
+    Returns True if the URL path ends with one of the excluded (static asset) file extensions.
+    """
+    _, extension = os.path.splitext(urlparse(url).path.lower())
+    return extension in excluded_extensions
+
+
+class HarIndex:
+    """
+    Index of a HAR file built in a single pass over its entries.
+
+    Holds the (request, response) pair of every entry, the Request -> response map (identical
+    requests share one key, holding the last response), the URL -> {'request', 'response'} map
+    and the filtered URL list used by the end-URL prompt. Response bodies live in a memory-mapped
+    BodyStore and are only decoded when read. The provenance index maps every request and
+    JSON response value to where it appears, and every request's likely dynamic values are
+    scored against the entries before it.
+    """
+
+    def __init__(self, bodies: Optional[BodyStore] = None):
+        self.bodies: BodyStore = bodies if bodies is not None else BodyStore()
+        self.entries: List[Tuple[Request, Dict[str, str]]] = []
+        self.req_to_res_map: Dict[Request, Dict[str, str]] = {}
+        self.url_to_req_res_map: Dict[str, Dict[str, Any]] = {}
+        self.har_urls: List[Tuple[str, str, str, str]] = []
+        self.provenance: ProvenanceIndex = ProvenanceIndex()
+        self.dynamic_tokens: DynamicTokenIndex = {}
+
+    def add_entry(self, entry: Dict[str, Any]) -> None:
+        """
+        Formats a HAR entry and adds it to every map of the index.
+        """
+        request_data = entry.get("request", {})
+        response_data = entry.get("response", {})
+
+        formatted_request = format_request(request_data)
+        response_dict = format_response(response_data, self.bodies)
+
+        content = response_data.get("content", {})
+        # Scored before the entry joins the provenance index, so only earlier entries count as producers
+        self.dynamic_tokens[formatted_request] = detect_dynamic_tokens(formatted_request, self.provenance)
+        self.provenance.add_request(formatted_request)
+        self.provenance.add_response(formatted_request, content.get("text") or "", content.get("mimeType", ""))
+
+        # Every entry keeps its own response; repeated identical requests (polling, retries) may differ
+        self.entries.append((formatted_request, response_dict))
+        self.req_to_res_map[formatted_request] = response_dict
+        # If multiple requests to the same URL, the last one wins
+        self.url_to_req_res_map[formatted_request.url] = {
+            'request': formatted_request,
+            'response': response_dict
+        }
+
+        har_url = format_har_url(request_data, response_data)
+        if har_url:
+            self.har_urls.append(har_url)
+
+    @classmethod
+    def from_har_file(cls, har_file_path: str, streaming: bool = False) -> "HarIndex":
+        """
+        Reads the HAR file once and builds the index from its entries.
+        With `streaming`, entries are parsed incrementally instead of loading the whole document.
+        """
+        index = cls()
+
+        with open_har(har_file_path) as file:
+            if streaming:
+                entries = iter_har_entries(file)
+            else:
+                entries = json.load(file).get("log", {}).get("entries", [])
+
+            for entry in entries:
+                index.add_entry(entry)
+
+        return index
+
+
 def get_har_urls(har_file_path: str) -> List[Tuple[str, str, str, str]]:
     """
     Extracts and returns a list of tuples containing method, URL, response format, and response preview
     from a HAR file, excluding certain file types and keywords.
     """
-    # List to store tuples of URLs, request methods, response file formats, and response preview
-    urls_with_details = []
-
-    # Define a tuple of file extensions to exclude
-    excluded_extensions = (
-        ".png",
-        ".jpg",
-        ".jpeg",
-        ".gif",
-        ".webp",
-        ".svg",
-        ".ico",  # Image files
-        ".css",  # Stylesheets
-        # ".js",
-        # ".map",  # JavaScript files
-        ".woff",
-        ".woff2",
-        ".ttf",
-        ".otf",
-        ".eot",  # Font files
-        ".mp3",
-        ".mp4",
-        ".wav",
-        ".avi",
-        ".mov",
-        ".flv",
-        ".wmv",
-        ".webm",  # Media files
-        # ".pdf",
-        # ".zip",
-        ".rar",
-        ".7z",
-        ".tar",
-        ".gz",
-        ".exe",
-        ".dmg",  # Other non-text files
-    )
-
-    # Read the HAR file
-    with open(har_file_path, "r", encoding="utf-8") as file:
-        har_data = json.load(file)
-
-    # Extract entries from the HAR data
-    entries = har_data.get("log", {}).get("entries", [])   
-    for entry in entries:
-        request = entry.get("request", {})
-        response = entry.get("response", {})
-        url = request.get("url")
-        method = request.get("method", "GET")  # Default to 'GET' if method is missing
-        response_format = response.get("content", {}).get("mimeType", "")
-        response_text = response.get("content", {}).get("text", "")
-        response_preview = response_text[:30] if response_text else ""
-
-        if url:
-            parsed_url = urlparse(url)
-            path = parsed_url.path.lower()
-
-            _, extension = os.path.splitext(path)
-
-            request_text = url.lower()
-
-            headers = request.get("headers", [])
-            for header in headers:
-                request_text += header.get("name", "").lower()
-                request_text += header.get("value", "").lower()
-
-            postData = request.get("postData", {}).get("text", "").lower()
-            request_text += postData
-
-            # Exclude URLs with the specified extensions or if keywords are in the request
-            # this is done to reduce the number of requests we send to the LLM
-            if extension not in excluded_extensions and not any(
-                keyword.lower() in request_text for keyword in excluded_keywords
-            ):
-                urls_with_details.append((method, url, response_format, response_preview))
-
-    return urls_with_details
+    return HarIndex.from_har_file(har_file_path).har_urls
     
 
 def parse_cookie_file_to_dict(cookie_file_path: str) -> Dict[str, Dict[str, Any]]:
@@ -0,0 +1,212 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from langchain_core.messages import AIMessage
+
+from integuru.util.llm_cache import message_from_dict, message_to_dict
+from integuru.util.llm_pool import ModelLimits, chat_openai
+from integuru.util.routing import NoFallbackError
+from integuru.util.usage import current_stage
+
+BACKENDS = ("openai", "record", "replay", "scripted")
+DEFAULT_CASSETTE_PATH = "llm_cassette.json"
+CASSETTE_VERSION = 1
+
+# Creates the chat model of a model name, as LLMClientPool does
+Backend = Callable[[str, ModelLimits], Any]
+# What a scripted stage answers: function call arguments, message content, a message, or a list of these
+# used in turn (the last one repeats), or a function of the prompt and invoke kwargs returning one
+ScriptedResponse = Union[Dict[str, Any], str, AIMessage, List[Any], Callable[[str, Dict[str, Any]], Any]]
+
+
+class CassetteMissError(NoFallbackError, LookupError):
+    """
+    Raised when a replayed run makes an LLM call the cassette has no response for. Every model of
+    a stage's chain replays from the same recordings, so the router does not fall back on it.
+    """
+
+
+def normalize_prompt(prompt: Any) -> str:
+    """
+    Collapses whitespace, so a prompt still matches after its template is re-indented.
+    """
+    return " ".join(str(prompt).split())
+
+
+class Cassette:
+    """
+    LLM responses recorded to a JSON file, keyed by agent stage and normalized prompt.
+    With `load=False` the file is started afresh on the first recorded response.
+
+    A prompt sent several times in a stage replays its responses in the order they were recorded,
+    the last one repeating. Every recorded response is written to the file straight away, so a run
+    that dies still leaves a usable cassette.
+    """
+
+    def __init__(self, path: str = DEFAULT_CASSETTE_PATH, load: bool = True):
+        self.path = path
+        self.interactions: List[Dict[str, Any]] = []
+        self._responses: Dict[Tuple[Optional[str], str], List[Dict[str, Any]]] = {}
+        self._replayed: Dict[Tuple[Optional[str], str], int] = {}
+        self._lock = threading.Lock()
+        if load and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            for interaction in data.get("interactions", []):
+                self._add(interaction)
+
+    def _add(self, interaction: Dict[str, Any]) -> None:
+        self.interactions.append(interaction)
+        key = (interaction["stage"], interaction["prompt"])
+        self._responses.setdefault(key, []).append(interaction["response"])
+
+    def record(self, stage: Optional[str], prompt: Any, response: AIMessage) -> None:
+        with self._lock:
+            self._add({"stage": stage, "prompt": normalize_prompt(prompt), "response": message_to_dict(response)})
+            self._save()
+
+    def replay(self, stage: Optional[str], prompt: Any) -> AIMessage:
+        key = (stage, normalize_prompt(prompt))
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise CassetteMissError(
+                    f"No recorded response for stage '{stage}': prompt '{key[1][:200]}' in {self.path}; record the run again"
+                )
+            index = self._replayed.get(key, 0)
+            self._replayed[key] = index + 1
+        return message_from_dict(responses[min(index, len(responses) - 1)])
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file first so an interrupted write never truncates the cassette
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": CASSETTE_VERSION, "interactions": self.interactions}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class RecordingChatModel:
+    """
+    Wraps a chat model so every response is recorded to a cassette under the current stage.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any, cassette: Cassette):
+        self.model = model
+        self.cassette = cassette
+
+    def invoke(self, prompt: Any, **kwargs) -> Any:
+        response = self.model.invoke(prompt, **kwargs)
+        self.cassette.record(current_stage.get(), prompt, response)
+        return response
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> Any:
+        response = await self.model.ainvoke(prompt, **kwargs)
+        self.cassette.record(current_stage.get(), prompt, response)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+class ReplayChatModel:
+    """
+    Chat model answering from a cassette, without network access.
+    """
+
+    temperature = 1
+
+    def __init__(self, cassette: Cassette, model_name: str):
+        self.cassette = cassette
+        self.model_name = model_name
+
+    def invoke(self, prompt: Any, **kwargs) -> AIMessage:
+        return self.cassette.replay(current_stage.get(), prompt)
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> AIMessage:
+        return self.invoke(prompt, **kwargs)
+
+
+def scripted_message(response: Any, invoke_kwargs: Dict[str, Any]) -> AIMessage:
+    """
+    Builds the message of a scripted response: a dict is the arguments of the function the call asked for.
+    """
+    if isinstance(response, AIMessage):
+        return response
+    if isinstance(response, dict):
+        name = (invoke_kwargs.get("function_call") or {}).get("name", "")
+        return AIMessage(content="", additional_kwargs={"function_call": {"name": name, "arguments": json.dumps(response)}})
+    return AIMessage(content=str(response))
+
+
+class ScriptedChatModel:
+    """
+    Fake chat model answering each stage from a script, for tests and offline runs.
+    Stages missing from the script answer with the "default" entry, if any.
+    """
+
+    temperature = 1
+
+    def __init__(self, script: Dict[str, ScriptedResponse], model_name: str = "scripted"):
+        self.script = script
+        self.model_name = model_name
+        self._turns: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: Any, **kwargs) -> AIMessage:
+        stage = current_stage.get()
+        response = self.script.get(stage, self.script.get("default"))
+        if response is None:
+            raise CassetteMissError(f"The LLM script has no response for stage '{stage}'")
+        if isinstance(response, list):
+            with self._lock:
+                turn = self._turns.get(stage, 0)
+                self._turns[stage] = turn + 1
+            response = response[min(turn, len(response) - 1)]
+        if callable(response):
+            response = response(prompt, kwargs)
+        return scripted_message(response, kwargs)
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> AIMessage:
+        return self.invoke(prompt, **kwargs)
+
+
+def recording_backend(cassette: Cassette, backend: Backend = chat_openai) -> Backend:
+    return lambda model, limits: RecordingChatModel(backend(model, limits), cassette)
+
+
+def replay_backend(cassette: Cassette) -> Backend:
+    return lambda model, limits: ReplayChatModel(cassette, model)
+
+
+def scripted_backend(script: Dict[str, ScriptedResponse]) -> Backend:
+    return lambda model, limits: ScriptedChatModel(script, model)
+
+
+def make_backend(name: str, cassette_path: str = DEFAULT_CASSETTE_PATH, script_path: Optional[str] = None) -> Backend:
+    """
+    Returns the backend selected on the command line. Scripts are JSON objects mapping stages to responses.
+    """
+    if name == "openai":
+        return chat_openai
+    if name == "record":
+        return recording_backend(Cassette(cassette_path, load=False))
+    if name == "replay":
+        if not os.path.exists(cassette_path):
+            raise FileNotFoundError(f"Cassette {cassette_path} not found; record one with --llm-backend record")
+        return replay_backend(Cassette(cassette_path))
+    if name == "scripted":
+        if script_path is None:
+            raise ValueError("The scripted backend needs a script file")
+        with open(script_path) as f:
+            return scripted_backend(json.load(f))
+    raise ValueError(f"Unknown LLM backend '{name}', expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from langchain_core.messages import AIMessage
+
+DEFAULT_LLM_CACHE_PATH = os.environ.get(
+    "INTEGURU_LLM_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "integuru", "llm.sqlite")
+)
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 ** 2
+# How long another process may hold an in-flight claim before it is considered dead
+LEASE_SECONDS = 600
+POLL_SECONDS = 0.5
+
+
+def message_to_dict(message: AIMessage) -> Dict[str, Any]:
+    return {
+        "content": message.content,
+        "additional_kwargs": message.additional_kwargs,
+        "response_metadata": message.response_metadata,
+    }
+
+
+def message_from_dict(data: Dict[str, Any]) -> AIMessage:
+    return AIMessage(
+        content=data["content"],
+        additional_kwargs=data["additional_kwargs"],
+        response_metadata=data.get("response_metadata", {}),
+    )
+
+
+class _KeyLock:
+    """
+    Lock of one cache key and the number of threads holding or waiting for it.
+    """
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class LLMCache:
+    """
+    SQLite-backed cache of LLM responses, shared by every process using the same file.
+
+    Entries are keyed by model, prompt, function schema and temperature, expire after `ttl_seconds`
+    and are evicted least-recently-used once they exceed `max_bytes`. Concurrent identical calls are
+    deduplicated: threads and tasks in one process wait for the first caller, and other processes
+    wait on an in-flight claim recorded in the database.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_LLM_CACHE_PATH,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._owner = uuid.uuid4().hex
+        # Locks of the keys being computed in this process, dropped once no thread needs them
+        self._locks: Dict[str, _KeyLock] = {}
+        self._locks_guard = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS inflight (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per operation keeps the cache safe across threads and processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(model: Optional[str], prompt: Any, invoke_kwargs: Dict[str, Any], temperature: Optional[float]) -> str:
+        """
+        Returns the cache key of a call: a hash of the model, prompt, invoke kwargs
+        (functions, function_call, ...) and temperature.
+        """
+        payload = json.dumps(
+            {"model": model, "prompt": prompt, "kwargs": invoke_kwargs, "temperature": temperature},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        """
+        Returns the cached response for a key, or None if missing or expired.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return message_from_dict(json.loads(response))
+
+    def put(self, key: str, model: Optional[str], message: AIMessage) -> None:
+        """
+        Stores a response and evicts the least recently used entries beyond max_bytes.
+        """
+        response = json.dumps(message_to_dict(message), default=str)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response), now, now),
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM responses) "
+                "WHERE running > ?)",
+                (self.max_bytes,),
+            )
+
+    def clear_expired(self) -> int:
+        """
+        Deletes expired entries and stale in-flight claims. Returns the number of deleted responses.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM inflight WHERE expires < ?", (now,))
+            if self.ttl_seconds is None:
+                return 0
+            return conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)).rowcount
+
+    def _claim(self, key: str) -> bool:
+        """
+        Records that this process is computing `key`. Returns False if another live process already is.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND expires < ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO inflight (key, owner, expires) VALUES (?, ?, ?)",
+                (key, self._owner, now + LEASE_SECONDS),
+            )
+            return cursor.rowcount == 1
+
+    def _release(self, key: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, self._owner))
+
+    def _claimed_elsewhere(self, key: str) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT 1 FROM inflight WHERE key = ? AND expires >= ?", (key, time.time())
+            ).fetchone()
+        return row is not None
+
+    def _awaiting_other_process(self, key: str) -> bool:
+        """
+        True while another process holds the claim on `key` and has not stored its result yet.
+        """
+        return self._claimed_elsewhere(key) and self.get(key) is None
+
+    @contextmanager
+    def _key_lock(self, key: str) -> Iterator[None]:
+        with self._locks_guard:
+            key_lock = self._locks.setdefault(key, _KeyLock())
+            key_lock.users += 1
+        try:
+            with key_lock.lock:
+                yield
+        finally:
+            with self._locks_guard:
+                key_lock.users -= 1
+                if key_lock.users == 0:
+                    del self._locks[key]
+
+    def get_or_compute(self, key: str, model: Optional[str], compute: Callable[[], AIMessage]) -> AIMessage:
+        """
+        Returns the cached response for `key`, calling `compute` at most once across
+        concurrent threads and processes when it is missing.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._key_lock(key):
+            while True:
+                cached = self.get(key)
+                if cached is not None:
+                    return cached
+                if self._claim(key):
+                    break
+                # Another process is making the same call; wait for its result or for its claim to lapse
+                while self._awaiting_other_process(key):
+                    time.sleep(POLL_SECONDS)
+
+            try:
+                message = compute()
+                self.put(key, model, message)
+                return message
+            finally:
+                self._release(key)
+
+    async def aget_or_compute(
+        self, key: str, model: Optional[str], compute: Callable[[], Awaitable[AIMessage]]
+    ) -> AIMessage:
+        """
+        Async variant of get_or_compute: concurrent tasks with the same key share one call.
+        The SQLite calls run in worker threads, so a locked database never stalls the event loop.
+        """
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            while True:
+                cached = await asyncio.to_thread(self.get, key)
+                if cached is not None:
+                    future.set_result(cached)
+                    return cached
+                if await asyncio.to_thread(self._claim, key):
+                    break
+                while await asyncio.to_thread(self._awaiting_other_process, key):
+                    await asyncio.sleep(POLL_SECONDS)
+
+            try:
+                message = await compute()
+                await asyncio.to_thread(self.put, key, model, message)
+            finally:
+                await asyncio.to_thread(self._release, key)
+            future.set_result(message)
+            return message
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Waiters re-raise it; mark it retrieved so an unobserved failure is not logged twice
+                future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+
+class CachedChatModel:
+    """
+    Wraps a chat model so invoke/ainvoke are served from an LLMCache.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any, cache: LLMCache):
+        self.model = model
+        self.cache = cache
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return getattr(self.model, "model_name", None)
+
+    def _key(self, prompt: Any, kwargs: Dict[str, Any]) -> str:
+        return self.cache.make_key(self.model_name, prompt, kwargs, getattr(self.model, "temperature", None))
+
+    def invoke(self, prompt: Any, **kwargs) -> AIMessage:
+        return self.cache.get_or_compute(
+            self._key(prompt, kwargs), self.model_name, lambda: self.model.invoke(prompt, **kwargs)
+        )
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> AIMessage:
+        return await self.cache.aget_or_compute(
+            self._key(prompt, kwargs), self.model_name, lambda: self.model.ainvoke(prompt, **kwargs)
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
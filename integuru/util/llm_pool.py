@@ -0,0 +1,269 @@
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import openai
+from langchain_openai import ChatOpenAI
+
+from integuru.util.tokens import estimate_tokens
+from integuru.util.usage import UsageTrackingModel
+
+DEFAULT_TIMEOUT_SECONDS = 120.0
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    """
+    Client settings of one model. Rate limits of None are not enforced.
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    timeout_seconds: Optional[float] = DEFAULT_TIMEOUT_SECONDS
+    max_retries: int = DEFAULT_MAX_RETRIES
+    # Send a duplicate request when the first has not answered after this many seconds (async calls only)
+    hedge_after_seconds: Optional[float] = None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate_per_minute`, holding at most a minute's worth.
+
+    Callers reserve what they need and are told how long to wait for it. The balance may go
+    negative, so waiting callers are served in the order they reserved, without polling.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` from the bucket and returns the seconds to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A single request larger than the bucket would otherwise never be served
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Request and token buckets of one model, shared by every caller of that model. A rate limit
+    answer from the API pauses all callers until the time the API asked for.
+    """
+
+    def __init__(self, limits: ModelLimits):
+        self.requests = TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None
+        self.tokens = TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, prompt_tokens: int) -> float:
+        """
+        Reserves one request of about `prompt_tokens` tokens and returns the seconds to wait before sending it.
+        """
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(prompt_tokens))
+        with self._lock:
+            return max(delay, self.paused_until - time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed call may succeed when sent again: timeouts, connection errors,
+    rate limits and server errors.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    return isinstance(error, openai.RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds the API asked to wait before retrying, from the Retry-After header of the error's response.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error: BaseException) -> float:
+    """
+    Exponential backoff with full jitter, never shorter than the wait the API asked for.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after(error) or 0.0)
+
+
+def prompt_tokens(prompt: Any) -> int:
+    return estimate_tokens(prompt if isinstance(prompt, str) else str(prompt))
+
+
+class PooledChatModel:
+    """
+    Wraps a chat model with its model's rate limiter: every invoke/ainvoke waits for its share of the
+    request and token budget, is retried with jittered backoff on retryable errors and, in async calls,
+    times out after `timeout_seconds` and is hedged after `hedge_after_seconds`.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any, limits: ModelLimits, limiter: RateLimiter):
+        self.model = model
+        self.limits = limits
+        self.limiter = limiter
+
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """
+        Returns the seconds to wait before retrying a failed attempt, or None when the error is final.
+        """
+        if attempt >= self.limits.max_retries or not is_retryable(error):
+            return None
+        delay = backoff_delay(attempt, error)
+        if is_rate_limit(error):
+            # Every caller of this model would hit the same limit
+            self.limiter.pause(delay)
+        return delay
+
+    def invoke(self, prompt: Any, **kwargs) -> Any:
+        tokens = prompt_tokens(prompt)
+        attempt = 0
+        while True:
+            time.sleep(self.limiter.reserve(tokens))
+            try:
+                return self.model.invoke(prompt, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def _ahedged_invoke(self, prompt: Any, tokens: int, kwargs: Dict[str, Any]) -> Any:
+        """
+        Sends the request and, if it has not answered after `hedge_after_seconds`, a duplicate.
+        Returns the first successful answer and cancels the other request.
+        """
+        pending = {asyncio.ensure_future(self.model.ainvoke(prompt, **kwargs))}
+        hedged = not self.limits.hedge_after_seconds
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedged else self.limits.hedge_after_seconds,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not done and not hedged:
+                    hedged = True
+                    # The duplicate counts against the rate limits like any other request
+                    await asyncio.sleep(self.limiter.reserve(tokens))
+                    if not any(task.done() for task in pending):
+                        pending.add(asyncio.ensure_future(self.model.ainvoke(prompt, **kwargs)))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> Any:
+        tokens = prompt_tokens(prompt)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.limiter.reserve(tokens))
+            try:
+                return await asyncio.wait_for(self._ahedged_invoke(prompt, tokens, kwargs), self.limits.timeout_seconds)
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+def chat_openai(model: str, limits: ModelLimits) -> ChatOpenAI:
+    # Retries are done by the pool, which knows about the other callers of the model
+    return ChatOpenAI(model=model, temperature=1, timeout=limits.timeout_seconds, max_retries=0)
+
+
+class LLMClientPool:
+    """
+    One client per model, created on first use and shared by every caller, thread and concurrent
+    analysis using the pool's backend and limits, so they draw from the same rate limit budget.
+    Calls are recorded by the usage recorder of the caller's context.
+    """
+
+    def __init__(
+        self,
+        default_limits: Optional[ModelLimits] = None,
+        model_limits: Optional[Dict[str, ModelLimits]] = None,
+        factory: Callable[[str, ModelLimits], Any] = chat_openai,
+    ):
+        self.default_limits = default_limits or ModelLimits()
+        self.model_limits: Dict[str, ModelLimits] = dict(model_limits or {})
+        self.factory = factory
+        self._clients: Dict[str, PooledChatModel] = {}
+        # Models the API refused for this backend's key
+        self.unavailable_models: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def limits_for(self, model: str) -> ModelLimits:
+        return self.model_limits.get(model, self.default_limits)
+
+    def mark_unavailable(self, model: str) -> None:
+        """
+        Records a model the API refused, so later fallback chains skip it.
+        """
+        with self._lock:
+            self.unavailable_models.add(model)
+
+    def available(self, models: List[str]) -> List[str]:
+        """
+        Returns the models not refused by the API, in order.
+        """
+        with self._lock:
+            return [model for model in models if model not in self.unavailable_models]
+
+    def get(self, model: str) -> PooledChatModel:
+        client = self._clients.get(model)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(model)
+                if client is None:
+                    limits = self.limits_for(model)
+                    # Inside the pool, so every attempt that reaches the API is counted, retries and hedges included
+                    client = PooledChatModel(UsageTrackingModel(self.factory(model, limits)), limits, RateLimiter(limits))
+                    self._clients[model] = client
+        return client
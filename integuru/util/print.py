@@ -1,8 +1,22 @@
+import asyncio
 from platform import node
 import matplotlib.pyplot as plt
 import networkx as nx
-from typing import Dict, Set, Optional, Any
+from typing import Dict, Set, Optional, Any, Tuple
 from integuru.util.LLM import llm
+from integuru.util.usage import usage_scope
+from integuru.util.prompts import (
+    AGGREGATE_FUNCTIONS,
+    GENERATE_CODE,
+    GENERATE_CODE_COOKIE_ONLY,
+    GENERATE_CODE_DYNAMIC_PARTS,
+    GENERATE_CODE_FILE_RESPONSE,
+    GENERATE_CODE_HTML_PARSE,
+    GENERATE_CODE_HTML_RESPONSE,
+    GENERATE_CODE_HTML_SNIPPETS,
+    GENERATE_CODE_JSON_RESPONSE,
+    GENERATE_CODE_PARAMETERS,
+)
 import json
 from langchain_openai import ChatOpenAI
 from typing import List
@@ -10,7 +24,7 @@ from openai import NotFoundError  # Add this import
 
 def print_dag(
     graph: nx.DiGraph,
-    current_node_id: str,
+    current_node_id: int,
     prefix: str = "",
     is_last: bool = True,
     visited: Optional[Set[str]] = None,
@@ -135,18 +149,16 @@ def find_json_path(json_obj, target_value, current_path=None):
 
 
 
-def generate_code(node_id: str, graph: nx.DiGraph) -> str:
-    """
-    Generates Python code for a given node in the graph based on its attributes.
-    """
+def cookie_code(node_attrs: Dict[str, Any]) -> str:
+    cookie_value = node_attrs.get('content', {}).get('value', '')
+    cookie_key = node_attrs.get('content', {}).get('key', '')
+    return f"{cookie_value} = cookie_dict['{cookie_key}']"
 
-    node_attrs = graph.nodes[node_id]
-
-    if node_attrs.get("node_type", "") == "cookie":
-        cookie_value = node_attrs.get('content', {}).get('value', '')
-        cookie_key = node_attrs.get('content', {}).get('key', '')
-        return f"{cookie_value} = cookie_dict['{cookie_key}']"
 
+def generate_code_prompt(node_attrs: Dict[str, Any]) -> str:
+    """
+    Builds the code generation prompt for a request node.
+    """
     content = node_attrs.get("content", {})
     curl = content.get("key", "")
     response = content.get("value", {})
@@ -161,26 +173,23 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
     parse_response_prompt = ""
 
     if response_type in ["application/octet-stream", "application/pdf", "application/zip", "image/jpeg", "image/png"]:
-        parse_response_prompt = f"""
-            The response is a downloadable file of type {response_type}.
-            Include code to save the response content to a file with an appropriate extension.
-        """
+        parse_response_prompt = GENERATE_CODE_FILE_RESPONSE.format(response_type=response_type)
 
     if "application/json" in response_type:
+        # Key paths recorded from the provenance index at ingestion; parse the response only for the rest
+        extracted_key_paths = node_attrs.get("extracted_key_paths") or {}
+        json_response = None
         key_paths = []
         for extracted_part in extracted_parts:
-            key_path = find_json_path(json.loads(response_text), extracted_part)
+            if extracted_part in extracted_key_paths:
+                key_path = extracted_key_paths[extracted_part]
+            else:
+                if json_response is None:
+                    json_response = json.loads(response_text)
+                key_path = find_json_path(json_response, extracted_part)
             key_paths.append(key_path)
 
-        parse_response_prompt = f"""
-            Response:
-            {response_text}
-
-            Parse out the following variables from the response using JSON keys:
-            {key_paths}
-
-            Through your judgement from analyzing the response, if polling is required to retrieve the variables above from the response. If so, implement polling else dont.
-        """
+        parse_response_prompt = GENERATE_CODE_JSON_RESPONSE.format(response_text=response_text, key_paths=key_paths)
 
     if "text/html" in response_type or "application/javascript" in response_type:
         if len(response_text) > 100000:
@@ -193,69 +202,25 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
                     snippet = response_text[start:end]
                     context_snippets.append(f"{part}: {snippet}")
             
-            parse_response_prompt = f"""
-                The HTML response is too long to process entirely. 
-                Here are the relevant sections for each variable to be extracted:
-
-                {chr(10).join(context_snippets)}
-
-            """
+            parse_response_prompt = GENERATE_CODE_HTML_SNIPPETS.format(snippets=chr(10).join(context_snippets))
         else:
-            parse_response_prompt = f"""
-                Response:
-                {response_text}
-            """
-        parse_response_prompt += f"""
-            Parse out the variables following variables locations from the response using regex using locational context: 
-
-            {extracted_parts}
-            Do not include the variable in the regex filter as the variable will change. And do not be too specific with the regex.
-
-        """
+            parse_response_prompt = GENERATE_CODE_HTML_RESPONSE.format(response_text=response_text)
+        parse_response_prompt += GENERATE_CODE_HTML_PARSE.format(extracted_parts=extracted_parts)
 
     dynamic_parts_prompt = ""
     if dynamic_parts:
-        dynamic_parts_prompt = f"""
-    Instead of hard coding, pass the following variables into the function as parameters in a dict. The dict should have keys thats the same as the value itself
-    {dynamic_parts} 
-
-    Keep everything else in the header hardcoded.
-    """
-
-    prompt = f"""
-    Task:
-    Write a Python function with a descriptive name that makes a request like the cURL below:
-    {curl}
-
-
-    Assume cookies are in a variable as parameter called "cookie_string".
-
-    The parameters should be {"1. a dict of all the parameters and 2. Just the cookie string" if dynamic_parts else "only the cookie string"}.
+        dynamic_parts_prompt = GENERATE_CODE_DYNAMIC_PARTS.format(dynamic_parts=dynamic_parts)
 
-    {dynamic_parts_prompt}
-
-    {parse_response_prompt}
-    
-    Return a dictionary with the keys as the original parsed values content (needs to be hardcoded) and the values as the parsed values.
-
-    Do not include pseudo-headers or any headers that start with a colon in the request.
-
-    IMPORTANT! Do not include any backticks or markdown syntax AT ALL
-
-    """
-
-    # Make the API call using o1_llm
+    return GENERATE_CODE.render(
+        parameters=GENERATE_CODE_PARAMETERS if dynamic_parts else GENERATE_CODE_COOKIE_ONLY,
+        dynamic_parts=dynamic_parts_prompt,
+        parse_response=parse_response_prompt,
+        curl=curl,
+    )
 
-    llm_model = llm.switch_to_alternate_model()
-    try:
-        response = llm_model.invoke(prompt)
-    except Exception as e:
-        print("Switching to default model")
-        llm.revert_to_default_model()
-        response = llm.switch_to_alternate_model().invoke(prompt)
 
-    # Extract the generated code from the response
-    code = response.content.strip()
+def strip_code_fences(content: str) -> str:
+    code = content.strip()
 
     # cannot get chatgpt to not return backticks
     if code.startswith("```python"):
@@ -265,43 +230,39 @@ def generate_code(node_id: str, graph: nx.DiGraph) -> str:
 
     return code
 
-def aggregate_functions(txt_path, output_path):
-    # Read the content of the file
-    with open(txt_path, 'r') as file:
-        content = file.read()
 
-    # Initialize ChatGPT
+def generate_code(node_id: int, graph: nx.DiGraph) -> str:
+    """
+    Generates Python code for a given node in the graph based on its attributes.
+    """
+    node_attrs = graph.nodes[node_id]
+    if node_attrs.get("node_type", "") == "cookie":
+        return cookie_code(node_attrs)
 
-    # Prepare the prompt for ChatGPT
-    prompt = f"""
-    The following text contains multiple Python functions:
+    # Routed to o1 by default, falling back to the default model
+    with usage_scope("generate_code", node_id):
+        response = llm.get_instance().invoke(generate_code_prompt(node_attrs))
+    return strip_code_fences(response.content)
 
-    {content}
 
-    Please generate Python code that does the following:    
-    1. Fix up the functions if needed in the order they appear in the text.
-    2. Leave everything that is hardcoded as is.
-    3. Call each function in the order they appear in the text.
-    4. The cookies will be hard coded in the file in a string format of key=value;key=value. You will need to convert them to a dict to retrieve values from them.
-    5. Pass the return value of each function as an argument to the next function, if applicable.
-    6. Ensure that the last function in the text is called last.
-    7. Output the entire directly runnable code
+async def agenerate_code(node_id: int, graph: nx.DiGraph) -> str:
+    """
+    Async variant of generate_code.
+    """
+    node_attrs = graph.nodes[node_id]
+    if node_attrs.get("node_type", "") == "cookie":
+        return cookie_code(node_attrs)
 
+    with usage_scope("generate_code", node_id):
+        response = await llm.get_instance().ainvoke(generate_code_prompt(node_attrs))
+    return strip_code_fences(response.content)
 
 
-    Only provide the Python code, without any explanations or markdown formatting.
-    DO NOT include any backticks or markdown syntax AT ALL
-    """
+def aggregate_functions_prompt(content: str) -> str:
+    return AGGREGATE_FUNCTIONS.render(functions=content)
 
-    # Get the response from ChatGPT
 
-    llm_model = llm.switch_to_alternate_model()
-    try:
-        response = llm_model.invoke(prompt)
-    except Exception as e:
-        print("Switching to default model")
-        llm.revert_to_default_model()
-        response = llm.switch_to_alternate_model().invoke(prompt)
+def write_aggregated_code(response, output_path):
     # Extract the generated code
     generated_code = response.content.strip()
 
@@ -313,6 +274,29 @@ def aggregate_functions(txt_path, output_path):
 
     return output_path
 
+
+def aggregate_functions(txt_path, output_path):
+    # Read the content of the file
+    with open(txt_path, 'r') as file:
+        content = file.read()
+
+    # Get the response from ChatGPT
+    with usage_scope("aggregate_functions"):
+        response = llm.get_instance().invoke(aggregate_functions_prompt(content))
+    return write_aggregated_code(response, output_path)
+
+
+async def aaggregate_functions(txt_path, output_path):
+    """
+    Async variant of aggregate_functions.
+    """
+    with open(txt_path, 'r') as file:
+        content = file.read()
+
+    with usage_scope("aggregate_functions"):
+        response = await llm.get_instance().ainvoke(aggregate_functions_prompt(content))
+    return write_aggregated_code(response, output_path)
+
 def generate_obfuscation_map(dynamic_parts_list: List[str]) -> Dict[str, str]:
     obfuscation_map = {}
     for part in dynamic_parts_list:
@@ -336,20 +320,17 @@ def swap_string_using_obfuscation_map(input_string: str, obfuscation_map: Dict[s
         input_string = input_string.replace(key, value)
     return input_string
 
-def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_generate_code: bool = False) -> None:
+def walk_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None) -> Tuple[List[int], List[str]]:
     """
-    Generates the order of requests to be made based on the DAG.
     Prints the DAG starting from source nodes and ending at sink nodes, traversing successors.
+    Returns the node ids in request order (dependencies first) and the dynamic parts seen on the way.
     """
-    if to_generate_code:
-        print("--------------Generating code------------")
-
-    generated_code = ""
+    request_order = []
 
     dynamic_parts_list = []
 
     def _print_dag_recursive(
-        current_node_id: str,
+        current_node_id: int,
         prefix: str = "",
         is_last: bool = True,
         visited: Optional[Set[str]] = None,
@@ -359,7 +340,7 @@ def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_
         """
         Helper function to recursively print the DAG in reverse order.
         """
-        nonlocal generated_code, dynamic_parts_list
+        nonlocal dynamic_parts_list
         if visited is None:
             visited = set()
         if fully_processed is None:
@@ -398,12 +379,11 @@ def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_
         # After all children have been processed, print the current node
         connector = "└── " if is_last else "├── "
         print(f"{prefix}{connector}{get_node_label(graph, current_node_id)}")
-        if to_generate_code:
-            generated_code += generate_code(current_node_id, graph) + "\n\n"
+        request_order.append(current_node_id)
         fully_processed.add(current_node_id)
         visited.remove(current_node_id)
     
-    def get_node_label(graph: nx.DiGraph, node_id: str) -> str:
+    def get_node_label(graph: nx.DiGraph, node_id: int) -> str:
         """
         Generates a label for a node in the graph based on its attributes.
         """
@@ -441,14 +421,56 @@ def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_
             depth=0,
         )
     
+    return request_order, dynamic_parts_list
+
+
+def write_generated_code(generated_code: str, dynamic_parts_list: List[str]) -> None:
+    obfuscation_map = generate_obfuscation_map(dynamic_parts_list)
+    generated_code = swap_string_using_obfuscation_map(generated_code, obfuscation_map)
+    with open("generated_code.txt", "w") as f:
+        f.write(generated_code)
+
+
+def print_dag_in_reverse(graph: nx.DiGraph, max_depth: Optional[int] = None, to_generate_code: bool = False) -> None:
+    """
+    Generates the order of requests to be made based on the DAG.
+    Prints the DAG starting from source nodes and ending at sink nodes, traversing successors.
+    """
+    if to_generate_code:
+        print("--------------Generating code------------")
+
+    request_order, dynamic_parts_list = walk_dag_in_reverse(graph, max_depth)
+
     if to_generate_code:
-        obfuscation_map = generate_obfuscation_map(dynamic_parts_list)
-        generated_code = swap_string_using_obfuscation_map(generated_code, obfuscation_map)
-        with open("generated_code.txt", "w") as f:
-            f.write(generated_code)
+        generated_code = "".join(generate_code(node_id, graph) + "\n\n" for node_id in request_order)
+        write_generated_code(generated_code, dynamic_parts_list)
         
         aggregate_functions("generated_code.txt", "generated_code.py")
         print("--------------Generated integration code in generated_code.py!!------------")
 
 
+async def aprint_dag_in_reverse(
+    graph: nx.DiGraph, max_depth: Optional[int] = None, to_generate_code: bool = False, concurrency: int = 8
+) -> None:
+    """
+    Async variant of print_dag_in_reverse: the functions of all nodes are generated concurrently,
+    at most `concurrency` LLM calls at a time, and assembled in request order.
+    """
+    if to_generate_code:
+        print("--------------Generating code------------")
+
+    request_order, dynamic_parts_list = walk_dag_in_reverse(graph, max_depth)
 
+    if to_generate_code:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def generate(node_id: int) -> str:
+            async with semaphore:
+                return await agenerate_code(node_id, graph)
+
+        node_code = await asyncio.gather(*(generate(node_id) for node_id in request_order))
+        generated_code = "".join(code + "\n\n" for code in node_code)
+        write_generated_code(generated_code, dynamic_parts_list)
+
+        await aaggregate_functions("generated_code.txt", "generated_code.py")
+        print("--------------Generated integration code in generated_code.py!!------------")
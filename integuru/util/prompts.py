@@ -0,0 +1,316 @@
+from dataclasses import dataclass
+from textwrap import dedent
+from typing import Any, Dict, Optional
+
+# Provider prompt caches match requests by their longest shared prefix (function definitions first, then
+# the prompt), so every template keeps its instructions and function definition free of per-call values
+# and puts those values last, the ones shared by an analysis's calls before the ones specific to a call.
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A prompt of an agent stage: a static prefix, identical on every call, then a suffix formatted with the
+    per-call values. Stages answering through a function call carry its definition, which is static too.
+    """
+
+    prefix: str
+    suffix: str
+    function: Optional[Dict[str, Any]] = None
+
+    def render(self, **values: Any) -> str:
+        return self.prefix + self.suffix.format(**values)
+
+    def invoke_kwargs(self) -> Dict[str, Any]:
+        if self.function is None:
+            return {}
+        return {"functions": [self.function], "function_call": {"name": self.function["name"]}}
+
+
+_DYNAMIC_PARTS_RULES = """
+Important:
+    - IGNORE THE COOKIE HEADER
+    - Ignore common headers like user-agent, sec-ch-ua, accept-encoding, referer, etc.
+    - Exclude parameters that represent arbitrary user input or general data that can be hardcoded, such as amounts, notes, messages, actions, etc.
+    - Only output the variable values and not the keys.
+    - Only include dynamic parts that are unique identifiers, tokens, or session variables.
+"""
+
+_DYNAMIC_PARTS_ITEM_DESCRIPTION = (
+    "Only strictly include the dynamic values (not the keys or any not extra part in front and after the value) of parts that are unique to a user or session "
+    "and, if incorrect, will cause the request to fail."
+    "Do not include the keys, only the values."
+)
+
+END_URL = PromptTemplate(
+    prefix=dedent("""
+        Task:
+        Given the list of URLs, request types, and response formats below, find the URL responsible for the action described before the list.
+        """),
+    suffix=dedent("""
+        Action:
+        {action}
+
+        URLs:
+        {candidates}
+        """),
+    function={
+        "name": "identify_end_url",
+        "description": "Identify the URL responsible for a specific action",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "The URL responsible for the action"
+                }
+            },
+            "required": ["url"]
+        }
+    },
+)
+
+INPUT_VARIABLES = PromptTemplate(
+    prefix=dedent("""
+        Task:
+        Identify which input variables (the value in the key-value pair) from the Input Variables provided below are present in the cURL command below them.
+
+        Important:
+        - If an input variable is found in the cURL, include it in the output.
+        - Do not include variables that are not provided below.
+        - The key of the input variable is a description of the variable.
+        - The value is the value that should closely match the value in the cURL command. No substitutions.
+        """),
+    suffix=dedent("""
+        Input Variables: {input_variables}
+        cURL: {curl}
+        """),
+    function={
+        "name": "identify_input_variables",
+        "description": "Identify input variables present in the cURL command.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "identified_variables": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "variable_name": {"type": "string", "description": "The original key of the variable"},
+                            "variable_value": {"type": "string", "description": "The exact version of the variable that is present in the cURL command. This should closely match the value in the provided Input Variables."}
+                        },
+                        "required": ["variable_name", "variable_value"]
+                    },
+                    "description": "A list of identified variables and their values."
+                }
+            },
+            "required": ["identified_variables"]
+        }
+    },
+)
+
+DYNAMIC_PARTS = PromptTemplate(
+    prefix=dedent("""
+        Task:
+
+        Use your best judgment to identify which parts of the cURL command below are dynamic, specific to a user or session, and are checked by the server for validity. These include tokens, IDs, session variables, or any other values that are unique to a user or session and, if incorrect, will cause the request to fail.
+        """) + _DYNAMIC_PARTS_RULES,
+    suffix=dedent("""
+        URL: {curl}
+        {hints}"""),
+    function={
+        "name": "identify_dynamic_parts",
+        "description": (
+            "Given the cURL command, identify which parts are dynamic and validated by the server "
+            "for correctness (e.g., IDs, tokens, session variables). Exclude any parameters that represent "
+            "arbitrary user input or general data that can be hardcoded (e.g., amounts, notes, messages)."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "dynamic_parts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of dynamic parts identified in the cURL command. Do not include duplicates. " + _DYNAMIC_PARTS_ITEM_DESCRIPTION,
+                }
+            },
+            "required": ["dynamic_parts"],
+        },
+    },
+)
+
+DYNAMIC_PARTS_HINTS = dedent("""
+    Likely dynamic values found by a local scan, with why (confirm or reject each, it may have missed some):
+    {hints}
+    """)
+
+DYNAMIC_PARTS_BATCH = PromptTemplate(
+    prefix=dedent("""
+        Task:
+
+        For each cURL command below, use your best judgment to identify which of its parts are dynamic, specific to a user or session, and are checked by the server for validity. These include tokens, IDs, session variables, or any other values that are unique to a user or session and, if incorrect, will cause the request to fail.
+        """) + _DYNAMIC_PARTS_RULES
+        + "    - Answer for every cURL command, using its 0-based index in the list below. Use an empty list when it has no dynamic parts.\n",
+    suffix=dedent("""
+        cURLs:
+        {curls}
+        {hints}"""),
+    function={
+        "name": "identify_dynamic_parts_batch",
+        "description": (
+            "Given the cURL commands, identify for each of them which parts are dynamic and validated by the server "
+            "for correctness (e.g., IDs, tokens, session variables). Exclude any parameters that represent "
+            "arbitrary user input or general data that can be hardcoded (e.g., amounts, notes, messages)."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "requests": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer", "description": "The index of the cURL command in the list"},
+                            "dynamic_parts": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "List of dynamic parts identified in this cURL command. Do not include duplicates. " + _DYNAMIC_PARTS_ITEM_DESCRIPTION,
+                            },
+                        },
+                        "required": ["index", "dynamic_parts"],
+                    },
+                    "description": "One entry per cURL command, in the order of the list.",
+                }
+            },
+            "required": ["requests"],
+        },
+    },
+)
+
+DYNAMIC_PARTS_BATCH_HINTS = dedent("""
+    Likely dynamic values found by a local scan, by index, with why (confirm or reject each, it may have missed some):
+    {hints}
+    """)
+
+SIMPLEST_REQUEST = PromptTemplate(
+    prefix=dedent("""
+        Task:
+        Given the list of cURL commands below, find the index of the curl that has the least number of dependencies and variables.
+        The index should be 0-based (i.e., the first item has index 0).
+        """),
+    suffix="\n{curls}\n",
+    function={
+        "name": "get_simplest_curl_index",
+        "description": "Find the index of the simplest cURL command from a list",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "index": {
+                    "type": "integer",
+                    "description": "The index of the simplest cURL command in the list"
+                }
+            },
+            "required": ["index"]
+        }
+    },
+)
+
+GENERATE_CODE = PromptTemplate(
+    prefix=dedent("""
+        Task:
+        Write a Python function with a descriptive name that makes a request like the cURL at the end of this prompt.
+
+        Assume cookies are in a variable as parameter called "cookie_string".
+
+        Return a dictionary with the keys as the original parsed values content (needs to be hardcoded) and the values as the parsed values.
+
+        Do not include pseudo-headers or any headers that start with a colon in the request.
+
+        IMPORTANT! Do not include any backticks or markdown syntax AT ALL
+
+        The parameters, the values to parse out of the response and the cURL follow.
+        """),
+    suffix=dedent("""
+        The parameters should be {parameters}.
+        {dynamic_parts}
+        {parse_response}
+        cURL:
+        {curl}
+        """),
+)
+
+GENERATE_CODE_PARAMETERS = "1. a dict of all the parameters and 2. Just the cookie string"
+GENERATE_CODE_COOKIE_ONLY = "only the cookie string"
+
+GENERATE_CODE_DYNAMIC_PARTS = dedent("""
+    Instead of hard coding, pass the following variables into the function as parameters in a dict. The dict should have keys thats the same as the value itself
+    {dynamic_parts}
+
+    Keep everything else in the header hardcoded.
+    """)
+
+GENERATE_CODE_FILE_RESPONSE = dedent("""
+    The response is a downloadable file of type {response_type}.
+    Include code to save the response content to a file with an appropriate extension.
+    """)
+
+GENERATE_CODE_JSON_RESPONSE = dedent("""
+    Response:
+    {response_text}
+
+    Parse out the following variables from the response using JSON keys:
+    {key_paths}
+
+    Through your judgement from analyzing the response, if polling is required to retrieve the variables above from the response. If so, implement polling else dont.
+    """)
+
+GENERATE_CODE_HTML_SNIPPETS = dedent("""
+    The HTML response is too long to process entirely.
+    Here are the relevant sections for each variable to be extracted:
+
+    {snippets}
+    """)
+
+GENERATE_CODE_HTML_RESPONSE = dedent("""
+    Response:
+    {response_text}
+    """)
+
+GENERATE_CODE_HTML_PARSE = dedent("""
+    Parse out the variables following variables locations from the response using regex using locational context:
+
+    {extracted_parts}
+    Do not include the variable in the regex filter as the variable will change. And do not be too specific with the regex.
+    """)
+
+AGGREGATE_FUNCTIONS = PromptTemplate(
+    prefix=dedent("""
+        The text at the end of this prompt contains multiple Python functions.
+
+        Please generate Python code that does the following:
+        1. Fix up the functions if needed in the order they appear in the text.
+        2. Leave everything that is hardcoded as is.
+        3. Call each function in the order they appear in the text.
+        4. The cookies will be hard coded in the file in a string format of key=value;key=value. You will need to convert them to a dict to retrieve values from them.
+        5. Pass the return value of each function as an argument to the next function, if applicable.
+        6. Ensure that the last function in the text is called last.
+        7. Output the entire directly runnable code
+
+        Only provide the Python code, without any explanations or markdown formatting.
+        DO NOT include any backticks or markdown syntax AT ALL
+
+        The functions:
+        """),
+    suffix="\n{functions}\n",
+)
+
+# Templates of every stage making LLM calls, by stage name
+PROMPTS: Dict[str, PromptTemplate] = {
+    "end_url": END_URL,
+    "input_variables": INPUT_VARIABLES,
+    "dynamic_parts": DYNAMIC_PARTS,
+    "dynamic_parts_batch": DYNAMIC_PARTS_BATCH,
+    "simplest_request": SIMPLEST_REQUEST,
+    "generate_code": GENERATE_CODE,
+    "aggregate_functions": AGGREGATE_FUNCTIONS,
+}
@@ -0,0 +1,119 @@
+import json
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from integuru.models.request import Request
+
+# Where a value was seen
+RESPONSE_JSON = "response_json"
+REQUEST_QUERY = "query"
+REQUEST_HEADER = "header"
+REQUEST_JSON_BODY = "json_body"
+REQUEST_FORM_BODY = "form_body"
+
+# Values longer than this are not indexed (bodies, blobs); they still reach the substring search
+MAX_VALUE_LENGTH = 2048
+
+
+class ValueSource(NamedTuple):
+    request: Request
+    location: str
+    # JSON key path for JSON values, (name,) for query parameters, headers and form fields
+    path: Tuple[Any, ...]
+
+
+def iter_json_values(json_obj: Any, current_path: Tuple[Any, ...] = ()) -> Iterator[Tuple[Tuple[Any, ...], str]]:
+    """
+    Yields (key path, value) for every string or number leaf of a JSON object.
+    """
+    if isinstance(json_obj, dict):
+        for key, value in json_obj.items():
+            yield from iter_json_values(value, current_path + (key,))
+    elif isinstance(json_obj, list):
+        for i, item in enumerate(json_obj):
+            yield from iter_json_values(item, current_path + (i,))
+    elif isinstance(json_obj, str):
+        yield current_path, json_obj
+    elif isinstance(json_obj, (int, float)) and not isinstance(json_obj, bool):
+        yield current_path, str(json_obj)
+
+
+class ProvenanceIndex:
+    """
+    Maps every value seen in the HAR (JSON response leaves, query parameters, headers,
+    JSON and form request bodies) to the entries and locations where it appears.
+    Built during ingestion so producers of a dynamic part are an exact-match lookup.
+    """
+
+    def __init__(self):
+        self.values: Dict[str, List[ValueSource]] = {}
+
+    def _add(self, value: str, source: ValueSource) -> None:
+        if value and len(value) <= MAX_VALUE_LENGTH:
+            self.values.setdefault(value, []).append(source)
+
+    def add_request(self, request: Request) -> None:
+        """
+        Indexes the query parameters, headers and body values of a request.
+        """
+        for name, value in (request.query_params or {}).items():
+            self._add(value, ValueSource(request, REQUEST_QUERY, (name,)))
+
+        for name, value in request.headers.items():
+            self._add(value, ValueSource(request, REQUEST_HEADER, (name,)))
+            # e.g. "Bearer <token>"
+            parts = value.split()
+            if len(parts) > 1:
+                for part in parts:
+                    self._add(part, ValueSource(request, REQUEST_HEADER, (name,)))
+
+        if isinstance(request.body, (dict, list)):
+            for path, value in iter_json_values(request.body):
+                self._add(value, ValueSource(request, REQUEST_JSON_BODY, path))
+        elif isinstance(request.body, str):
+            content_type = next(
+                (v for k, v in request.headers.items() if k.lower() == "content-type"), ""
+            )
+            if "application/x-www-form-urlencoded" in content_type.lower():
+                for name, value in parse_qsl(request.body, keep_blank_values=False):
+                    self._add(value, ValueSource(request, REQUEST_FORM_BODY, (name,)))
+
+    def add_response(self, request: Request, text: str, mime_type: str) -> None:
+        """
+        Indexes the leaves of a JSON response with their key paths. Every response of repeated
+        identical requests is indexed, each value under the request that received it.
+        """
+        if not text or "json" not in (mime_type or "").lower():
+            return
+        try:
+            json_obj = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        for path, value in iter_json_values(json_obj):
+            self._add(value, ValueSource(request, RESPONSE_JSON, path))
+
+    def sources(self, value: str, location: Optional[str] = None) -> List[ValueSource]:
+        """
+        Returns where a value appears, optionally restricted to one location.
+        """
+        sources = self.values.get(value, [])
+        if location is None:
+            return list(sources)
+        return [source for source in sources if source.location == location]
+
+    def producers(self, value: str) -> List[Request]:
+        """
+        Returns the requests whose JSON response contains the value, in ingestion order.
+        """
+        return list(dict.fromkeys(source.request for source in self.sources(value, RESPONSE_JSON)))
+
+    def key_paths(self, value: str, request: Request) -> List[Dict[str, Any]]:
+        """
+        Returns the JSON key paths of a value in a request's response,
+        in the same format as print.find_json_path.
+        """
+        # Repeated identical requests may have returned the value at the same path
+        paths = dict.fromkeys(
+            source.path for source in self.sources(value, RESPONSE_JSON) if source.request == request
+        )
+        return [{'key_path': list(path), 'value': value} for path in paths]
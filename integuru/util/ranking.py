@@ -0,0 +1,96 @@
+import math
+import re
+from collections import Counter
+from typing import List, Sequence, Tuple
+
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Words of a task prompt that say nothing about which request performs it
+STOPWORDS = frozenset(
+    "a an and are as at be by for from i in into is it me my of on or our that the their this to we with you your".split()
+)
+
+
+def _stem(word: str) -> str:
+    # Light suffix stripping so "bills"/"bill" and "downloading"/"download" meet
+    for suffix in ("ing", "ies", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+    if word.endswith("s") and not word.endswith(("ss", "us")) and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase, lightly stemmed word tokens, breaking camelCase and
+    snake_case identifiers and URL punctuation apart.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        word = word.lower()
+        if word not in STOPWORDS:
+            tokens.append(_stem(word))
+    return tokens
+
+
+def har_url_tokens(har_url: Tuple[str, str, str, str]) -> List[str]:
+    """
+    Tokens of a (method, URL, response format, response preview) tuple.
+    """
+    method, url, response_format, response_preview = har_url
+    return tokenize(f"{method} {url} {response_format} {response_preview}")
+
+
+class BM25Index:
+    """
+    Okapi BM25 over pre-tokenized documents.
+    """
+
+    def __init__(self, documents: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+        document_frequencies = Counter(term for frequencies in self.term_frequencies for term in frequencies)
+        count = len(self.term_frequencies)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+
+    def scores(self, query: Sequence[str]) -> List[float]:
+        """
+        Returns the BM25 score of every document for the query tokens.
+        """
+        query_terms = [term for term in dict.fromkeys(query) if term in self.idf]
+        scores = []
+        for frequencies, length in zip(self.term_frequencies, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            score = 0.0
+            for term in query_terms:
+                frequency = frequencies.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+
+def rank_har_urls(har_urls: Sequence[Tuple[str, str, str, str]], prompt: str, top_k: int) -> List[int]:
+    """
+    Returns the indices of the `top_k` HAR URLs most relevant to the prompt, in capture order.
+    All indices are returned when nothing in the prompt matches any URL, since the ranking then
+    carries no information.
+    """
+    if len(har_urls) <= top_k:
+        return list(range(len(har_urls)))
+
+    scores = BM25Index([har_url_tokens(har_url) for har_url in har_urls]).scores(tokenize(prompt))
+    if not any(scores):
+        return list(range(len(har_urls)))
+
+    # Stable: ties keep capture order
+    ranked = sorted(range(len(har_urls)), key=lambda i: -scores[i])
+    return sorted(ranked[:top_k])
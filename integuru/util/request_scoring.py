@@ -0,0 +1,167 @@
+import math
+import re
+from collections import Counter
+from collections.abc import Mapping
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from integuru.models.request import Request, is_common_header
+from integuru.util.provenance import iter_json_values
+
+# Candidate values: runs of URL-safe characters long enough to be an identifier
+VALUE_RE = re.compile(r"[A-Za-z0-9_\-.~+/=%]{8,}")
+
+MIN_HIGH_ENTROPY_LENGTH = 12
+MIN_HIGH_ENTROPY_BITS = 3.0
+
+# Score weights; lower scores are simpler requests
+HEADER_WEIGHT = 1.0
+PARAMETER_WEIGHT = 1.0
+UNRESOLVED_TOKEN_WEIGHT = 3.0
+COOKIE_TOKEN_WEIGHT = 0.5
+BODY_WEIGHT = 0.5
+MIME_TYPE_PENALTIES = (
+    ("json", 0.0),
+    ("text/plain", 1.0),
+    ("xml", 1.0),
+    ("text/html", 3.0),
+    ("javascript", 4.0),
+)
+OTHER_MIME_TYPE_PENALTY = 2.0
+
+# Candidates scoring within this margin of the best are a tie the LLM is asked to break
+TIE_MARGIN = 0.5
+
+
+def shannon_entropy(value: str) -> float:
+    """
+    Bits of entropy per character of a string.
+    """
+    if not value:
+        return 0.0
+    length = len(value)
+    return -sum(count / length * math.log2(count / length) for count in Counter(value).values())
+
+
+def is_high_entropy(value: str) -> bool:
+    """
+    Whether a value looks like a generated token or identifier rather than a word.
+    """
+    return (
+        len(value) >= MIN_HIGH_ENTROPY_LENGTH
+        and shannon_entropy(value) >= MIN_HIGH_ENTROPY_BITS
+        and any(c.isdigit() for c in value)
+    )
+
+
+def iter_request_values(request: Request) -> Iterator[str]:
+    """
+    Yields the values a request sends: URL path segments, query parameters,
+    non-common header values and body values.
+    """
+    for segment in urlsplit(request.url).path.split("/"):
+        if segment:
+            yield segment
+    query_params = request.query_params or dict(parse_qsl(urlsplit(request.url).query))
+    yield from query_params.values()
+    for name, value in request.headers.items():
+        if not is_common_header(name):
+            yield value
+    if isinstance(request.body, (dict, list)):
+        for _, value in iter_json_values(request.body):
+            yield value
+    elif isinstance(request.body, str):
+        yield request.body
+
+
+def request_tokens(request: Request) -> List[str]:
+    """
+    Returns the high-entropy tokens of a request, each once, in order of appearance.
+    """
+    tokens = []
+    for value in iter_request_values(request):
+        for match in VALUE_RE.findall(value):
+            # "Bearer <token>" style values are split by the pattern already; strip padding and trailing dots
+            token = match.strip(".=%")
+            if is_high_entropy(token):
+                tokens.append(token)
+    return list(dict.fromkeys(tokens))
+
+
+def mime_type_penalty(response_type: str) -> float:
+    response_type = (response_type or "").lower()
+    for fragment, penalty in MIME_TYPE_PENALTIES:
+        if fragment in response_type:
+            return penalty
+    return OTHER_MIME_TYPE_PENALTY
+
+
+def body_size(request: Request) -> int:
+    if request.body is None:
+        return 0
+    if isinstance(request.body, str):
+        return len(request.body)
+    return len(str(request.body))
+
+
+def dependency_score(request: Request, response_type: str = "", cookie_values: Iterable[str] = ()) -> float:
+    """
+    Scores how many dependencies a request has; lower is simpler. Counts its non-common headers and
+    parameters, its high-entropy tokens (cheaper when a cookie provides them), the size of its body
+    and how hard its response type is to parse.
+    """
+    cookie_values = cookie_values if isinstance(cookie_values, (set, frozenset)) else set(cookie_values)
+    headers = sum(1 for name in request.headers if not is_common_header(name))
+    parameters = len(request.query_params or {})
+    if isinstance(request.body, dict):
+        parameters += len(request.body)
+
+    score = headers * HEADER_WEIGHT + parameters * PARAMETER_WEIGHT
+    for token in request_tokens(request):
+        resolvable = token in cookie_values or any(token in value for value in cookie_values)
+        score += COOKIE_TOKEN_WEIGHT if resolvable else UNRESOLVED_TOKEN_WEIGHT
+    score += BODY_WEIGHT * math.log2(1 + body_size(request))
+    score += mime_type_penalty(response_type)
+    return score
+
+
+def rank_requests(
+    requests: Sequence[Request], req_to_res_map: Mapping, cookie_values: Iterable[str] = ()
+) -> List[Tuple[float, int]]:
+    """
+    Returns (score, index) for every request, simplest first; ties keep the input order.
+    """
+    cookie_values = set(cookie_values)
+    scores = []
+    for i, request in enumerate(requests):
+        response = req_to_res_map.get(request) or {}
+        scores.append((dependency_score(request, response.get("type", ""), cookie_values), i))
+    return sorted(scores)
+
+
+def simplest_candidates(
+    requests: Sequence[Request],
+    req_to_res_map: Mapping,
+    cookie_values: Iterable[str] = (),
+    tie_margin: float = TIE_MARGIN,
+    max_candidates: Optional[int] = None,
+) -> List[Request]:
+    """
+    Returns the requests tied for the simplest score, best first. One request means no tie-break is needed.
+    """
+    ranked = rank_requests(requests, req_to_res_map, cookie_values)
+    best = ranked[0][0]
+    tied = [requests[i] for score, i in ranked if score - best <= tie_margin]
+    return tied[:max_candidates] if max_candidates else tied
+
+
+def cookie_values_of(cookie_dict: Mapping) -> Set[str]:
+    """
+    The values of a cookie dict as parsed by parse_cookie_file_to_dict.
+    """
+    values = set()
+    for cookie in cookie_dict.values():
+        value = cookie.get("value", "") if isinstance(cookie, Mapping) else cookie
+        if value:
+            values.add(str(value))
+    return values
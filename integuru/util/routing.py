@@ -0,0 +1,157 @@
+import tomllib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from integuru.util.usage import STAGES
+
+# API answers meaning a model will never work with this key: no access, or no such model
+UNAVAILABLE_STATUS_CODES = frozenset({403, 404})
+
+
+@dataclass(frozen=True)
+class StageRoute:
+    """
+    Models of one agent stage, tried in order, and the cap on the completion tokens of each call.
+    The default model always ends the chain.
+    """
+
+    models: Tuple[str, ...] = ()
+    max_tokens: Optional[int] = None
+
+
+# Code generation prefers a reasoning model; every other stage uses the default model
+DEFAULT_ROUTES: Dict[str, StageRoute] = {
+    "generate_code": StageRoute(("o1-preview",)),
+    "aggregate_functions": StageRoute(("o1-preview",)),
+}
+
+
+def model_chain(route: StageRoute, default_model: str) -> List[str]:
+    return list(dict.fromkeys((*route.models, default_model)))
+
+
+def merge_routes(*route_maps: Mapping[str, StageRoute]) -> Dict[str, StageRoute]:
+    """
+    Merges route maps field by field, later maps overriding the models or token cap they set.
+    """
+    merged: Dict[str, StageRoute] = {}
+    for route_map in route_maps:
+        for stage, route in route_map.items():
+            current = merged.get(stage, StageRoute())
+            merged[stage] = StageRoute(
+                route.models or current.models,
+                route.max_tokens if route.max_tokens is not None else current.max_tokens,
+            )
+    return merged
+
+
+def parse_route(stage: str, table: Mapping[str, Any]) -> StageRoute:
+    """
+    Parses a `[routing.<stage>]` table: `model`, an optional `fallback` list and an optional `max_tokens`.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage '{stage}' in the routing config, expected one of {', '.join(STAGES)}")
+    unknown = set(table) - {"model", "fallback", "max_tokens"}
+    if unknown:
+        raise ValueError(f"Unknown keys {sorted(unknown)} for stage '{stage}' in the routing config")
+
+    model = table.get("model")
+    fallback = table.get("fallback", [])
+    if model is not None and not isinstance(model, str):
+        raise ValueError(f"routing.{stage}.model must be a string")
+    if not isinstance(fallback, list) or not all(isinstance(name, str) for name in fallback):
+        raise ValueError(f"routing.{stage}.fallback must be a list of strings")
+    max_tokens = table.get("max_tokens")
+    if max_tokens is not None and (not isinstance(max_tokens, int) or max_tokens <= 0):
+        raise ValueError(f"routing.{stage}.max_tokens must be a positive integer")
+
+    models = ((model,) if model else ()) + tuple(fallback)
+    return StageRoute(models, max_tokens)
+
+
+def load_routing(path: str) -> Dict[str, StageRoute]:
+    """
+    Reads the `[routing]` section of a TOML file, one table per stage:
+
+        [routing.end_url]
+        model = "gpt-4o-mini"
+        fallback = ["gpt-4o"]
+        max_tokens = 256
+    """
+    with open(path, "rb") as f:
+        section = tomllib.load(f).get("routing", {})
+    return {stage: parse_route(stage, table) for stage, table in section.items()}
+
+
+def parse_stage_models(stage_models: Sequence[Tuple[str, str]]) -> Dict[str, StageRoute]:
+    """
+    Routes from (stage, comma-separated model chain) pairs given on the command line.
+    """
+    return {stage: StageRoute(tuple(name.strip() for name in models.split(",") if name.strip())) for stage, models in stage_models}
+
+
+class NoFallbackError(Exception):
+    """
+    Base of the errors no other model of a chain can fix, raised as is instead of falling back.
+    """
+
+
+def is_unavailable(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) in UNAVAILABLE_STATUS_CODES
+
+
+class RoutedChatModel:
+    """
+    Sends a stage's calls to the first model of its chain, falling back to the next one when a call
+    still fails after the client's own retries. Models the API refuses outright are reported to
+    `on_unavailable`, so later calls skip them. A NoFallbackError (e.g. a replayed run's missing
+    recording) fails the call straight away.
+    """
+
+    def __init__(
+        self,
+        stage: Optional[str],
+        clients: Sequence[Tuple[str, Any]],
+        max_tokens: Optional[int] = None,
+        on_unavailable: Callable[[str], None] = lambda model: None,
+    ):
+        self.stage = stage
+        self.clients = list(clients)
+        self.max_tokens = max_tokens
+        self.on_unavailable = on_unavailable
+
+    @property
+    def model_name(self) -> str:
+        return self.clients[0][0]
+
+    def _invoke_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.max_tokens is None or "max_completion_tokens" in kwargs:
+            return kwargs
+        return {**kwargs, "max_completion_tokens": self.max_tokens}
+
+    def _fall_back(self, model: str, next_model: str, error: Exception) -> None:
+        if is_unavailable(error):
+            self.on_unavailable(model)
+        print(f"{model} failed for stage '{self.stage}' ({type(error).__name__}), falling back to {next_model}", flush=True)
+
+    def invoke(self, prompt: Any, **kwargs) -> Any:
+        kwargs = self._invoke_kwargs(kwargs)
+        for (model, client), (next_model, _) in zip(self.clients, self.clients[1:]):
+            try:
+                return client.invoke(prompt, **kwargs)
+            except NoFallbackError:
+                raise
+            except Exception as e:
+                self._fall_back(model, next_model, e)
+        return self.clients[-1][1].invoke(prompt, **kwargs)
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> Any:
+        kwargs = self._invoke_kwargs(kwargs)
+        for (model, client), (next_model, _) in zip(self.clients, self.clients[1:]):
+            try:
+                return await client.ainvoke(prompt, **kwargs)
+            except NoFallbackError:
+                raise
+            except Exception as e:
+                self._fall_back(model, next_model, e)
+        return await self.clients[-1][1].ainvoke(prompt, **kwargs)
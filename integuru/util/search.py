@@ -0,0 +1,185 @@
+import multiprocessing
+import weakref
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from integuru.models.request import Request
+from integuru.util.body_store import BodyStore
+
+try:
+    import ahocorasick
+except ImportError:  # a dependency, but a C extension: keep working where it failed to build
+    ahocorasick = None
+
+
+def _match_automaton(store: BodyStore, starts: List[int], ends: List[int], patterns: Set[str]) -> Dict[str, Set[int]]:
+    # One pass over every document reports all (overlapping) occurrences of all patterns
+    hits: Dict[str, Set[int]] = {pattern: set() for pattern in patterns}
+    automaton = ahocorasick.Automaton()
+    for pattern in patterns:
+        automaton.add_word(pattern, pattern)
+    automaton.make_automaton()
+
+    for doc_index, (start, end) in enumerate(zip(starts, ends)):
+        if start == end:
+            continue
+        for _, pattern in automaton.iter(store.read(start, end - start)):
+            hits[pattern].add(doc_index)
+    return hits
+
+
+def _match_mmap(store: BodyStore, starts: List[int], ends: List[int], patterns: Set[str]) -> Dict[str, Set[int]]:
+    # Without the automaton, scan the mapped corpus once per pattern at C speed, no decoding
+    hits: Dict[str, Set[int]] = {pattern: set() for pattern in patterns}
+    corpus_start, corpus_end = starts[0], ends[-1]
+    for pattern in patterns:
+        needle = pattern.encode("utf-8", "surrogatepass")
+        position = store.find(needle, corpus_start, corpus_end)
+        while position != -1:
+            doc_index = bisect_right(starts, position) - 1
+            doc_end = ends[doc_index]
+            if position + len(needle) <= doc_end:
+                hits[pattern].add(doc_index)
+                # The document is a hit, skip the rest of it
+                next_start = doc_end
+            else:
+                # Match straddles two documents
+                next_start = position + 1
+            position = store.find(needle, next_start, corpus_end)
+    return hits
+
+
+def match_documents(store: BodyStore, starts: List[int], ends: List[int], patterns: Set[str]) -> Dict[str, Set[int]]:
+    """
+    Returns, for each lowercased pattern, the indices (into starts/ends) of the documents containing it.
+    """
+    if not patterns or not starts:
+        return {pattern: set() for pattern in patterns}
+    if ahocorasick is not None:
+        return _match_automaton(store, starts, ends, patterns)
+    return _match_mmap(store, starts, ends, patterns)
+
+
+# Read-only stores opened by a worker process, by corpus path
+_worker_stores: Dict[str, BodyStore] = {}
+
+
+def _match_shard(path: str, starts: List[int], ends: List[int], patterns: Set[str]) -> Dict[str, List[int]]:
+    """
+    Worker entry point: maps the corpus file itself, so no document is ever pickled.
+    """
+    store = _worker_stores.get(path)
+    if store is None:
+        store = _worker_stores[path] = BodyStore(path)
+    return {pattern: sorted(doc_indices) for pattern, doc_indices in match_documents(store, starts, ends, patterns).items()}
+
+
+class _LowercaseCorpus:
+    """
+    Lowercased documents stored back to back in a memory-mapped BodyStore.
+    """
+
+    def __init__(self):
+        self.store = BodyStore()
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    def append(self, text: str) -> None:
+        offset, length = self.store.append(text.lower())
+        self.starts.append(offset)
+        self.ends.append(offset + length)
+
+    def shard_bounds(self, shards: int) -> List[int]:
+        """
+        Splits the documents into at most `shards` contiguous ranges of roughly equal byte size.
+        Returns the boundaries as document indices, starting with 0 and ending with the document count.
+        """
+        total = self.ends[-1] if self.ends else 0
+        bounds = [0]
+        for shard in range(1, shards):
+            doc_index = bisect_right(self.ends, total * shard // shards)
+            if bounds[-1] < doc_index < len(self.ends):
+                bounds.append(doc_index)
+        bounds.append(len(self.ends))
+        return bounds
+
+    def match(self, patterns: Set[str], executor: Optional[ProcessPoolExecutor] = None, shards: int = 1) -> Dict[str, Set[int]]:
+        """
+        Returns, for each lowercased pattern, the indices of the documents containing it.
+        With an executor, the corpus is split into byte-balanced shards searched by worker processes
+        and the per-shard results are merged back in document order.
+        """
+        if executor is None or shards <= 1 or not patterns or len(self.starts) < 2:
+            return match_documents(self.store, self.starts, self.ends, patterns)
+
+        self.store.flush()
+        bounds = self.shard_bounds(shards)
+        futures = [
+            (first, executor.submit(_match_shard, self.store.path, self.starts[first:last], self.ends[first:last], patterns))
+            for first, last in zip(bounds, bounds[1:])
+        ]
+
+        hits: Dict[str, Set[int]] = {pattern: set() for pattern in patterns}
+        for first, future in futures:
+            for pattern, doc_indices in future.result().items():
+                hits[pattern].update(first + doc_index for doc_index in doc_indices)
+        return hits
+
+
+class ContentSearcher:
+    """
+    Finds the requests whose response contains a search string but whose own cURL does not,
+    matching case-insensitively like the original per-request scan.
+
+    Response texts and cURL strings are lowercased once into memory-mapped corpora, and all
+    search strings are matched together in a single Aho-Corasick pass (pyahocorasick), or with
+    one mmap scan per search string where the extension is unavailable. With workers > 1 the response
+    corpus is searched by a process pool; workers map the corpus file instead of receiving bodies.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Request, Mapping]], workers: int = 1):
+        # One document per HAR entry: identical requests may have received different responses
+        self.requests: List[Request] = []
+        self.workers = workers
+        self._responses = _LowercaseCorpus()
+        self._curls = _LowercaseCorpus()
+        for request, response in entries:
+            self.requests.append(request)
+            self._responses.append(response["text"])
+            self._curls.append(str(request))
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if workers > 1:
+            # spawn: the parent may be running threads (event loop executors), which fork does not survive
+            self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            weakref.finalize(self, self._executor.shutdown, wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        """
+        Shuts down the worker processes, if any.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def find(self, search_strings: Iterable[str]) -> Dict[str, List[Request]]:
+        """
+        Returns, for each search string, the matching requests in index order, each request once.
+        """
+        search_strings = list(dict.fromkeys(search_strings))
+        # An empty string is in every cURL, so it never matches
+        patterns = {search_string.lower() for search_string in search_strings} - {""}
+        in_responses = self._responses.match(patterns, self._executor, self.workers)
+        # cURLs are short, a worker round trip would cost more than the scan
+        in_curls = self._curls.match(patterns)
+
+        results = {}
+        for search_string in search_strings:
+            pattern = search_string.lower()
+            if not pattern:
+                results[search_string] = []
+                continue
+            doc_indices = sorted(in_responses[pattern] - in_curls[pattern])
+            results[search_string] = list(dict.fromkeys(self.requests[i] for i in doc_indices))
+        return results
@@ -0,0 +1,40 @@
+from typing import List, Sequence
+
+# Rough characters per token of the OpenAI tokenizers on English text and cURL commands
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token count estimate, good enough for budgeting prompts without a tokenizer.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """
+    Cuts text to max_chars characters, marking the cut.
+    """
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...[truncated {len(text) - max_chars} chars]"
+
+
+def pack_by_token_budget(texts: Sequence[str], budget: int) -> List[List[int]]:
+    """
+    Groups the indices of `texts` into consecutive batches whose estimated size stays within `budget` tokens.
+    A text larger than the budget gets a batch of its own.
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and batch_tokens + tokens > budget:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
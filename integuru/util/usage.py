@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# USD per million tokens: (input, cached input, output). Matched by model name prefix, longest first.
+PRICING: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "o1-preview": (15.00, 7.50, 60.00),
+    "o1-mini": (1.10, 0.55, 4.40),
+    "o1": (15.00, 7.50, 60.00),
+    "o3-mini": (1.10, 0.55, 4.40),
+}
+
+# Agent stages making LLM calls
+STAGES = (
+    "end_url",
+    "input_variables",
+    "dynamic_parts",
+    "dynamic_parts_batch",
+    "simplest_request",
+    "generate_code",
+    "aggregate_functions",
+)
+
+# Agent stage and DAG node an LLM call is made for; set by the caller around the call
+current_stage: ContextVar[Optional[str]] = ContextVar("integuru_llm_stage", default=None)
+current_node: ContextVar[Optional[int]] = ContextVar("integuru_llm_node", default=None)
+# Recorder of the analysis running in the current context, used by models built without their own
+current_recorder: ContextVar[Optional["UsageRecorder"]] = ContextVar("integuru_usage_recorder", default=None)
+
+
+@contextmanager
+def usage_scope(stage: Optional[str], node_id: Optional[int] = None) -> Iterator[None]:
+    """
+    Attributes the LLM calls made inside the block to an agent stage and DAG node.
+    Context variables follow asyncio tasks, so concurrent calls keep their own attribution.
+    """
+    stage_token = current_stage.set(stage)
+    node_token = current_node.set(node_id)
+    try:
+        yield
+    finally:
+        current_node.reset(node_token)
+        current_stage.reset(stage_token)
+
+
+def get_pricing(model: Optional[str]) -> Optional[Tuple[float, float, float]]:
+    if not model:
+        return None
+    for prefix in sorted(PRICING, key=len, reverse=True):
+        if model.startswith(prefix):
+            return PRICING[prefix]
+    return None
+
+
+def call_cost(model: Optional[str], prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> Optional[float]:
+    """
+    Returns the USD cost of a call, or None for a model missing from the pricing table.
+    """
+    pricing = get_pricing(model)
+    if pricing is None:
+        return None
+    input_price, cached_price, output_price = pricing
+    uncached_tokens = max(prompt_tokens - cached_tokens, 0)
+    return (uncached_tokens * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1e6
+
+
+def token_usage(message: Any) -> Tuple[int, int, int]:
+    """
+    Returns (prompt, completion, cached prompt) tokens reported with a chat model response.
+    """
+    usage_metadata = getattr(message, "usage_metadata", None)
+    if usage_metadata:
+        details = usage_metadata.get("input_token_details") or {}
+        return (
+            usage_metadata.get("input_tokens", 0),
+            usage_metadata.get("output_tokens", 0),
+            details.get("cache_read", 0) or 0,
+        )
+    # Responses rebuilt from the LLM cache only keep the raw OpenAI usage
+    raw_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    details = raw_usage.get("prompt_tokens_details") or {}
+    return (
+        raw_usage.get("prompt_tokens", 0),
+        raw_usage.get("completion_tokens", 0),
+        details.get("cached_tokens", 0) or 0,
+    )
+
+
+@dataclass
+class LLMCallRecord:
+    stage: Optional[str]
+    node_id: Optional[int]
+    model: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    latency_seconds: float
+    cost_usd: Optional[float]
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "latency_seconds": 0.0,
+        "cost_usd": 0.0,
+    }
+
+
+def _add_to_totals(totals: Dict[str, Any], record: LLMCallRecord) -> None:
+    totals["calls"] += 1
+    totals["errors"] += record.error is not None
+    totals["prompt_tokens"] += record.prompt_tokens
+    totals["completion_tokens"] += record.completion_tokens
+    totals["cached_tokens"] += record.cached_tokens
+    totals["latency_seconds"] += record.latency_seconds
+    totals["cost_usd"] += record.cost_usd or 0.0
+
+
+def cache_hit_rate(totals: Dict[str, Any]) -> float:
+    """
+    Returns the share of the prompt tokens served from the provider prompt cache.
+    """
+    return totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0
+
+
+def _with_hit_rate(totals: Dict[str, Any]) -> Dict[str, Any]:
+    return {**totals, "cache_hit_rate": cache_hit_rate(totals)}
+
+
+def _escape_label(value: Optional[str]) -> str:
+    return (value or "").replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class UsageRecorder:
+    """
+    Collects one record per LLM API call and aggregates them by stage, DAG node and model.
+    Safe to share between threads and asyncio tasks.
+    """
+
+    def __init__(self):
+        self.records: List[LLMCallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, record: LLMCallRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns the run totals and the totals per stage, node and model, each with its cache hit rate.
+        """
+        with self._lock:
+            records = list(self.records)
+
+        totals = _empty_totals()
+        groups: Dict[str, Dict[str, Dict[str, Any]]] = {"by_stage": {}, "by_node": {}, "by_model": {}}
+        for record in records:
+            _add_to_totals(totals, record)
+            for group, key in (
+                ("by_stage", record.stage),
+                ("by_node", record.node_id),
+                ("by_model", record.model),
+            ):
+                if key is not None:
+                    _add_to_totals(groups[group].setdefault(key, _empty_totals()), record)
+        return {
+            "totals": _with_hit_rate(totals),
+            **{group: {key: _with_hit_rate(value) for key, value in entries.items()} for group, entries in groups.items()},
+        }
+
+    def write_json(self, path: str) -> None:
+        with self._lock:
+            calls = [asdict(record) for record in self.records]
+        with open(path, "w") as f:
+            json.dump({**self.summary(), "calls": calls}, f, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Renders the totals and cache hit rate per stage and model in the Prometheus text exposition format.
+        A run without LLM calls renders no metric family, rather than families without samples.
+        """
+        with self._lock:
+            records = list(self.records)
+
+        by_stage_model: Dict[Tuple[Optional[str], Optional[str]], Dict[str, Any]] = {}
+        for record in records:
+            _add_to_totals(by_stage_model.setdefault((record.stage, record.model), _empty_totals()), record)
+
+        metrics = [
+            ("integuru_llm_calls_total", "calls", "LLM API calls"),
+            ("integuru_llm_errors_total", "errors", "LLM API calls that raised"),
+            ("integuru_llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens sent"),
+            ("integuru_llm_completion_tokens_total", "completion_tokens", "Completion tokens received"),
+            ("integuru_llm_cached_tokens_total", "cached_tokens", "Prompt tokens served from the provider prompt cache"),
+            ("integuru_llm_latency_seconds_total", "latency_seconds", "Time spent waiting for LLM responses"),
+            ("integuru_llm_cost_usd_total", "cost_usd", "Estimated LLM cost in USD"),
+        ]
+        gauges = [
+            ("integuru_llm_cache_hit_ratio", "cache_hit_rate", "Share of the prompt tokens served from the provider prompt cache"),
+        ]
+        series = sorted(
+            ((stage, model, _with_hit_rate(totals)) for (stage, model), totals in by_stage_model.items()),
+            key=lambda item: (item[0] or "", item[1] or ""),
+        )
+        if not series:
+            return ""
+        lines = []
+        for metric_type, metric_list in (("counter", metrics), ("gauge", gauges)):
+            for name, key, help_text in metric_list:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for stage, model, totals in series:
+                    lines.append(f'{name}{{stage="{_escape_label(stage)}",model="{_escape_label(model)}"}} {totals[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.to_prometheus())
+
+
+class UsageTrackingModel:
+    """
+    Wraps a chat model so every invoke/ainvoke is recorded with its token usage, latency,
+    model and the stage and node set by usage_scope. Without a recorder of its own, calls go to
+    the recorder in current_recorder, if any, so one wrapped model can serve concurrent analyses.
+    Every other attribute is delegated.
+    """
+
+    def __init__(self, model: Any, recorder: Optional[UsageRecorder] = None):
+        self.model = model
+        self.recorder = recorder
+
+    def _record(self, started: float, response: Any = None, error: Optional[BaseException] = None) -> None:
+        recorder = self.recorder or current_recorder.get()
+        if recorder is None:
+            return
+        latency = time.perf_counter() - started
+        prompt_tokens, completion_tokens, cached_tokens = token_usage(response) if response is not None else (0, 0, 0)
+        model = (getattr(response, "response_metadata", None) or {}).get("model_name") or getattr(self.model, "model_name", None)
+        if not isinstance(model, str):
+            model = None
+        recorder.record(
+            LLMCallRecord(
+                stage=current_stage.get(),
+                node_id=current_node.get(),
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cached_tokens=cached_tokens,
+                latency_seconds=latency,
+                cost_usd=call_cost(model, prompt_tokens, cached_tokens, completion_tokens),
+                error=None if error is None else type(error).__name__,
+                started_at=time.time() - latency,
+            )
+        )
+
+    def invoke(self, prompt: Any, **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            response = self.model.invoke(prompt, **kwargs)
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        self._record(started, response)
+        return response
+
+    async def ainvoke(self, prompt: Any, **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            response = await self.model.ainvoke(prompt, **kwargs)
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        self._record(started, response)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+def write_usage_report(recorder: UsageRecorder, json_path: str) -> str:
+    """
+    Writes the run's usage as JSON to json_path and in the Prometheus text format next to it (.prom).
+    Returns the Prometheus file path.
+    """
+    prometheus_path = os.path.splitext(json_path)[0] + ".prom"
+    recorder.write_json(json_path)
+    recorder.write_prometheus(prometheus_path)
+
+    totals = recorder.summary()["totals"]
+    print(
+        f"LLM usage: {totals['calls']} calls, {totals['prompt_tokens']} prompt tokens "
+        f"({totals['cached_tokens']} cached, {totals['cache_hit_rate']:.0%} hit rate), {totals['completion_tokens']} completion tokens, "
+        f"~${totals['cost_usd']:.4f}. Report saved to '{json_path}' and '{prometheus_path}'"
+    )
+    return prometheus_path
@@ -0,0 +1,43 @@
+import os
+import pickle
+import tempfile
+import unittest
+from integuru.util.body_store import BodyStore, LazyResponse, is_binary_mime_type
+
+class TestBodyStore(unittest.TestCase):
+
+    def test_lazy_response_round_trip(self):
+        store = BodyStore()
+        first = LazyResponse.from_text(store, '{"token": "é-123"}', "application/json")
+        second = LazyResponse.from_text(store, "<html>ok</html>", "text/html; charset=utf-8")
+
+        self.assertEqual(first["text"], '{"token": "é-123"}')
+        self.assertEqual(second.get("text"), "<html>ok</html>")
+        self.assertEqual(second["type"], "text/html; charset=utf-8")
+        self.assertEqual(dict(first), {"text": '{"token": "é-123"}', "type": "application/json"})
+
+    def test_binary_bodies_are_metadata_only(self):
+        store = BodyStore()
+        image = LazyResponse.from_text(store, "iVBORw0KGgo=", "image/png")
+        self.assertEqual(image["text"], "")
+        self.assertEqual(image.size, 12)
+        self.assertEqual(store.size, 0)
+        self.assertTrue(is_binary_mime_type("application/pdf"))
+        self.assertFalse(is_binary_mime_type("application/json"))
+
+    def test_persisted_store_survives_pickling(self):
+        store = BodyStore()
+        response = LazyResponse.from_text(store, "body text", "text/plain")
+        temp_path = store.path
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(cache_dir, "bodies")
+            store.persist(path)
+            self.assertFalse(os.path.exists(temp_path))
+
+            restored = pickle.loads(pickle.dumps(response))
+            self.assertEqual(restored["text"], "body text")
+            self.assertEqual(restored._store.path, path)
+            del restored, response, store
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import unittest
+from contextlib import closing
+from unittest.mock import patch
+
+import integuru.main
+from integuru.main import call_agent
+from integuru.util import checkpoint
+from integuru.util.LLM import llm
+from integuru.util.checkpoint import FAILED, FINISHED, CheckpointStore, RunNotFoundError
+from integuru.util.llm_backends import scripted_backend
+from integuru.util.llm_pool import chat_openai
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+ACCOUNTS_URL = "https://example.com/api/accounts?userId=user-98765"
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.temp_dir.name, "checkpoints.sqlite")
+        self.calls = []
+        self.fail_session = True
+
+        def dynamic_parts(prompt, kwargs):
+            if "accounts" in prompt:
+                return {"dynamic_parts": ["a1b2c3d4e5f6a7b8c9d0"]}
+            if self.fail_session:
+                self.fail_session = False
+                raise RuntimeError("the API stopped answering")
+            return {"dynamic_parts": []}
+
+        def end_url(prompt, kwargs):
+            self.calls.append("end_url")
+            return {"url": ACCOUNTS_URL}
+
+        llm.set_backend(scripted_backend({"end_url": end_url, "dynamic_parts": dynamic_parts, "simplest_request": {"index": 0}}))
+
+    def tearDown(self):
+        llm.set_backend(chat_openai)
+        self.temp_dir.cleanup()
+
+    def _run(self, resume=None, usage_report=None):
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            asyncio.run(
+                call_agent(
+                    "gpt-4o",
+                    "Get the accounts",
+                    os.path.join(DATA_DIR, "test.har"),
+                    os.path.join(DATA_DIR, "test_cookies.json"),
+                    # Every request goes to the LLM, so the session request's call can fail
+                    local_dynamic_detection=False,
+                    usage_report=usage_report,
+                    checkpoint_path=self.checkpoint_path,
+                    resume=resume,
+                )
+            )
+        finally:
+            os.chdir(cwd)
+        dag_manager = integuru.main.agent.dag_manager
+        return sorted((node.node_type, getattr(node.key, "url", None)) for node in dag_manager.nodes)
+
+    def test_resumes_a_failed_run_after_its_last_step(self):
+        with self.assertRaises(RuntimeError):
+            self._run()
+
+        store = CheckpointStore(self.checkpoint_path)
+        with closing(store._connect()) as conn:
+            [(run_id,)] = conn.execute("SELECT run_id FROM runs").fetchall()
+        checkpoint = store.load(run_id)
+        self.assertEqual(checkpoint.status, FAILED)
+        self.assertEqual((checkpoint.step, checkpoint.node), (3, "processFrontier"))
+        self.assertEqual(len(checkpoint.snapshot["dag_manager"].nodes), 2)
+
+        nodes = self._run(resume=run_id)
+
+        self.assertEqual(nodes, [("curl", "https://example.com/api/session"), ("master_curl", ACCOUNTS_URL)])
+        # The action URL was not asked for again
+        self.assertEqual(self.calls, ["end_url"])
+        finished = store.load(run_id)
+        self.assertEqual(finished.status, FINISHED)
+        # Nothing resumes a finished run, so its checkpoint is gone
+        self.assertIsNone(finished.snapshot)
+
+    def test_unwritable_usage_report_keeps_the_run_error(self):
+        usage_report = os.path.join(self.temp_dir.name, "missing", "usage_report.json")
+        with self.assertRaisesRegex(RuntimeError, "the API stopped answering"):
+            self._run(usage_report=usage_report)
+
+    def test_keeps_the_most_recently_updated_runs(self):
+        store = CheckpointStore(self.checkpoint_path, max_runs=2)
+        with patch.object(checkpoint.time, "time", side_effect=itertools.count(1000.0)):
+            first = store.create_run({})
+            second = store.create_run({})
+            # Checkpointing keeps a run recent
+            store.save(first, 1, "IntegrationAgent", {}, {})
+            third = store.create_run({})
+
+        with self.assertRaises(RunNotFoundError):
+            store.load(second)
+        self.assertEqual(store.load(first).step, 1)
+
+        self.assertEqual(store.prune(0, vacuum=True), [third, first])
+        with self.assertRaises(RunNotFoundError):
+            store.load(first)
+
+    def test_unknown_run(self):
+        with self.assertRaises(RunNotFoundError):
+            CheckpointStore(self.checkpoint_path).load("missing")
+
+
+if __name__ == '__main__':
+    unittest.main()
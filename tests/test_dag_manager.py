@@ -0,0 +1,63 @@
+import random
+import unittest
+
+import networkx as nx
+
+from integuru.models.DAGManager import DAGManager
+
+
+class TestDAGManager(unittest.TestCase):
+
+    def _add_nodes(self, dag_manager, count):
+        return [dag_manager.add_node(node_type="cURL") for _ in range(count)]
+
+    def test_keeps_a_topological_order_of_random_edges(self):
+        rng = random.Random(7)
+        dag_manager = DAGManager()
+        nodes = self._add_nodes(dag_manager, 40)
+        for _ in range(120):
+            from_node_id, to_node_id = rng.sample(nodes, 2)
+            if not nx.has_path(dag_manager.to_networkx(), to_node_id, from_node_id):
+                dag_manager.add_edge(from_node_id, to_node_id)
+
+        self.assertIsNone(dag_manager.detect_cycles())
+        for from_node_id, to_node_id in dag_manager.edges():
+            self.assertLess(dag_manager._order[from_node_id], dag_manager._order[to_node_id])
+
+    def test_flags_the_edge_closing_a_cycle(self):
+        dag_manager = DAGManager()
+        a, b, c, d = self._add_nodes(dag_manager, 4)
+        dag_manager.add_edge(c, d)
+        dag_manager.add_edge(b, c)
+        dag_manager.add_edge(a, b)
+        self.assertIsNone(dag_manager.detect_cycles())
+
+        dag_manager.add_edge(c, a)
+        cycle = dag_manager.detect_cycles()
+        self.assertEqual(cycle, [(c, a, "forward"), (a, b, "forward"), (b, c, "forward")])
+        # The edge is kept, as nx.find_cycle would see it
+        self.assertEqual(dag_manager.successors(c), [d, a])
+        self.assertEqual(len(nx.find_cycle(dag_manager.to_networkx())), 3)
+
+    def test_request_node_content_refers_to_the_ingestion_index(self):
+        response = {"type": "application/json", "text": "{}"}
+        dag_manager = DAGManager({"request": response})
+        request_node_id = dag_manager.add_node(node_type="curl", key="request", dynamic_parts=["token"])
+        cookie_node_id = dag_manager.add_node(node_type="cookie", key="session", value="token")
+        dag_manager.add_edge(request_node_id, cookie_node_id)
+
+        graph = dag_manager.to_networkx()
+        self.assertIs(graph.nodes[request_node_id]["content"]["value"], response)
+        self.assertEqual(graph.nodes[cookie_node_id]["content"], {"key": "session", "value": "token"})
+        self.assertEqual(graph.nodes[request_node_id]["dynamic_parts"], ["token"])
+        self.assertEqual(list(graph.edges), [(request_node_id, cookie_node_id)])
+
+    def test_self_loop_is_a_cycle(self):
+        dag_manager = DAGManager()
+        (a,) = self._add_nodes(dag_manager, 1)
+        dag_manager.add_edge(a, a)
+        self.assertEqual(dag_manager.detect_cycles(), [(a, a, "forward")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from integuru.util import har_cache
+from integuru.util.har_processing import HarIndex
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+HAR_PATH = os.path.join(DATA_DIR, "test.har")
+
+class TestHarCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        # The signing key lives outside the cache directory
+        self.key_dir = tempfile.mkdtemp()
+        key_path_patch = patch.object(har_cache, "DEFAULT_KEY_PATH", os.path.join(self.key_dir, "har_cache.key"))
+        key_path_patch.start()
+        self.addCleanup(key_path_patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.key_dir)
+
+    def test_warm_load_skips_parsing(self):
+        cold = har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+        self.assertTrue(os.path.exists(har_cache.get_cache_path(HAR_PATH, self.cache_dir)))
+
+        with patch.object(HarIndex, "from_har_file") as mock_parse:
+            warm = har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+            mock_parse.assert_not_called()
+
+        self.assertEqual(warm.har_urls, cold.har_urls)
+        self.assertEqual(list(warm.url_to_req_res_map), list(cold.url_to_req_res_map))
+        # Response bodies are served from the body file stored next to the entry
+        self.assertEqual(warm.bodies.path, har_cache.get_bodies_path(har_cache.get_cache_path(HAR_PATH, self.cache_dir)))
+        self.assertEqual(
+            [response["text"] for response in warm.req_to_res_map.values()],
+            [response["text"] for response in cold.req_to_res_map.values()],
+        )
+
+    def test_key_changes_with_content_and_parser_version(self):
+        copy_path = os.path.join(self.cache_dir, "copy.har")
+        shutil.copy(HAR_PATH, copy_path)
+        original_key = har_cache.get_cache_path(copy_path, self.cache_dir)
+        self.assertEqual(original_key, har_cache.get_cache_path(HAR_PATH, self.cache_dir))
+
+        with patch.object(har_cache, "PARSER_VERSION", har_cache.PARSER_VERSION + 1):
+            self.assertNotEqual(har_cache.get_cache_path(copy_path, self.cache_dir), original_key)
+
+        with open(copy_path, "a") as file:
+            file.write("\n")
+        self.assertNotEqual(har_cache.get_cache_path(copy_path, self.cache_dir), original_key)
+
+    def test_evicts_least_recently_used(self):
+        for i, name in enumerate(["a", "b", "c"]):
+            path = os.path.join(self.cache_dir, name + har_cache.CACHE_SUFFIX)
+            with open(path, "wb") as file:
+                file.write(b"x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+
+        evicted = har_cache.evict_cache(self.cache_dir, max_bytes=150)
+        self.assertEqual([os.path.basename(path) for path in evicted], ["a.harindex", "b.harindex"])
+        self.assertEqual(os.listdir(self.cache_dir), ["c.harindex"])
+
+    def test_entry_missing_its_bodies_is_rebuilt(self):
+        har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+        cache_path = har_cache.get_cache_path(HAR_PATH, self.cache_dir)
+        os.unlink(har_cache.get_bodies_path(cache_path))
+
+        with patch.object(HarIndex, "from_har_file", wraps=HarIndex.from_har_file) as mock_parse:
+            index = har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+            mock_parse.assert_called_once()
+        self.assertTrue(os.path.exists(har_cache.get_bodies_path(cache_path)))
+        self.assertTrue(all(response["text"] is not None for response in index.req_to_res_map.values()))
+
+    def test_entry_evicted_while_read_is_rebuilt(self):
+        har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+        loads = har_cache.pickle.loads
+
+        def load_then_evict(data):
+            # Another process evicts the entry right after this one read it
+            index = loads(data)
+            har_cache.evict_cache(self.cache_dir, max_bytes=0)
+            return index
+
+        with patch.object(har_cache.pickle, "loads", side_effect=load_then_evict), \
+                patch.object(HarIndex, "from_har_file", wraps=HarIndex.from_har_file) as mock_parse:
+            har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+            mock_parse.assert_called_once()
+
+    def test_entry_not_signed_with_the_key_is_never_unpickled(self):
+        har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+        cache_path = har_cache.get_cache_path(HAR_PATH, self.cache_dir)
+        self.assertEqual(os.stat(har_cache.DEFAULT_KEY_PATH).st_mode & 0o777, 0o600)
+
+        # Another user of a shared cache directory swaps in their own pickle, signed with another key
+        with open(cache_path, "rb") as file:
+            data = file.read()[har_cache.DIGEST_BYTES:]
+        with open(cache_path, "wb") as file:
+            file.write(har_cache.hmac.new(b"another key", data, "sha256").digest() + data)
+
+        with patch.object(har_cache.pickle, "loads") as mock_loads, \
+                patch.object(HarIndex, "from_har_file", wraps=HarIndex.from_har_file) as mock_parse:
+            har_cache.load_har_index(HAR_PATH, cache_dir=self.cache_dir)
+            mock_loads.assert_not_called()
+            mock_parse.assert_called_once()
+        # The rebuilt entry is signed again
+        self.assertIsNotNone(har_cache._read_index(cache_path))
+
+    def test_build_har_cache_is_idempotent(self):
+        self.assertTrue(har_cache.build_har_cache(HAR_PATH, cache_dir=self.cache_dir))
+        self.assertFalse(har_cache.build_har_cache(HAR_PATH, cache_dir=self.cache_dir))
+        self.assertEqual(list(har_cache.iter_har_files(DATA_DIR)), [HAR_PATH])
+
+if __name__ == '__main__':
+    unittest.main()
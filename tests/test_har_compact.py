@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import unittest
+from integuru.util.har_compact import compact_har
+from integuru.util.har_processing import HarIndex
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+HAR_PATH = os.path.join(DATA_DIR, "test.har")
+
+class TestCompactHar(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(HAR_PATH, encoding="utf-8") as file:
+            har_data = json.load(file)
+        entries = har_data["log"]["entries"]
+        # A polling call repeated with a newer response, and a first-party call with a tracing header
+        repeated = json.loads(json.dumps(entries[1]))
+        repeated["response"]["content"]["text"] = '{"accounts": []}'
+        entries.append(repeated)
+        entries.append({
+            "request": {"method": "GET", "url": "https://example.com/api/profile",
+                        "headers": [{"name": "sentry-trace", "value": "abc-1"}]},
+            "response": {"content": {"mimeType": "application/json", "text": '{"name": "me"}'}},
+        })
+        self.input_path = os.path.join(self.temp_dir.name, "input.har")
+        self.output_path = os.path.join(self.temp_dir.name, "output.har")
+        with open(self.input_path, "w", encoding="utf-8") as file:
+            json.dump(har_data, file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_compaction(self):
+        stats = compact_har(self.input_path, self.output_path, max_body_size=16)
+        self.assertEqual(
+            (stats.entries_read, stats.entries_written, stats.excluded, stats.duplicates, stats.bodies_stripped),
+            (8, 5, 2, 1, 1),
+        )
+        self.assertLess(os.path.getsize(self.output_path), os.path.getsize(self.input_path))
+
+        compacted = HarIndex.from_har_file(self.output_path)
+        urls = [request.url for request in compacted.req_to_res_map]
+        self.assertEqual(urls, [
+            "https://example.com/api/session",
+            "https://example.com/api/accounts?userId=user-98765",
+            "https://example.com/api/bills",
+            "https://example.com/app.js",
+            "https://example.com/api/profile",
+        ])
+        accounts = compacted.url_to_req_res_map["https://example.com/api/accounts?userId=user-98765"]
+        # The last response of a duplicated request wins, as in HarIndex
+        self.assertEqual(accounts["response"]["text"], '{"accounts": []}')
+        self.assertEqual(compacted.url_to_req_res_map["https://example.com/api/bills"]["response"]["text"], "")
+
+    def test_compacted_index_matches_original(self):
+        compact_har(HAR_PATH, self.output_path)
+        original = HarIndex.from_har_file(HAR_PATH)
+        compacted = HarIndex.from_har_file(self.output_path)
+        # Previews of stripped binary bodies are empty
+        self.assertEqual(
+            [har_url[:3] for har_url in compacted.har_urls], [har_url[:3] for har_url in original.har_urls]
+        )
+        for request, response in compacted.req_to_res_map.items():
+            self.assertEqual(response["text"], original.req_to_res_map[request]["text"])
+
+if __name__ == '__main__':
+    unittest.main()
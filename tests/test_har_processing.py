@@ -0,0 +1,107 @@
+import gzip
+import io
+import json
+import lzma
+import os
+import tempfile
+import unittest
+from integuru.util.har_processing import HarIndex, get_har_urls, iter_har_entries, open_har, parse_har_file
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+HAR_PATH = os.path.join(DATA_DIR, "test.har")
+
+class TestHarIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = HarIndex.from_har_file(HAR_PATH)
+
+    def test_maps_share_request_objects(self):
+        self.assertEqual(len(self.index.req_to_res_map), 6)
+        for url, req_res in self.index.url_to_req_res_map.items():
+            self.assertEqual(req_res["request"].url, url)
+            self.assertIs(self.index.req_to_res_map[req_res["request"]], req_res["response"])
+
+    def test_har_urls_exclude_extensions_and_keywords(self):
+        urls = [url for _, url, _, _ in self.index.har_urls]
+        self.assertNotIn("https://example.com/static/logo.png", urls)
+        self.assertNotIn("https://www.google-analytics.com/collect?v=1", urls)
+        self.assertIn("https://example.com/api/bills", urls)
+        method, _, response_format, preview = self.index.har_urls[0]
+        self.assertEqual((method, response_format), ("GET", "application/json"))
+        self.assertEqual(len(preview), 30)
+
+    def test_legacy_helpers_match_index(self):
+        self.assertEqual(get_har_urls(HAR_PATH), self.index.har_urls)
+        parsed = parse_har_file(HAR_PATH)
+        self.assertEqual(
+            [request.url for request in parsed],
+            [request.url for request in self.index.req_to_res_map],
+        )
+
+class TestStreamingParser(unittest.TestCase):
+
+    def test_streaming_entries_match_eager_parse(self):
+        with open(HAR_PATH, encoding="utf-8") as file:
+            expected = json.load(file)["log"]["entries"]
+        with open(HAR_PATH, encoding="utf-8") as file:
+            # A tiny chunk size forces values to straddle buffer boundaries
+            self.assertEqual(list(iter_har_entries(file, chunk_size=7)), expected)
+
+    def test_skips_other_keys_and_handles_empty_entries(self):
+        document = '{"meta": [1, 2.5, {"entries": [3]}], "log": {"version": "1.2", "entries": [], "pages": [10]}}'
+        self.assertEqual(list(iter_har_entries(io.StringIO(document), chunk_size=3)), [])
+
+    def test_truncated_document_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_har_entries(io.StringIO('{"log": {"entries": [{"request": {}}, {"req'), chunk_size=4))
+
+    def test_streaming_index_matches_eager_index(self):
+        eager = HarIndex.from_har_file(HAR_PATH)
+        streaming = HarIndex.from_har_file(HAR_PATH, streaming=True)
+        self.assertEqual(streaming.har_urls, eager.har_urls)
+        self.assertEqual(list(streaming.url_to_req_res_map), list(eager.url_to_req_res_map))
+
+class TestCompressedHar(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(HAR_PATH, "rb") as file:
+            self.raw = file.read()
+        self.expected = HarIndex.from_har_file(HAR_PATH)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assert_reads_compressed(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        for streaming in (False, True):
+            index = HarIndex.from_har_file(path, streaming=streaming)
+            self.assertEqual(index.har_urls, self.expected.har_urls)
+            self.assertEqual(list(index.req_to_res_map), list(self.expected.req_to_res_map))
+
+    def test_gzip(self):
+        self.assert_reads_compressed("capture.har.gz", gzip.compress(self.raw))
+
+    def test_xz(self):
+        self.assert_reads_compressed("capture.har.xz", lzma.compress(self.raw))
+
+    @unittest.skipIf(zstandard is None, "zstandard not installed")
+    def test_zstd(self):
+        self.assert_reads_compressed("capture.har.zst", zstandard.ZstdCompressor().compress(self.raw))
+
+    def test_detects_by_content_not_suffix(self):
+        path = os.path.join(self.temp_dir.name, "capture.har")
+        with open(path, "wb") as file:
+            file.write(gzip.compress(self.raw))
+        with open_har(path) as file:
+            self.assertEqual(json.load(file), json.loads(self.raw))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessage
+
+import integuru.main
+from integuru.main import call_agent
+from integuru.util.LLM import llm
+from integuru.util.llm_cache import LLMCache
+from integuru.util.llm_backends import (
+    Cassette,
+    CassetteMissError,
+    RecordingChatModel,
+    ScriptedChatModel,
+    recording_backend,
+    replay_backend,
+    scripted_backend,
+)
+from integuru.util.llm_pool import chat_openai
+from integuru.util.usage import usage_scope
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+ACCOUNTS_URL = "https://example.com/api/accounts?userId=user-98765"
+
+# Answers of a run finding the session request the accounts request depends on
+SCRIPT = {
+    "end_url": {"url": ACCOUNTS_URL},
+    "dynamic_parts": lambda prompt, kwargs: {"dynamic_parts": ["a1b2c3d4e5f6a7b8c9d0"] if "accounts" in prompt else []},
+    "simplest_request": {"index": 0},
+}
+
+
+class TestLLMBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cassette_path = os.path.join(self.temp_dir.name, "cassette.json")
+
+    def tearDown(self):
+        llm.set_backend(chat_openai)
+        self.temp_dir.cleanup()
+
+    def test_replays_by_stage_and_normalized_prompt(self):
+        cassette = Cassette(self.cassette_path)
+        cassette.record("end_url", "Pick  the URL\n  of the action", AIMessage(content="first"))
+        cassette.record("end_url", "Pick the URL of the action", AIMessage(content="second"))
+
+        replayed = Cassette(self.cassette_path)
+        self.assertEqual(replayed.replay("end_url", "Pick the URL\n\tof the action").content, "first")
+        self.assertEqual(replayed.replay("end_url", "Pick the URL of the action").content, "second")
+        # The last response repeats
+        self.assertEqual(replayed.replay("end_url", "Pick the URL of the action").content, "second")
+        with self.assertRaises(CassetteMissError):
+            replayed.replay("dynamic_parts", "Pick the URL of the action")
+
+    def test_scripted_model(self):
+        model = RecordingChatModel(
+            ScriptedChatModel({"end_url": [{"url": "a"}, {"url": "b"}], "default": "code"}), Cassette(self.cassette_path)
+        )
+        invoke_kwargs = {"function_call": {"name": "identify_end_url"}}
+        with usage_scope("end_url"):
+            first = model.invoke("prompt", **invoke_kwargs)
+            second = asyncio.run(model.ainvoke("prompt", **invoke_kwargs))
+        with usage_scope("generate_code"):
+            code = model.invoke("prompt")
+
+        self.assertEqual(first.additional_kwargs["function_call"], {"name": "identify_end_url", "arguments": '{"url": "a"}'})
+        self.assertEqual(json.loads(second.additional_kwargs["function_call"]["arguments"]), {"url": "b"})
+        self.assertEqual(code.content, "code")
+        self.assertEqual(len(Cassette(self.cassette_path).interactions), 3)
+
+    def _run(self, backend):
+        llm.set_backend(backend)
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            asyncio.run(
+                call_agent(
+                    "gpt-4o",
+                    "Get the accounts",
+                    os.path.join(DATA_DIR, "test.har"),
+                    os.path.join(DATA_DIR, "test_cookies.json"),
+                    usage_report=None,
+                )
+            )
+        finally:
+            os.chdir(cwd)
+        return sorted((node.node_type, getattr(node.key, "url", None)) for node in integuru.main.agent.dag_manager.nodes)
+
+    def test_recorded_run_replays_offline(self):
+        recorded = self._run(recording_backend(Cassette(self.cassette_path, load=False), scripted_backend(SCRIPT)))
+        replayed = self._run(replay_backend(Cassette(self.cassette_path)))
+
+        self.assertEqual(replayed, recorded)
+        self.assertIn(("master_curl", ACCOUNTS_URL), recorded)
+        self.assertIn(("curl", "https://example.com/api/session"), recorded)
+
+    def test_concurrent_runs_keep_their_own_backend_and_cache(self):
+        def counted_script(calls):
+            def answer(stage):
+                def respond(prompt, kwargs):
+                    calls.append(stage)
+                    value = SCRIPT[stage]
+                    return value(prompt, kwargs) if callable(value) else value
+                return respond
+            return {stage: answer(stage) for stage in SCRIPT}
+
+        first_calls, second_calls = [], []
+        cache_path = os.path.join(self.temp_dir.name, "llm.sqlite")
+
+        async def run_both():
+            arguments = ("gpt-4o", "Get the accounts", os.path.join(DATA_DIR, "test.har"), os.path.join(DATA_DIR, "test_cookies.json"))
+            await asyncio.gather(
+                call_agent(
+                    *arguments,
+                    llm_cache=LLMCache(cache_path),
+                    llm_backend=scripted_backend(counted_script(first_calls)),
+                    usage_report=None,
+                ),
+                call_agent(*arguments, llm_backend=scripted_backend(counted_script(second_calls)), usage_report=None),
+            )
+
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            asyncio.run(run_both())
+        finally:
+            os.chdir(cwd)
+
+        # Each run's calls went to its own backend, and only the first run's were cached
+        self.assertIn("end_url", first_calls)
+        self.assertEqual(sorted(first_calls), sorted(second_calls))
+        conn = sqlite3.connect(cache_path)
+        (cached,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        conn.close()
+        self.assertEqual(cached, len(first_calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.messages import AIMessage
+from integuru.util import llm_cache
+from integuru.util.llm_cache import CachedChatModel, LLMCache
+
+
+class FakeChatModel:
+    model_name = "fake-model"
+    temperature = 1
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt):
+        with self._lock:
+            self.calls += 1
+        return AIMessage(
+            content=f"echo {prompt}",
+            additional_kwargs={"function_call": {"name": "f", "arguments": '{"url": "x"}'}},
+        )
+
+    def invoke(self, prompt, **kwargs):
+        time.sleep(self.delay)
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self._respond(prompt)
+
+
+class TestLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "llm.sqlite")
+        self.cache = LLMCache(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_rerun_is_served_from_cache(self):
+        model = FakeChatModel()
+        first = CachedChatModel(model, self.cache).invoke("prompt", functions=[{"name": "f"}])
+        # A new process would open a new LLMCache on the same file
+        second = CachedChatModel(model, LLMCache(self.path)).invoke("prompt", functions=[{"name": "f"}])
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(second.additional_kwargs, first.additional_kwargs)
+        self.assertEqual(second.content, "echo prompt")
+
+    def test_key_covers_model_schema_and_temperature(self):
+        base = LLMCache.make_key("gpt-4o", "p", {"functions": [{"name": "f"}]}, 1)
+        self.assertEqual(base, LLMCache.make_key("gpt-4o", "p", {"functions": [{"name": "f"}]}, 1))
+        self.assertNotEqual(base, LLMCache.make_key("gpt-4o-mini", "p", {"functions": [{"name": "f"}]}, 1))
+        self.assertNotEqual(base, LLMCache.make_key("gpt-4o", "p", {"functions": [{"name": "g"}]}, 1))
+        self.assertNotEqual(base, LLMCache.make_key("gpt-4o", "p", {"functions": [{"name": "f"}]}, 0))
+
+    def test_ttl_expiry(self):
+        cache = LLMCache(self.path, ttl_seconds=60)
+        cache.put("key", "m", AIMessage(content="old"))
+        self.assertEqual(cache.get("key").content, "old")
+        with patch.object(llm_cache.time, "time", return_value=time.time() + 120):
+            self.assertIsNone(cache.get("key"))
+
+    def test_lru_eviction_by_size(self):
+        message = AIMessage(content="x" * 100)
+        size = len(llm_cache.json.dumps(llm_cache.message_to_dict(message)))
+        cache = LLMCache(self.path, max_bytes=size * 2)
+        for i, key in enumerate(["a", "b"]):
+            with patch.object(llm_cache.time, "time", return_value=1000.0 + i):
+                cache.put(key, "m", message)
+        with patch.object(llm_cache.time, "time", return_value=1002.0):
+            cache.get("a")  # "a" becomes the most recently used
+        with patch.object(llm_cache.time, "time", return_value=1003.0):
+            cache.put("c", "m", message)
+        with patch.object(llm_cache.time, "time", return_value=1004.0):
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("a"))
+            self.assertIsNotNone(cache.get("c"))
+
+    def test_concurrent_threads_share_one_call(self):
+        model = FakeChatModel(delay=0.2)
+        cached_model = CachedChatModel(model, self.cache)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cached_model.invoke("same"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(model.calls, 1)
+        self.assertEqual({result.content for result in results}, {"echo same"})
+        # The key's lock is dropped once no thread needs it
+        self.assertEqual(self.cache._locks, {})
+
+    def test_concurrent_tasks_share_one_call(self):
+        model = FakeChatModel(delay=0.2)
+        cached_model = CachedChatModel(model, self.cache)
+
+        async def run():
+            return await asyncio.gather(*(cached_model.ainvoke("same") for _ in range(5)))
+
+        results = asyncio.run(run())
+        self.assertEqual(model.calls, 1)
+        self.assertEqual({result.content for result in results}, {"echo same"})
+
+    def test_locked_database_does_not_block_event_loop(self):
+        locked = threading.Event()
+
+        def hold_write_lock():
+            conn = sqlite3.connect(self.path)
+            conn.execute("BEGIN IMMEDIATE")
+            locked.set()
+            time.sleep(0.3)
+            conn.commit()
+            conn.close()
+
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.create_task(tick())
+            result = await CachedChatModel(FakeChatModel(), self.cache).ainvoke("locked")
+            ticker.cancel()
+            return result, ticks
+
+        writer = threading.Thread(target=hold_write_lock)
+        writer.start()
+        locked.wait()
+        result, ticks = asyncio.run(run())
+        writer.join()
+        self.assertEqual(result.content, "echo locked")
+        # The loop kept running while the cache waited on the lock
+        self.assertGreater(ticks, 5)
+
+    def test_waits_for_call_in_flight_in_another_process(self):
+        other_process = LLMCache(self.path)
+        key = LLMCache.make_key("fake-model", "shared", {}, 1)
+        self.assertTrue(other_process._claim(key))
+
+        def finish_elsewhere():
+            time.sleep(0.3)
+            other_process.put(key, "fake-model", AIMessage(content="from other process"))
+            other_process._release(key)
+
+        threading.Thread(target=finish_elsewhere).start()
+        model = FakeChatModel()
+        with patch.object(llm_cache, "POLL_SECONDS", 0.05):
+            result = CachedChatModel(model, self.cache).invoke("shared")
+        self.assertEqual(result.content, "from other process")
+        self.assertEqual(model.calls, 0)
+
+if __name__ == '__main__':
+    unittest.main()
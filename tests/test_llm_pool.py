@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage
+
+from integuru.util import LLM
+from integuru.util.LLM import llm
+from integuru.util.llm_pool import LLMClientPool, ModelLimits, PooledChatModel, RateLimiter, TokenBucket
+from integuru.util.routing import StageRoute
+from integuru.util.usage import UsageRecorder, current_recorder, usage_scope
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FlakyChatModel:
+    """
+    Fails with the given errors, in order, then answers. Async calls sleep for the given delays, in order.
+    """
+
+    def __init__(self, errors=(), delays=()):
+        self.errors = list(errors)
+        self.delays = list(delays)
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content=f"answer {self.calls}")
+
+    async def ainvoke(self, prompt, **kwargs):
+        calls = self.calls = self.calls + 1
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content=f"answer {calls}")
+
+
+def pooled(model, **limits):
+    limits = ModelLimits(**limits)
+    return PooledChatModel(model, limits, RateLimiter(limits))
+
+
+@patch("integuru.util.llm_pool.BACKOFF_BASE_SECONDS", 0.001)
+class TestLLMPool(unittest.TestCase):
+
+    def test_token_bucket_delays_beyond_its_rate(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.reserve(60), 0.0)
+        # Refilled at one token per second
+        self.assertAlmostEqual(bucket.reserve(2), 2.0, delta=0.1)
+
+    def test_retries_rate_limits_and_server_errors(self):
+        model = FlakyChatModel(errors=[FakeAPIError(429), FakeAPIError(503)])
+        client = pooled(model)
+
+        self.assertEqual(client.invoke("prompt").content, "answer 3")
+        self.assertGreater(client.limiter.paused_until, 0)
+
+    def test_does_not_retry_client_errors_or_past_max_retries(self):
+        with self.assertRaises(FakeAPIError):
+            pooled(FlakyChatModel(errors=[FakeAPIError(400)])).invoke("prompt")
+        with self.assertRaises(FakeAPIError):
+            pooled(FlakyChatModel(errors=[FakeAPIError(500)] * 3), max_retries=2).invoke("prompt")
+
+    def test_async_timeout_is_retried(self):
+        model = FlakyChatModel(delays=[1.0])
+        client = pooled(model, timeout_seconds=0.05)
+
+        self.assertEqual(asyncio.run(client.ainvoke("prompt")).content, "answer 2")
+
+    def test_hedged_request_returns_the_faster_answer(self):
+        model = FlakyChatModel(delays=[1.0, 0.0])
+        client = pooled(model, hedge_after_seconds=0.05)
+
+        self.assertEqual(asyncio.run(client.ainvoke("prompt")).content, "answer 2")
+        self.assertEqual(model.calls, 2)
+
+    def test_pool_shares_one_client_per_model_and_records_per_context(self):
+        pool = LLMClientPool(factory=lambda model, limits: FlakyChatModel())
+        self.assertIs(pool.get("gpt-4o"), pool.get("gpt-4o"))
+        self.assertIsNot(pool.get("gpt-4o"), pool.get("gpt-4o-mini"))
+
+        recorders = [UsageRecorder(), UsageRecorder()]
+
+        async def analysis(recorder, calls):
+            current_recorder.set(recorder)
+            for _ in range(calls):
+                await pool.get("gpt-4o").ainvoke("prompt")
+
+        async def run():
+            await asyncio.gather(analysis(recorders[0], 1), analysis(recorders[1], 2))
+
+        asyncio.run(run())
+        self.assertEqual([recorder.summary()["totals"]["calls"] for recorder in recorders], [1, 2])
+
+    def test_stage_models(self):
+        pool = LLMClientPool(factory=lambda model, limits: FlakyChatModel())
+
+        async def run():
+            LLM._pool.set(pool)
+            llm.set_default_model("gpt-4o")
+            llm.set_routes({"end_url": StageRoute(("gpt-4o-mini",))})
+            with usage_scope("end_url"):
+                end_url_client = llm.get_instance()
+            with usage_scope("dynamic_parts"):
+                dynamic_parts_client = llm.get_instance()
+            return end_url_client, dynamic_parts_client
+
+        end_url_client, dynamic_parts_client = asyncio.run(run())
+        self.assertIs(end_url_client.clients[0][1], pool.get("gpt-4o-mini"))
+        self.assertIs(dynamic_parts_client.clients[0][1], pool.get("gpt-4o"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import string
+import unittest
+
+from integuru.agent import IntegrationAgent
+from integuru.util.dynamic_tokens import TokenCandidate
+from integuru.util.print import aggregate_functions_prompt, generate_code_prompt
+from integuru.util.prompts import PROMPTS
+from integuru.util.usage import STAGES
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestPrompts(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = IntegrationAgent(
+            "Get the accounts",
+            os.path.join(DATA_DIR, "test.har"),
+            os.path.join(DATA_DIR, "test_cookies.json"),
+        )
+
+    def test_every_stage_has_a_template_with_a_static_prefix(self):
+        self.assertEqual(set(PROMPTS), set(STAGES))
+        for stage, template in PROMPTS.items():
+            fields = [field for _, field, _, _ in string.Formatter().parse(template.prefix) if field is not None]
+            self.assertEqual(fields, [], stage)
+
+    def test_prompts_start_with_the_stage_prefix(self):
+        curl = "curl 'https://example.com/api/accounts?userId=user-98765'"
+        candidate = TokenCandidate("user-98765", 0.9, ("returned by an earlier response",))
+        # Prompt of each stage and a per-call value it must only carry after the prefix
+        prompts = {
+            "end_url": (self.agent._end_url_call([("GET", "https://example.com/api/accounts", "", "")])[0], "Get the accounts"),
+            "dynamic_parts": (self.agent._dynamic_parts_call(curl, [candidate])[0], "user-98765"),
+            "dynamic_parts_batch": (self.agent._dynamic_parts_batch_call([curl, curl], [[candidate], []])[0], "user-98765"),
+            "generate_code": (
+                generate_code_prompt({"content": {"key": curl, "value": {}}, "dynamic_parts": ["user-98765"]}),
+                "user-98765",
+            ),
+            "aggregate_functions": (aggregate_functions_prompt("def get_accounts(cookie_string): ..."), "get_accounts"),
+        }
+        for stage, (prompt, value) in prompts.items():
+            self.assertTrue(prompt.startswith(PROMPTS[stage].prefix), stage)
+            self.assertIn(value, prompt[len(PROMPTS[stage].prefix):])
+
+    def test_function_definitions_are_static(self):
+        _, invoke_kwargs = self.agent._end_url_call([])
+        self.assertNotIn("Get the accounts", str(invoke_kwargs))
+        self.assertEqual(invoke_kwargs["function_call"], {"name": "identify_end_url"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import unittest
+from integuru.models.request import Request
+from integuru.util.har_processing import HarIndex
+from integuru.util.provenance import (
+    REQUEST_FORM_BODY,
+    REQUEST_HEADER,
+    REQUEST_JSON_BODY,
+    REQUEST_QUERY,
+    RESPONSE_JSON,
+    ProvenanceIndex,
+    iter_json_values,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+HAR_PATH = os.path.join(DATA_DIR, "test.har")
+
+class TestProvenanceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = HarIndex.from_har_file(HAR_PATH)
+        self.requests = {request.url.split("?")[0]: request for request in self.index.req_to_res_map}
+
+    def test_producers_and_key_paths(self):
+        session = self.requests["https://example.com/api/session"]
+        provenance = self.index.provenance
+        self.assertEqual(provenance.producers("a1b2c3d4e5f6a7b8c9d0"), [session])
+        self.assertEqual(
+            provenance.key_paths("a1b2c3d4e5f6a7b8c9d0", session),
+            [{'key_path': ['session', 'token'], 'value': "a1b2c3d4e5f6a7b8c9d0"}],
+        )
+        accounts = self.requests["https://example.com/api/accounts"]
+        self.assertEqual(
+            provenance.key_paths("ACC-4242", accounts),
+            [{'key_path': ['accounts', 0, 'accountId'], 'value': "ACC-4242"}],
+        )
+
+    def test_request_side_sources(self):
+        provenance = self.index.provenance
+        self.assertEqual(
+            [(source.location, source.path) for source in provenance.sources("user-98765")],
+            [(RESPONSE_JSON, ("user", "id")), (REQUEST_QUERY, ("userId",))],
+        )
+        self.assertIn(
+            (REQUEST_HEADER, ("Authorization",)),
+            [(source.location, source.path) for source in provenance.sources("a1b2c3d4e5f6a7b8c9d0")],
+        )
+        self.assertEqual(
+            [(source.location, source.path) for source in provenance.sources("2024")],
+            [(REQUEST_JSON_BODY, ("year",))],
+        )
+
+    def test_form_body_and_non_json_responses(self):
+        provenance = ProvenanceIndex()
+        request = Request(
+            "POST", "https://example.com/login",
+            {"Content-Type": "application/x-www-form-urlencoded"}, body="csrf=abc123&user=me",
+        )
+        provenance.add_request(request)
+        provenance.add_response(request, '{"id": "not indexed"}', "text/html")
+        self.assertEqual(provenance.sources("abc123")[0].location, REQUEST_FORM_BODY)
+        self.assertEqual(provenance.producers("not indexed"), [])
+
+    def test_identical_requests_index_every_response(self):
+        def entry(token):
+            return {
+                "request": {"method": "GET", "url": "https://example.com/api/poll", "headers": []},
+                "response": {"content": {"mimeType": "application/json", "text": f'{{"data": {{"token": "{token}"}}}}'}},
+            }
+
+        index = HarIndex()
+        index.add_entry(entry("tok-first-1111"))
+        index.add_entry(entry("tok-first-1111"))
+        index.add_entry(entry("tok-second-2222"))
+        (request,) = index.req_to_res_map
+        self.assertEqual(len(index.entries), 3)
+
+        provenance = index.provenance
+        for token in ("tok-first-1111", "tok-second-2222"):
+            self.assertEqual(provenance.producers(token), [request])
+            # Once per path, however many identical responses returned it
+            self.assertEqual(
+                provenance.key_paths(token, request), [{'key_path': ['data', 'token'], 'value': token}]
+            )
+
+    def test_iter_json_values_skips_booleans_and_nulls(self):
+        self.assertEqual(
+            list(iter_json_values({"a": [1, True, None, "x"], "b": 2.5})),
+            [(("a", 0), "1"), (("a", 3), "x"), (("b",), "2.5")],
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import time
+import unittest
+
+from integuru.util.ranking import BM25Index, rank_har_urls, tokenize
+
+
+def synthetic_har_urls(count):
+    har_urls = []
+    for i in range(count):
+        har_urls.append(("GET", f"https://example.com/api/widgets/{i}?page={i % 7}", "application/json", '{"widget": {"id": 1'))
+    return har_urls
+
+
+class TestRanking(unittest.TestCase):
+
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize("Download my bills from getBillHistory?user_id=42"),
+            ["download", "bill", "get", "bill", "history", "user", "id", "42"],
+        )
+
+    def test_bm25_prefers_rare_matching_terms(self):
+        index = BM25Index([["api", "bill"], ["api", "account"], ["api", "session"]])
+        scores = index.scores(["api", "bill"])
+        self.assertEqual(max(range(3), key=scores.__getitem__), 0)
+        self.assertGreater(scores[1], 0)
+
+    def test_rank_har_urls_keeps_capture_order(self):
+        har_urls = synthetic_har_urls(100)
+        har_urls[10] = ("POST", "https://example.com/api/bills/download", "application/pdf", "%PDF-1.4")
+        har_urls[70] = ("GET", "https://example.com/api/billing/history", "application/json", '{"bills": []}')
+
+        top = rank_har_urls(har_urls, "Download the latest utility bill", 5)
+
+        self.assertEqual(len(top), 5)
+        self.assertEqual(top, sorted(top))
+        self.assertIn(10, top)
+        self.assertIn(70, top)
+
+    def test_rank_har_urls_without_matches_returns_all(self):
+        har_urls = synthetic_har_urls(50)
+        self.assertEqual(rank_har_urls(har_urls, "zzz qqq", 5), list(range(50)))
+        self.assertEqual(rank_har_urls(har_urls[:3], "widgets", 5), [0, 1, 2])
+
+    def test_rank_large_capture_quickly(self):
+        har_urls = synthetic_har_urls(20000)
+        start = time.perf_counter()
+        rank_har_urls(har_urls, "list the widgets on page 3", 40)
+        self.assertLess(time.perf_counter() - start, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import pickle
+import unittest
+from integuru.models.request import Request
+
+class TestRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.request = Request(
+            "GET",
+            "https://example.com/api/accounts",
+            {"Authorization": "Bearer token", "Referer": "https://example.com"},
+            query_params={"userId": "42"},
+        )
+
+    def test_curl_is_cached_and_url_is_not_mutated(self):
+        curl = self.request.to_curl_command()
+        self.assertIs(self.request.to_curl_command(), curl)
+        self.assertIs(str(self.request), curl)
+        self.assertEqual(self.request.url, "https://example.com/api/accounts")
+        self.assertTrue(curl.endswith("'https://example.com/api/accounts?userId=42'"))
+
+        minified = self.request.to_minified_curl_command()
+        self.assertIs(self.request.to_minified_curl_command(), minified)
+        self.assertNotIn("Referer", minified)
+        self.assertIn("Referer", curl)
+
+    def test_compact_curl_drops_common_headers(self):
+        request = Request(
+            "GET",
+            "https://example.com/api/accounts",
+            {"Authorization": "Bearer token", "User-Agent": "Mozilla/5.0", "sec-ch-ua": "Chromium"},
+        )
+        self.assertEqual(
+            request.to_compact_curl_command(),
+            "curl -X GET -H 'Authorization: Bearer token' 'https://example.com/api/accounts'",
+        )
+        self.assertIs(request.to_compact_curl_command(), request.to_compact_curl_command())
+
+    def test_query_string_not_duplicated(self):
+        request = Request("GET", "https://example.com/api?userId=42", {}, query_params={"userId": "42"})
+        self.assertEqual(request.to_curl_command(), "curl -X GET 'https://example.com/api?userId=42'")
+
+    def test_canonical_equality_and_hash(self):
+        same = Request(
+            "GET",
+            "https://example.com/api/accounts",
+            {"Referer": "https://example.com", "Authorization": "Bearer token"},
+            query_params={"userId": "42"},
+        )
+        self.assertEqual(same, self.request)
+        self.assertEqual(hash(same), hash(self.request))
+        self.assertEqual(len({same, self.request}), 1)
+
+        json_a = Request("POST", "https://example.com", {}, body={"a": 1, "b": 2})
+        json_b = Request("POST", "https://example.com", {}, body={"b": 2, "a": 1})
+        self.assertEqual(json_a, json_b)
+        self.assertNotEqual(json_a, Request("POST", "https://example.com", {}, body={"a": 2, "b": 2}))
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.request.url = "https://other.example.com"
+        with self.assertRaises(TypeError):
+            self.request.headers["X-New"] = "1"
+        with self.assertRaises(AttributeError):
+            self.request.extra = 1
+
+    def test_pickle_round_trip(self):
+        restored = pickle.loads(pickle.dumps(self.request))
+        self.assertEqual(restored, self.request)
+        self.assertEqual(restored.to_curl_command(), self.request.to_curl_command())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from integuru.util.LLM import llm
+from integuru.util.llm_backends import CassetteMissError
+from integuru.util.routing import RoutedChatModel, StageRoute, load_routing, merge_routes, parse_stage_models
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeChatModel:
+    def __init__(self, error=None):
+        self.error = error
+        self.kwargs = []
+
+    def invoke(self, prompt, **kwargs):
+        self.kwargs.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        return "answer"
+
+    async def ainvoke(self, prompt, **kwargs):
+        return self.invoke(prompt, **kwargs)
+
+
+class TestRouting(unittest.TestCase):
+
+    def test_load_routing(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "integuru.toml")
+            with open(path, "w") as f:
+                f.write('[routing.end_url]\nmodel = "gpt-4o-mini"\nfallback = ["gpt-4o"]\nmax_tokens = 256\n')
+            self.assertEqual(load_routing(path), {"end_url": StageRoute(("gpt-4o-mini", "gpt-4o"), 256)})
+
+            with open(path, "w") as f:
+                f.write('[routing.end_uri]\nmodel = "gpt-4o-mini"\n')
+            with self.assertRaises(ValueError):
+                load_routing(path)
+
+    def test_command_line_overrides_config_field_by_field(self):
+        routes = merge_routes(
+            {"end_url": StageRoute(("gpt-4o-mini",), 256)},
+            parse_stage_models([("end_url", "gpt-4.1-nano, gpt-4o-mini")]),
+        )
+        self.assertEqual(routes["end_url"], StageRoute(("gpt-4.1-nano", "gpt-4o-mini"), 256))
+
+    def test_falls_back_and_skips_unavailable_models(self):
+        unavailable = []
+        missing, overloaded, default = FakeChatModel(FakeAPIError(404)), FakeChatModel(FakeAPIError(503)), FakeChatModel()
+        model = RoutedChatModel(
+            "generate_code",
+            [("o1-preview", missing), ("gpt-4.1", overloaded), ("gpt-4o", default)],
+            max_tokens=1024,
+            on_unavailable=unavailable.append,
+        )
+
+        self.assertEqual(asyncio.run(model.ainvoke("prompt")), "answer")
+        # Only the model the API refused is skipped from now on; overloads are temporary
+        self.assertEqual(unavailable, ["o1-preview"])
+        self.assertEqual(default.kwargs, [{"max_completion_tokens": 1024}])
+
+    def test_cassette_miss_does_not_fall_back(self):
+        replay, default = FakeChatModel(CassetteMissError("No recorded response for stage 'generate_code'")), FakeChatModel()
+        model = RoutedChatModel("generate_code", [("o1-preview", replay), ("gpt-4o", default)])
+
+        with self.assertRaisesRegex(CassetteMissError, "No recorded response for stage 'generate_code'"):
+            asyncio.run(model.ainvoke("prompt"))
+        with self.assertRaises(CassetteMissError):
+            model.invoke("prompt")
+        self.assertEqual(default.kwargs, [])
+
+    def test_stage_chains_end_with_the_default_model(self):
+        async def run():
+            llm.set_default_model("gpt-4o")
+            llm.set_routes({"end_url": StageRoute(("gpt-4o-mini",))})
+            return llm.model_chain("end_url"), llm.model_chain("generate_code"), llm.model_chain("dynamic_parts")
+
+        end_url_chain, generate_code_chain, dynamic_parts_chain = asyncio.run(run())
+        self.assertEqual(end_url_chain, ["gpt-4o-mini", "gpt-4o"])
+        self.assertEqual(generate_code_chain, ["o1-preview", "gpt-4o"])
+        self.assertEqual(dynamic_parts_chain, ["gpt-4o"])
+
+
+if __name__ == '__main__':
+    unittest.main()
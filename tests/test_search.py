@@ -0,0 +1,92 @@
+import os
+import unittest
+from unittest.mock import patch
+from integuru.util import search
+from integuru.util.har_processing import HarIndex
+from integuru.util.search import ContentSearcher
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+HAR_PATH = os.path.join(DATA_DIR, "test.har")
+
+SEARCH_STRINGS = [
+    "a1b2c3d4e5f6a7b8c9d0",  # in the session response and later request headers
+    "USER-98765",             # case-insensitive match
+    "acc-4242",
+    "ACC",                   # prefix of another pattern
+    "not-present",
+    "",
+]
+
+
+def reference_find(entries, search_string):
+    """The original per-request scan in find_curl_from_content."""
+    return [
+        request for request, response in entries
+        if search_string.lower() in response["text"].lower()
+        and search_string.lower() not in str(request).lower()
+    ]
+
+
+class TestContentSearcher(unittest.TestCase):
+
+    def setUp(self):
+        self.index = HarIndex.from_har_file(HAR_PATH)
+
+    def assert_matches_reference(self):
+        results = ContentSearcher(self.index.entries).find(SEARCH_STRINGS)
+        for search_string in SEARCH_STRINGS:
+            expected = reference_find(self.index.entries, search_string)
+            self.assertEqual(results[search_string], expected, search_string)
+        self.assertEqual(
+            [request.url.split("?")[0] for request in results["acc-4242"]],
+            ["https://example.com/api/accounts", "https://example.com/app.js"],
+        )
+
+    def test_automaton_matches_reference(self):
+        self.assert_matches_reference()
+
+    def test_mmap_scan_matches_reference(self):
+        with patch.object(search, "ahocorasick", None):
+            self.assert_matches_reference()
+
+    def test_mmap_scan_ignores_matches_across_documents(self):
+        req_to_res_map = {"first": {"text": "xxab"}, "second": {"text": "cdyy"}}
+        with patch.object(search, "ahocorasick", None):
+            self.assertEqual(ContentSearcher(req_to_res_map.items()).find(["abcd", "cd"]), {"abcd": [], "cd": ["second"]})
+
+    def test_repeated_requests_keep_their_own_responses(self):
+        def entry(method, url, token, body=None):
+            request = {"method": method, "url": url, "headers": []}
+            if body:
+                request["postData"] = {"mimeType": "application/json", "text": body}
+            return {
+                "request": request,
+                "response": {"content": {"mimeType": "application/json", "text": f'{{"csrf": "{token}"}}'}},
+            }
+
+        index = HarIndex()
+        index.add_entry(entry("GET", "https://example.com/api/csrf", "tok-AAAA1111"))
+        index.add_entry(entry("POST", "https://example.com/api/save", "", '{"csrf": "tok-AAAA1111"}'))
+        index.add_entry(entry("GET", "https://example.com/api/csrf", "tok-BBBB2222"))
+        csrf = index.entries[0][0]
+
+        self.assertEqual(len(index.entries), 3)
+        results = ContentSearcher(index.entries).find(["tok-AAAA1111", "tok-BBBB2222"])
+        self.assertEqual(results, {"tok-AAAA1111": [csrf], "tok-BBBB2222": [csrf]})
+        self.assertEqual(index.provenance.producers("tok-AAAA1111"), [csrf])
+        self.assertEqual(
+            index.provenance.key_paths("tok-AAAA1111", csrf), [{'key_path': ['csrf'], 'value': "tok-AAAA1111"}]
+        )
+
+    def test_process_pool_matches_in_process_search(self):
+        in_process = ContentSearcher(self.index.entries).find(SEARCH_STRINGS)
+        searcher = ContentSearcher(self.index.entries, workers=3)
+        try:
+            self.assertEqual(searcher._responses.shard_bounds(3)[0], 0)
+            self.assertEqual(searcher._responses.shard_bounds(3)[-1], len(self.index.entries))
+            self.assertEqual(searcher.find(SEARCH_STRINGS), in_process)
+        finally:
+            searcher.close()
+
+if __name__ == '__main__':
+    unittest.main()
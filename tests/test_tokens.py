@@ -0,0 +1,21 @@
+import unittest
+
+from integuru.util.tokens import estimate_tokens, pack_by_token_budget
+
+
+class TestTokens(unittest.TestCase):
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 1)
+        self.assertEqual(estimate_tokens("x" * 400), 101)
+
+    def test_pack_by_token_budget(self):
+        texts = ["x" * 36, "x" * 36, "x" * 36, "x" * 400, "x" * 36]
+        # 10 tokens each, except the 101-token text that exceeds the budget
+        self.assertEqual(pack_by_token_budget(texts, 25), [[0, 1], [2], [3], [4]])
+        self.assertEqual(pack_by_token_budget(texts, 1000), [[0, 1, 2, 3, 4]])
+        self.assertEqual(pack_by_token_budget([], 25), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from langchain_core.messages import AIMessage
+from integuru.util.llm_cache import CachedChatModel, LLMCache
+from integuru.util.usage import (
+    UsageRecorder,
+    UsageTrackingModel,
+    call_cost,
+    token_usage,
+    usage_scope,
+    write_usage_report,
+)
+
+
+class FakeChatModel:
+    model_name = "gpt-4o"
+    temperature = 1
+
+    def _respond(self, prompt):
+        return AIMessage(
+            content=f"echo {prompt}",
+            usage_metadata={
+                "input_tokens": 1000,
+                "output_tokens": 100,
+                "total_tokens": 1100,
+                "input_token_details": {"cache_read": 400},
+            },
+            response_metadata={"model_name": "gpt-4o-2024-08-06"},
+        )
+
+    def invoke(self, prompt, **kwargs):
+        if prompt == "fail":
+            raise TimeoutError()
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        await asyncio.sleep(0.01)
+        return self._respond(prompt)
+
+
+class TestUsage(unittest.TestCase):
+
+    def test_call_cost(self):
+        # 600 uncached and 400 cached prompt tokens, 100 completion tokens at gpt-4o prices
+        self.assertAlmostEqual(call_cost("gpt-4o-2024-08-06", 1000, 400, 100), (600 * 2.5 + 400 * 1.25 + 100 * 10) / 1e6)
+        self.assertAlmostEqual(call_cost("gpt-4o-mini", 1000, 0, 0), 1000 * 0.15 / 1e6)
+        self.assertIsNone(call_cost("unknown-model", 1000, 0, 0))
+
+    def test_token_usage_from_raw_openai_usage(self):
+        message = AIMessage(
+            content="",
+            response_metadata={
+                "token_usage": {"prompt_tokens": 50, "completion_tokens": 5, "prompt_tokens_details": {"cached_tokens": 10}}
+            },
+        )
+        self.assertEqual(token_usage(message), (50, 5, 10))
+
+    def test_records_stage_and_node_of_concurrent_calls(self):
+        recorder = UsageRecorder()
+        model = UsageTrackingModel(FakeChatModel(), recorder)
+
+        async def call(stage, node_id):
+            with usage_scope(stage, node_id):
+                return await model.ainvoke(f"{stage} {node_id}")
+
+        async def run():
+            await asyncio.gather(*(call("dynamic_parts", f"node-{i}") for i in range(3)), call("end_url", None))
+
+        asyncio.run(run())
+        with self.assertRaises(TimeoutError):
+            with usage_scope("simplest_request"):
+                model.invoke("fail")
+
+        summary = recorder.summary()
+        self.assertEqual(summary["totals"]["calls"], 5)
+        self.assertEqual(summary["totals"]["errors"], 1)
+        self.assertEqual(summary["by_stage"]["dynamic_parts"]["calls"], 3)
+        self.assertEqual(summary["by_stage"]["dynamic_parts"]["cached_tokens"], 1200)
+        self.assertAlmostEqual(summary["by_stage"]["dynamic_parts"]["cache_hit_rate"], 0.4)
+        self.assertEqual(summary["by_stage"]["simplest_request"]["cache_hit_rate"], 0.0)
+        self.assertEqual(sorted(summary["by_node"]), ["node-0", "node-1", "node-2"])
+        self.assertEqual(summary["by_model"]["gpt-4o-2024-08-06"]["calls"], 4)
+        self.assertEqual(summary["by_stage"]["simplest_request"]["prompt_tokens"], 0)
+
+    def test_cached_responses_are_not_counted(self):
+        recorder = UsageRecorder()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = LLMCache(os.path.join(temp_dir, "llm.sqlite"))
+            model = CachedChatModel(UsageTrackingModel(FakeChatModel(), recorder), cache)
+            model.invoke("prompt")
+            model.invoke("prompt")
+        self.assertEqual(recorder.summary()["totals"]["calls"], 1)
+
+    def test_write_usage_report(self):
+        recorder = UsageRecorder()
+        model = UsageTrackingModel(FakeChatModel(), recorder)
+        with usage_scope("end_url"):
+            model.invoke("prompt")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_path = os.path.join(temp_dir, "usage_report.json")
+            prometheus_path = write_usage_report(recorder, json_path)
+            with open(json_path) as f:
+                report = json.load(f)
+            with open(prometheus_path) as f:
+                prometheus = f.read()
+
+        self.assertEqual(prometheus_path, os.path.join(temp_dir, "usage_report.prom"))
+        self.assertEqual(report["totals"]["prompt_tokens"], 1000)
+        self.assertEqual(report["calls"][0]["stage"], "end_url")
+        self.assertIn('integuru_llm_prompt_tokens_total{stage="end_url",model="gpt-4o-2024-08-06"} 1000', prometheus)
+        self.assertIn("# TYPE integuru_llm_cost_usd_total counter", prometheus)
+        self.assertIn('integuru_llm_cache_hit_ratio{stage="end_url",model="gpt-4o-2024-08-06"} 0.4', prometheus)
+        self.assertIn("# TYPE integuru_llm_cache_hit_ratio gauge", prometheus)
+
+    def test_every_stage_reports_its_hit_rate(self):
+        recorder = UsageRecorder()
+        self.assertEqual(recorder.to_prometheus(), "")
+
+        model = UsageTrackingModel(FakeChatModel(), recorder)
+        with usage_scope("dynamic_parts"):
+            model.invoke("prompt")
+
+        self.assertAlmostEqual(recorder.summary()["by_stage"]["dynamic_parts"]["cache_hit_rate"], 0.4)
+        self.assertIn(
+            'integuru_llm_cache_hit_ratio{stage="dynamic_parts",model="gpt-4o-2024-08-06"} 0.4', recorder.to_prometheus()
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()